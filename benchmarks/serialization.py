@@ -0,0 +1,60 @@
+"""
+Serialization cost of one page of a list endpoint.
+
+Compares the default FastAPI path, ``orm_mode`` validation of every row followed by ``jsonable_encoder``
+and ``json.dumps``, with **dump_rows**. Run from the project root::
+
+    python -m benchmarks.serialization --rows 50 --repeat 200
+"""
+import argparse
+import json
+import timeit
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from src.database.models import Comment, Image, User
+from src.schemas.comments import CommentModel
+from src.schemas.pictures import ImageModel
+from src.schemas.users import UserDb
+from src.services.serialization import dump_rows
+
+
+def make_rows(count: int) -> dict:
+    now = datetime(2025, 1, 1, 12, 0, 0, 123456)
+    users = [User(id=number, username=f"user_{number}", email=f"user_{number}@example.com",
+                  avatar=f"https://avatars.example.com/{number}.png", created_at=now - timedelta(days=number))
+             for number in range(count)]
+    images = [Image(id=number, image_url=f"https://storage.example.com/photo_share/{number}",
+                    description=f"photo number {number}", user_id=number, created_at=now, updated_at=now,
+                    variants={"thumb": f"https://storage.example.com/photo_share/{number}_thumb",
+                              "medium": f"https://storage.example.com/photo_share/{number}_medium"},
+                    width=4000, height=3000, orientation="landscape", format="jpeg", taken_at=now,
+                    camera="FUJIFILM X100V", byte_size=4_500_000)
+              for number in range(count)]
+    comments = [Comment(id=number, comment=f"comment number {number}", created_at=now, updated_at=now,
+                        user_id=number, image_id=number, user=users[number])
+                for number in range(count)]
+    return {ImageModel: images, UserDb: users, CommentModel: comments}
+
+
+def default_path(rows, model) -> bytes:
+    return json.dumps(jsonable_encoder([model.from_orm(row) for row in rows])).encode('utf-8')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=50, help="rows per page")
+    parser.add_argument('--repeat', type=int, default=200, help="pages serialized per measurement")
+    args = parser.parse_args()
+
+    print(f"{'model':<14}{'default µs':>12}{'orjson µs':>12}{'speedup':>10}")
+    for model, rows in make_rows(args.rows).items():
+        assert json.loads(default_path(rows, model)) == json.loads(dump_rows(rows, model))
+        before = min(timeit.repeat(lambda: default_path(rows, model), number=args.repeat, repeat=5)) / args.repeat
+        after = min(timeit.repeat(lambda: dump_rows(rows, model), number=args.repeat, repeat=5)) / args.repeat
+        print(f"{model.__name__:<14}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
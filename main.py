@@ -1,3 +1,5 @@
+import logging
+
 from fastapi import FastAPI, Depends, HTTPException
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
@@ -13,19 +15,31 @@ from fastapi_limiter.depends import RateLimiter
 from fastapi.middleware.cors import CORSMiddleware
 
 from src.config.config import settings
-from src.routes import auth, users, comments, pictures
+from src.config.logging_config import REQUEST_ID_HEADER, RequestIdMiddleware, setup_logging, stop_logging
+from src.routes import auth, users, comments, pictures, storage
 from src.database.db import get_db
+from src.services.comment_events import get_comment_broker
+from src.services.image_processing import shutdown_process_pool
+from src.services.metrics import MetricsMiddleware, mark_process_dead, metrics_response
+from src.services.storage_gc import start_gc_worker
+from src.services.upload_jobs import start_workers
+from src.services.user_purge import start_purge_worker
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI()
+background_tasks = []
 
 
 @app.on_event("startup")
 async def startup():
     """
-    Set limitation of requests on server
+    Start the logging, set limitation of requests on server and start the upload workers,
+    the storage garbage collector and the removal of deleted users
 
     :return: None
     """
+    setup_logging()
     r = await redis.Redis(
         host=settings.redis_host,
         port=settings.redis_port,
@@ -34,6 +48,24 @@ async def startup():
         decode_responses=True,
     )
     await FastAPILimiter.init(r)
+    background_tasks.extend(start_workers())
+    background_tasks.extend(start_gc_worker())
+    background_tasks.extend(start_purge_worker())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop the background workers, the image processing pool, the metrics of the process and the logging
+
+    :return: None
+    """
+    for task in background_tasks:
+        task.cancel()
+    await get_comment_broker().close()
+    shutdown_process_pool()
+    mark_process_dead()
+    stop_logging()
 
 
 app.add_middleware(
@@ -42,7 +74,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 
 @app.get("/")
@@ -56,6 +91,17 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Metrics of the application for Prometheus
+
+    :return: The metrics in the Prometheus text format
+    :rtype: Response
+    """
+    return metrics_response()
+
+
 @app.get("/api/healthchecker")
 def healthchecker(db: Session = Depends(get_db)):
     """
@@ -73,8 +119,8 @@ def healthchecker(db: Session = Depends(get_db)):
             raise HTTPException(status_code=500,
                                 detail="Database is not configured correctly")
         return {"message": "Welcome to FastAPI!"}
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("database health check failed")
         raise HTTPException(status_code=500, detail="Error connecting to database")
 
 
@@ -82,6 +128,7 @@ app.include_router(auth.router, prefix='/api')
 app.include_router(users.user_router, prefix='/api')
 app.include_router(comments.router, prefix='/api')
 app.include_router(pictures.router, prefix='/api')
+app.include_router(storage.router, prefix='/api')
 
 if __name__ == "__main__":
     uvicorn.run(app, host="localhost", port=8000)
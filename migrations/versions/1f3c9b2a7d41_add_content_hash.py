@@ -0,0 +1,33 @@
+"""add content hash
+
+Revision ID: 1f3c9b2a7d41
+Revises: e9d4f7e86704
+Create Date: 2026-10-19 10:05:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f3c9b2a7d41'
+down_revision = 'e9d4f7e86704'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_images_content_hash'), 'images', ['content_hash'], unique=False)
+    # Deduplicated uploads share one stored asset between several images
+    op.drop_constraint('images_image_url_key', 'images', type_='unique')
+    op.drop_constraint('images_public_id_key', 'images', type_='unique')
+    op.create_index(op.f('ix_images_public_id'), 'images', ['public_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_images_public_id'), table_name='images')
+    op.create_unique_constraint('images_public_id_key', 'images', ['public_id'])
+    op.create_unique_constraint('images_image_url_key', 'images', ['image_url'])
+    op.drop_index(op.f('ix_images_content_hash'), table_name='images')
+    op.drop_column('images', 'content_hash')
@@ -0,0 +1,30 @@
+"""add perceptual hash
+
+Revision ID: 3d8f61b0c5e2
+Revises: 9e5c2d7a4f18
+Create Date: 2026-10-19 15:21:07.402913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8f61b0c5e2'
+down_revision = '9e5c2d7a4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('phash', sa.String(length=16), nullable=True))
+    for index in range(4):
+        op.add_column('images', sa.Column(f'phash_{index}', sa.Integer(), nullable=True))
+        op.create_index(op.f(f'ix_images_phash_{index}'), 'images', [f'phash_{index}'], unique=False)
+
+
+def downgrade() -> None:
+    for index in range(4):
+        op.drop_index(op.f(f'ix_images_phash_{index}'), table_name='images')
+        op.drop_column('images', f'phash_{index}')
+    op.drop_column('images', 'phash')
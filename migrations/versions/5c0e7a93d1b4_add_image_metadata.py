@@ -0,0 +1,46 @@
+"""add image metadata
+
+Revision ID: 5c0e7a93d1b4
+Revises: 3d8f61b0c5e2
+Create Date: 2026-10-19 16:08:55.730146
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c0e7a93d1b4'
+down_revision = '3d8f61b0c5e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('width', sa.Integer(), nullable=True))
+    op.add_column('images', sa.Column('height', sa.Integer(), nullable=True))
+    op.add_column('images', sa.Column('orientation', sa.String(length=10), nullable=True))
+    op.add_column('images', sa.Column('format', sa.String(length=10), nullable=True))
+    op.add_column('images', sa.Column('taken_at', sa.DateTime(), nullable=True))
+    op.add_column('images', sa.Column('camera', sa.String(length=100), nullable=True))
+    op.add_column('images', sa.Column('byte_size', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_images_orientation'), 'images', ['orientation'], unique=False)
+    op.create_index(op.f('ix_images_format'), 'images', ['format'], unique=False)
+    op.create_index(op.f('ix_images_taken_at'), 'images', ['taken_at'], unique=False)
+    op.create_index(op.f('ix_images_camera'), 'images', ['camera'], unique=False)
+    op.create_index('ix_images_user_id_taken_at', 'images', ['user_id', 'taken_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_images_user_id_taken_at', table_name='images')
+    op.drop_index(op.f('ix_images_camera'), table_name='images')
+    op.drop_index(op.f('ix_images_taken_at'), table_name='images')
+    op.drop_index(op.f('ix_images_format'), table_name='images')
+    op.drop_index(op.f('ix_images_orientation'), table_name='images')
+    op.drop_column('images', 'byte_size')
+    op.drop_column('images', 'camera')
+    op.drop_column('images', 'taken_at')
+    op.drop_column('images', 'format')
+    op.drop_column('images', 'orientation')
+    op.drop_column('images', 'height')
+    op.drop_column('images', 'width')
@@ -0,0 +1,24 @@
+"""add image variants
+
+Revision ID: 7b2e5d90c3a8
+Revises: 1f3c9b2a7d41
+Create Date: 2026-10-19 11:32:40.106724
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2e5d90c3a8'
+down_revision = '1f3c9b2a7d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('images', 'variants')
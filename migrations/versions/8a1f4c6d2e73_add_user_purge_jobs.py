@@ -0,0 +1,46 @@
+"""add user purge jobs
+
+Revision ID: 8a1f4c6d2e73
+Revises: 5c0e7a93d1b4
+Create Date: 2026-10-19 18:21:07.402519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a1f4c6d2e73'
+down_revision = '5c0e7a93d1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_users_deleted_at'), 'users', ['deleted_at'], unique=False)
+    op.create_table('user_purge_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('images_total', sa.Integer(), nullable=False),
+    sa.Column('images_deleted', sa.Integer(), nullable=False),
+    sa.Column('comments_total', sa.Integer(), nullable=False),
+    sa.Column('comments_deleted', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_purge_jobs_user_id'), 'user_purge_jobs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_user_purge_jobs_status'), 'user_purge_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_user_purge_jobs_status'), table_name='user_purge_jobs')
+    op.drop_index(op.f('ix_user_purge_jobs_user_id'), table_name='user_purge_jobs')
+    op.drop_table('user_purge_jobs')
+    op.drop_index(op.f('ix_users_deleted_at'), table_name='users')
+    op.drop_column('users', 'deleted_at')
@@ -0,0 +1,36 @@
+"""add storage deletions
+
+Revision ID: 9e5c2d7a4f18
+Revises: c4a81f6e2b97
+Create Date: 2026-10-19 14:02:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e5c2d7a4f18'
+down_revision = 'c4a81f6e2b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('storage_deletions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('asset', sa.String(length=500), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('not_before', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'asset')
+    )
+    op.create_index(op.f('ix_storage_deletions_not_before'), 'storage_deletions', ['not_before'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_storage_deletions_not_before'), table_name='storage_deletions')
+    op.drop_table('storage_deletions')
@@ -0,0 +1,23 @@
+"""backfill user updated_at
+
+Revision ID: a7c3e5d92b14
+Revises: f41b6c9e0a27
+Create Date: 2026-10-20 12:26:40.913802
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5d92b14'
+down_revision = 'f41b6c9e0a27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("UPDATE users SET updated_at = COALESCE(created_at, now()) WHERE updated_at IS NULL")
+
+
+def downgrade() -> None:
+    pass
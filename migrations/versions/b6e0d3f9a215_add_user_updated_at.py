@@ -0,0 +1,24 @@
+"""add user updated_at
+
+Revision ID: b6e0d3f9a215
+Revises: 8a1f4c6d2e73
+Create Date: 2026-10-19 19:02:44.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e0d3f9a215'
+down_revision = '8a1f4c6d2e73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'updated_at')
@@ -0,0 +1,34 @@
+"""add derived images
+
+Revision ID: c4a81f6e2b97
+Revises: 7b2e5d90c3a8
+Create Date: 2026-10-19 12:10:03.551290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a81f6e2b97'
+down_revision = '7b2e5d90c3a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('derived_images',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('image_id', sa.Integer(), nullable=False),
+    sa.Column('transform_hash', sa.String(length=64), nullable=False),
+    sa.Column('transformation', sa.JSON(), nullable=False),
+    sa.Column('image_url', sa.String(length=500), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['image_id'], ['images.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('image_id', 'transform_hash')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('derived_images')
@@ -0,0 +1,29 @@
+"""add signed uploads
+
+Revision ID: d2f7a8c41e90
+Revises: b6e0d3f9a215
+Create Date: 2026-10-20 10:14:52.180337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f7a8c41e90'
+down_revision = 'b6e0d3f9a215'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('signed_uploads',
+    sa.Column('public_id', sa.String(length=255), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('public_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('signed_uploads')
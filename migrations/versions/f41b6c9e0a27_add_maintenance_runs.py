@@ -0,0 +1,28 @@
+"""add maintenance runs
+
+Revision ID: f41b6c9e0a27
+Revises: d2f7a8c41e90
+Create Date: 2026-10-20 11:02:17.655140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f41b6c9e0a27'
+down_revision = 'd2f7a8c41e90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('maintenance_runs',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('last_run_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('maintenance_runs')
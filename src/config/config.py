@@ -3,6 +3,7 @@ from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    sqlalchemy_echo: bool = False
     secret_key: str
     algorithm: str
     mail_username: str
@@ -15,6 +16,54 @@ class Settings(BaseSettings):
     cloudinary_name: str
     cloudinary_api_key: int
     cloudinary_api_secret: str
+    storage_backend: str = "cloudinary"
+    storage_local_root: str = "./media"
+    storage_local_base_url: str = "/api/storage"
+    storage_local_accel_redirect: str = ""
+    image_normalize: bool = False
+    image_max_edge: int = 2048
+    image_format: str = "WEBP"
+    image_quality: int = 80
+    image_workers: int = 2
+    phash_max_distance: int = 6
+    image_variants: str = "thumb:200,medium:800,large:1600"
+    transform_cache_dir: str = "./transform_cache"
+    transform_cache_max_bytes: int = 512 * 1024 * 1024
+    transform_max_size: int = 4096
+    qr_cache_dir: str = "./qr_cache"
+    qr_cache_max_bytes: int = 64 * 1024 * 1024
+    qr_memory_cache_items: int = 1024
+    upload_spool_max_memory: int = 1024 * 1024
+    upload_concurrency: int = 4
+    upload_batch_max_files: int = 50
+    pictures_batch_max_ids: int = 100
+    signed_upload_expire_seconds: int = 600
+    upload_queue_backend: str = "redis"
+    upload_queue_workers: int = 2
+    upload_job_ttl: int = 24 * 60 * 60
+    upload_job_timeout: int = 600
+    upload_spool_dir: str = "./spool"
+    comment_delete_chunk_size: int = 1000
+    comment_events_backend: str = "redis"
+    comment_events_queue_size: int = 100
+    comment_events_heartbeat: float = 15.0
+    storage_gc_enabled: bool = True
+    storage_gc_batch_size: int = 100
+    storage_gc_batch_delay: float = 1.0
+    storage_gc_interval: int = 60
+    storage_gc_retry_delay: int = 30
+    storage_gc_max_attempts: int = 8
+    storage_gc_reconcile_interval: int = 24 * 60 * 60
+    storage_gc_grace_seconds: int = 24 * 60 * 60
+    user_purge_enabled: bool = True
+    user_purge_chunk_size: int = 200
+    user_purge_batch_delay: float = 0.5
+    user_purge_interval: int = 30
+    user_purge_max_attempts: int = 5
+    log_level: str = "INFO"
+    log_levels: str = "sqlalchemy.engine=WARNING"
+    log_format: str = "text"
+    log_debug_sample_rate: float = 0.1
 
     class Config:
         env_file = ".env"
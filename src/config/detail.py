@@ -29,3 +29,13 @@ USER_IS_LOGOUT = "User is logout"
 USER_REMOVE = 'User removed'
 User_REMOVE_FROM_BLACKLIST = "User remove from blacklist"
 
+INVALID_IMAGE = "Invalid image file"
+UPLOAD_FAILED = "Upload failed"
+TOO_MANY_FILES = "Too many files in one request"
+INVALID_UPLOAD_TOKEN = "Invalid or expired upload token"
+UPLOAD_NOT_FOUND = "Uploaded file not found"
+UPLOAD_ALREADY_REGISTERED = "Upload already registered"
+INVALID_TRANSFORMATION = "Invalid transformation"
+UNSIGNED_TRANSFORMATION = "Transformation is not signed"
+INVALID_FIELDS = "Invalid fields"
+TOO_MANY_IDS = "Too many ids"
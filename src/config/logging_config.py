@@ -0,0 +1,152 @@
+"""
+Logging of the application.
+
+The threads that log only put their records on a queue, a background thread formats and writes them,
+so a slow stream never blocks a request. Every record carries the id of the request it was logged in,
+taken from the ``X-Request-ID`` header or generated, and the id is sent back in the response.
+Debug records are sampled with ``settings.log_debug_sample_rate``, and the level of single loggers is
+set with ``settings.log_levels``, e.g. ``sqlalchemy.engine=INFO`` to log the SQL statements.
+"""
+import json
+import logging
+import queue
+import random
+import re
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from src.config.config import settings
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+
+request_id: ContextVar[str] = ContextVar('request_id', default='-')
+valid_request_id = re.compile(r'^[\w.-]{1,128}$')
+
+_handler = None
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    '''
+    The **RequestIdFilter** class adds the id of the current request to the records.
+    '''
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    The **SamplingFilter** class lets through only a share of the debug records.
+
+    :param rate: float: The share of debug records to keep, from 0 to 1
+    '''
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    The **JsonFormatter** class writes a record as one line of JSON.
+    '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({'time': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+                           'request_id': getattr(record, 'request_id', '-'), 'message': record.getMessage()},
+                          default=str)
+
+
+def parse_levels(levels: str) -> dict:
+    '''
+    The **parse_levels** function reads the levels of single loggers.
+
+    :param levels: str: Comma separated ``logger=LEVEL`` pairs
+    :return: A dict of logger name to level name
+    '''
+    result = {}
+    for item in (levels or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            result[name.strip()] = level.strip().upper()
+    return result
+
+
+def setup_logging(stream=None) -> QueueListener:
+    '''
+    The **setup_logging** function sends the records of all loggers through a queue to a background writer.
+    Calling it again does nothing until **stop_logging** is called.
+
+    :param stream: The stream to write to, stderr if not given
+    :return: The listener writing the records
+    '''
+    global _handler, _listener
+    if _listener is not None:
+        return _listener
+    log_queue = queue.SimpleQueue()
+    _handler = QueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+    _handler.addFilter(SamplingFilter(settings.log_debug_sample_rate))
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if settings.log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.setLevel(settings.log_level.upper())
+    root.addHandler(_handler)
+    for name, level in parse_levels(settings.log_levels).items():
+        logging.getLogger(name).setLevel(level)
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    '''
+    The **stop_logging** function writes the queued records and stops the background writer.
+
+    :return: None
+    '''
+    global _handler, _listener
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _handler = _listener = None
+
+
+class RequestIdMiddleware:
+    '''
+    The **RequestIdMiddleware** class sets the id of every request for the log records and sends it back
+    in the ``X-Request-ID`` header. A valid id sent by the client or a proxy is kept.
+
+    :param app: The ASGI application
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        current = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if current is None or not valid_request_id.match(current):
+            current = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = current
+            await send(message)
+
+        token = request_id.set(current)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id.reset(token)
@@ -7,6 +7,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 
 from src.config.config import settings
+from src.services.metrics import instrument_engine
 
 
 # Create DB URI
@@ -14,7 +15,8 @@ URI = settings.sqlalchemy_database_url
 
 
 # Create engine and session
-engine = create_engine(URI, echo=True)
+engine = create_engine(URI, echo=settings.sqlalchemy_echo)
+instrument_engine(engine)
 DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
@@ -1,9 +1,10 @@
 import enum
 
-from sqlalchemy import Boolean, Column, Table, Integer, String, Date, Enum, ForeignKey, DateTime, func
+from sqlalchemy import Boolean, Column, Table, Integer, String, Date, Enum, ForeignKey, DateTime, JSON, func, \
+    UniqueConstraint, Index
 from sqlalchemy.dialects.postgresql import ARRAY
 
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, backref, synonym
 
 Base = declarative_base()
 
@@ -25,17 +26,89 @@ class TagsImages(Base):
 
 class Image(Base):
     __tablename__ = "images"
+    __table_args__ = (Index('ix_images_user_id_taken_at', 'user_id', 'taken_at'),)
     id = Column(Integer, primary_key=True)
-    image_url = Column(String(255), unique=True, nullable=False)
+    image_url = Column(String(255), nullable=False)
     qr_code_url = Column(String(255), unique=True)
-    public_id = Column(String(255), unique=True, nullable=False)
+    public_id = Column(String(255), index=True, nullable=False)
+    content_hash = Column(String(64), index=True)
+    variants = Column(JSON)
+    phash = Column(String(16))
+    phash_0 = Column(Integer, index=True)
+    phash_1 = Column(Integer, index=True)
+    phash_2 = Column(Integer, index=True)
+    phash_3 = Column(Integer, index=True)
+    width = Column(Integer)
+    height = Column(Integer)
+    orientation = Column(String(10), index=True)
+    format = Column(String(10), index=True)
+    taken_at = Column(DateTime, index=True)
+    camera = Column(String(100), index=True)
+    byte_size = Column(Integer)
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'))
     created_at = Column('created_at', DateTime, default=func.now())
-    updated_at = Column('updated_at', DateTime, default=func.now())
+    updated_at = Column('updated_at', DateTime, default=func.now(), onupdate=func.now())
     description = Column(String(255))
     user = relationship('User', backref="images")
 
 
+class DerivedImage(Base):
+    __tablename__ = "derived_images"
+    __table_args__ = (UniqueConstraint('image_id', 'transform_hash'),)
+    id = Column(Integer, primary_key=True)
+    image_id = Column(Integer, ForeignKey('images.id', ondelete="CASCADE"), nullable=False)
+    transform_hash = Column(String(64), nullable=False)
+    transformation = Column(JSON, nullable=False)
+    image_url = Column(String(500), nullable=False)
+    created_at = Column(DateTime, default=func.now())
+    image = relationship('Image', backref=backref("derived_images", cascade="all, delete-orphan",
+                                                  passive_deletes=True))
+
+
+class SignedUpload(Base):
+    __tablename__ = "signed_uploads"
+    # one row per finalized direct upload, the primary key rejects a second use of the same upload token
+    public_id = Column(String(255), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+
+class StorageDeletion(Base):
+    __tablename__ = "storage_deletions"
+    __table_args__ = (UniqueConstraint('kind', 'asset'),)
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    asset = Column(String(500), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String(255))
+    not_before = Column(DateTime, default=func.now(), index=True)
+    created_at = Column(DateTime, default=func.now())
+
+
+class MaintenanceRun(Base):
+    __tablename__ = "maintenance_runs"
+    # the last run of a periodic task shared by all the workers
+    name = Column(String(50), primary_key=True)
+    last_run_at = Column(DateTime)
+
+
+class UserPurgeJob(Base):
+    __tablename__ = "user_purge_jobs"
+    id = Column(Integer, primary_key=True)
+    # no foreign key, the job outlives the user it removes
+    user_id = Column(Integer, nullable=False, index=True)
+    status = Column(String(20), default='pending', nullable=False, index=True)
+    images_total = Column(Integer, default=0, nullable=False)
+    images_deleted = Column(Integer, default=0, nullable=False)
+    comments_total = Column(Integer, default=0, nullable=False)
+    comments_deleted = Column(Integer, default=0, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(String(255))
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    finished_at = Column(DateTime)
+
+
 class Tag(Base):
     __tablename__ = "tags"
     id = Column(Integer, primary_key=True, index=True)
@@ -57,6 +130,7 @@ class Comment(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user = relationship('User', backref="comments")
+    author = synonym('user')
     image_id = Column(Integer, ForeignKey("images.id"), nullable=True)
     image = relationship('Image', backref="comments")
 
@@ -73,3 +147,5 @@ class User(Base):
     created_at = Column(DateTime, default=func.now())
     confirmed = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
+    deleted_at = Column(DateTime, index=True)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
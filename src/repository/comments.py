@@ -1,10 +1,15 @@
-from typing import List
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, delete, func, select
+
+from src.config.config import settings
 
 from src.database.models import User, Comment, Role
 from src.schemas.comments import CommentBase
+from src.services.loaders import get_loader
 
 
 async def add_comment(image_id: int, body: CommentBase, db: Session, user: User) -> Comment:
@@ -24,6 +29,29 @@ async def add_comment(image_id: int, body: CommentBase, db: Session, user: User)
     return new_comment
 
 
+async def load_comment(comment_id: int, db: Session) -> Comment | None:
+    """
+    Loads a comment by id with the comment loader of the session.
+    The comments loaded in the same event loop tick are fetched with one query.
+
+    :param comment_id: int: The id of the comment
+    :param db: Session: Access the database
+    :return: A comment object or None
+    """
+    return await get_loader(db, Comment.id).load(comment_id)
+
+
+def can_edit_comment(comment: Comment, user: User) -> bool:
+    """
+    Checks whether a user may edit a comment: admins and moderators may edit any comment, users their own.
+
+    :param comment: Comment: The comment
+    :param user: User: The user
+    :return: True if the user may edit the comment
+    """
+    return user.roles in [Role.admin, Role.moderator] or comment.user_id == user.id
+
+
 async def edit_comment(comment_id: int, body: CommentBase, db: Session, user: User) -> Comment | None:
     """
     Allows a user to edit their own comment.
@@ -32,11 +60,11 @@ async def edit_comment(comment_id: int, body: CommentBase, db: Session, user: Us
     :param body: CommentBase: Pass the data from the request body to this function
     :param db: Session: Connect to the database
     :param user: User: Check if the user is an admin, moderator or the author of the comment
-    :return: A comment object
+    :return: A comment object, unchanged if the user may not edit it
     """
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = await load_comment(comment_id, db)
     if comment:
-        if user.roles in [Role.admin, Role.moderator] or comment.user_id == user.id:
+        if can_edit_comment(comment, user):
             comment.comment = body.comment
             comment.updated_at = func.now()
             db.commit()
@@ -52,14 +80,71 @@ async def delete_comment(comment_id: int, db: Session, user: User) -> None:
     :param user: User: Check if the user is Admin or Moderator and authorized to delete a comment
     :return: The comment that was deleted
     """
-    comment = db.query(Comment).filter(Comment.id == comment_id).first()
+    comment = await load_comment(comment_id, db)
     if comment:
         if user.roles in [Role.admin, Role.moderator]:
+            # the author is sent with the deleted comment, it can not be loaded once the comment is detached
+            db.refresh(comment, ['user'])
             db.delete(comment)
             db.commit()
     return comment
 
 
+async def delete_comments(db: Session, comment_ids: List[int] = None, user_id: int = None, image_id: int = None,
+                          created_after: datetime = None, created_before: datetime = None,
+                          chunk_size: int = None) -> Dict[int, int]:
+    """
+    Deletes comments in bulk, by id list, by author or by image, optionally within a time range.
+    The comments are deleted with set-based ``DELETE ... WHERE`` statements of at most ``chunk_size`` rows,
+    each committed on its own, so a large cleanup never holds long locks.
+
+    :param db: Session: Connect to the database
+    :param comment_ids: List[int]: The ids of the comments to delete
+    :param user_id: int: Delete the comments of this author
+    :param image_id: int: Delete the comments of this image
+    :param created_after: datetime: Only delete comments created at or after this time
+    :param created_before: datetime: Only delete comments created at or before this time
+    :param chunk_size: int: The maximum number of comments deleted by one statement
+    :return: The number of deleted comments per image id
+    """
+    chunk_size = chunk_size or settings.comment_delete_chunk_size
+    conditions = []
+    if user_id is not None:
+        conditions.append(Comment.user_id == user_id)
+    if image_id is not None:
+        conditions.append(Comment.image_id == image_id)
+    if created_after is not None:
+        conditions.append(Comment.created_at >= created_after)
+    if created_before is not None:
+        conditions.append(Comment.created_at <= created_before)
+    if comment_ids is not None:
+        unique_ids = sorted(set(comment_ids))
+        chunks = [Comment.id.in_(unique_ids[start:start + chunk_size])
+                  for start in range(0, len(unique_ids), chunk_size)]
+    elif conditions:
+        chunks = None
+    else:
+        raise ValueError("No comments selected")
+
+    deleted = Counter()
+
+    def delete_chunk(condition) -> int:
+        rows = db.execute(delete(Comment).where(condition, *conditions).returning(Comment.image_id),
+                          execution_options={"synchronize_session": False}).all()
+        db.commit()
+        deleted.update(row.image_id for row in rows)
+        return len(rows)
+
+    if chunks is not None:
+        for condition in chunks:
+            delete_chunk(condition)
+    else:
+        chunk = select(Comment.id).where(*conditions).order_by(Comment.id).limit(chunk_size).scalar_subquery()
+        while delete_chunk(Comment.id.in_(chunk)) == chunk_size:
+            pass
+    return dict(deleted)
+
+
 async def get_comment_by_id(comment_id: int, db: Session, user: User) -> Comment | None:
     """
     Returns a comment from the database by comment_id.
@@ -81,7 +166,7 @@ async def get_comments_by_user_id(user_id: int, db: Session) -> List[Comment] |
     :param db: Session: Pass the database session to the function
     :return: A list of comments
     """
-    return db.query(Comment).filter(Comment.user_id == user_id).all()
+    return db.query(Comment).options(selectinload(Comment.user)).filter(Comment.user_id == user_id).all()
 
 
 async def get_user_comments_by_image(user_id: int, image_id: int, db: Session) -> List[Comment] | None:
@@ -93,15 +178,20 @@ async def get_user_comments_by_image(user_id: int, image_id: int, db: Session) -
     :param db: Session: Pass the database session to the function
     :return: A list of comments, or none if the user doesn't exist
     """
-    return db.query(Comment).filter(and_(Comment.user_id == user_id, Comment.image_id == image_id)).all()
+    return db.query(Comment).options(selectinload(Comment.user)). \
+        filter(and_(Comment.user_id == user_id, Comment.image_id == image_id)).all()
 
 
-async def get_image_comments(image_id: int, db: Session) -> List[Comment]:
+async def get_image_comments(image_id: int, db: Session, limit: int = None, offset: int = 0) -> List[Comment]:
     """
-    Returns a list of comments for the specified image_id.
+    Returns a list of comments for the specified image_id, oldest first.
+    The authors of the comments are loaded with one more query for the whole page.
 
     :param image_id: int: Filter the comments by image_id
     :param db: Session: Pass the database session to the function
+    :param limit: int: The maximum number of comments, all of them if not given
+    :param offset: int: The number of comments to skip
     :return: A list of comments for a given image
     """
-    return db.query(Comment).filter(Comment.image_id == image_id).all()
+    return db.query(Comment).options(selectinload(Comment.user)).filter(Comment.image_id == image_id). \
+        order_by(Comment.created_at, Comment.id).limit(limit).offset(offset).all()
@@ -1,17 +1,26 @@
+import hashlib
+import json
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, desc, or_, update
 
 
 from src.database.models import User, Image
 from src.schemas.pictures import EditImageModel
 
-from src.database.models import User, Image, Tag, TagsImages
+from src.database.models import User, Image, Tag, TagsImages, DerivedImage, SignedUpload
 
 
 
+from src.config.config import settings
 from src.services.cloud_image import CloudImage
-from cloudinary import CloudinaryImage
-import qrcode
+from src.services.loaders import get_loader
+from src.services.perceptual_hash import MAX_SEARCH_DISTANCE, chunk_neighbours, hamming, split_hash
+from src.services.qr_codes import QR_CODE_URL, get_qr_service
+from src.services.serialization import load_fields
+from src.services.storage_gc import enqueue_deletions
 
 
 def create_taglist(tags: str) -> list:
@@ -25,21 +34,62 @@ def create_taglist(tags: str) -> list:
 async def add_tags_to_db(tags: str, image, db):
 
     tag_list = create_taglist(tags)
-    for tg in tag_list:
-        if not db.query(Tag).filter_by(tag=tg).first():
-            new_tag = Tag(tag=tg)
-            db.add(new_tag)
-            db.commit()
-            db.refresh(new_tag)
-        else:
-            new_tag = db.query(Tag).filter(Tag.tag == tg).first()
-        tag_pic = TagsImages(image_id=image.id, tag_id=new_tag.id)
-        db.add(tag_pic)
+    tag_objects = await get_or_create_tags(tag_list, db)
+    db.add_all([TagsImages(image_id=image.id, tag_id=tag_objects[tg].id) for tg in dict.fromkeys(tag_list)])
+    db.commit()
+
+
+async def claim_signed_upload(public_id: str, user: User, db: Session) -> bool:
+    """
+    The **claim_signed_upload** function records that a direct upload is being registered.
+    Only the first claim of a public id succeeds, so an upload token can not be used twice.
+
+    :param public_id: str: The name of the uploaded image
+    :param user: User: The user registering the upload
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: True if the upload was not claimed before
+    """
+    db.add(SignedUpload(public_id=public_id, user_id=user.id))
+    try:
         db.commit()
-        db.refresh(tag_pic)
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
+async def release_signed_upload(public_id: str, db: Session) -> None:
+    """
+    The **release_signed_upload** function drops the claim of an upload that could not be registered,
+    so the client can try again with the same token.
+
+    :param public_id: str: The name of the uploaded image
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: None
+    """
+    db.rollback()
+    db.query(SignedUpload).filter(SignedUpload.public_id == public_id).delete(synchronize_session=False)
+    db.commit()
+
 
+def phash_columns(perceptual_hash: int = None) -> dict:
+    """
+    The **phash_columns** function returns the values of the perceptual hash columns of an image.
 
-async def create(description: str, tags, image_url: str, public_id: str, user: User, db: Session):
+    :param perceptual_hash: int: The dHash of the image
+    :return: A dict of column name to value, empty if the hash is not known
+    """
+    if perceptual_hash is None:
+        return {}
+    columns = {'phash': f"{perceptual_hash:016x}"}
+    for index, chunk in enumerate(split_hash(perceptual_hash)):
+        columns[f'phash_{index}'] = chunk
+    return columns
+
+
+async def create(description: str, tags, image_url: str, public_id: str, user: User, db: Session,
+                 content_hash: str = None, variants: dict = None, perceptual_hash: int = None,
+                 metadata: dict = None):
     """
     The **create** function creates a new image in the database.
     :param tags: tags to add
@@ -47,9 +97,15 @@ async def create(description: str, tags, image_url: str, public_id: str, user: U
     :param image_url: str: The url of the image
     :param user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
+    :param content_hash: str: The SHA-256 of the uploaded file
+    :param variants: dict: The urls of the resized copies of the image
+    :param perceptual_hash: int: The dHash of the image
+    :param metadata: dict: The values of the metadata columns
     :return: A image object
     """
-    image = Image(description=description, image_url=image_url, public_id=public_id, user_id=user.id)
+    image = Image(description=description, image_url=image_url, public_id=public_id, user_id=user.id,
+                  content_hash=content_hash, variants=variants, **phash_columns(perceptual_hash),
+                  **(metadata or {}))
     db.add(image)
     db.commit()
     db.refresh(image)
@@ -59,35 +115,198 @@ async def create(description: str, tags, image_url: str, public_id: str, user: U
     return image
 
 
-async def get_images(limit: int, offset: int, user: User, db: Session):
+async def get_or_create_tags(tag_names: list, db: Session) -> dict:
+    """
+    The **get_or_create_tags** function loads the given tags with the tag loader and adds the missing ones.
+    The session is flushed but not committed.
+
+    :param tag_names: list: The tag names
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A dict of tag name to Tag
+    """
+    names = list(dict.fromkeys(tag_names))
+    if not names:
+        return {}
+    loader = get_loader(db, Tag.tag)
+    tags = dict(zip(names, await loader.load_many(names)))
+    missing = [name for name, tag in tags.items() if tag is None]
+    for name in missing:
+        tags[name] = Tag(tag=name)
+        db.add(tags[name])
+    db.flush()
+    for name in missing:
+        loader.prime(name, tags[name])
+    return tags
+
+
+async def create_many(items: list, user: User, db: Session) -> list:
+    """
+    The **create_many** function creates several images with their tags in one transaction.
+
+    :param items: list: Dicts with the description, tags, image_url, public_id, content_hash, variants,
+        perceptual_hash and metadata of each image
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A list of image objects in the order of the items
+    """
+    images = [Image(description=item['description'], image_url=item['image_url'], public_id=item['public_id'],
+                    content_hash=item.get('content_hash'), variants=item.get('variants'), user_id=user.id,
+                    **phash_columns(item.get('perceptual_hash')), **(item.get('metadata') or {}))
+              for item in items]
+    db.add_all(images)
+    tag_lists = [create_taglist(item['tags'] or '') for item in items]
+    tags = await get_or_create_tags([tg for tag_list in tag_lists for tg in tag_list], db)
+    db.flush()
+    db.add_all([TagsImages(image_id=image.id, tag_id=tags[tg].id)
+                for image, tag_list in zip(images, tag_lists) for tg in tag_list])
+    db.commit()
+    for image in images:
+        db.refresh(image)
+    return images
+
+
+async def get_images(limit: int, offset: int, user: User, db: Session, orientation: str = None,
+                     taken_after: datetime = None, taken_before: datetime = None, taken_year: int = None,
+                     camera: str = None, image_format: str = None, min_width: int = None, min_height: int = None,
+                     fields: tuple = None):
     '''
     The **get_images** function gets all the images from the database.
+    The images can be filtered by the metadata read when they were uploaded.
     
     :param limit: int: The number of images to return
     :param offset: int: The number of images to skip
     :param user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
+    :param orientation: str: landscape, portrait or square
+    :param taken_after: datetime: The earliest capture time
+    :param taken_before: datetime: The latest capture time
+    :param taken_year: int: The year the photos were taken in
+    :param camera: str: The camera make and model
+    :param image_format: str: The file format, e.g. jpeg
+    :param min_width: int: The minimum width in pixels
+    :param min_height: int: The minimum height in pixels
+    :param fields: tuple: Only load these columns, see **load_fields**
     :return: A list of image objects
     '''
-    images = db.query(Image).filter(and_(Image.user_id == user.id)). \
+    conditions = image_filters(user, orientation=orientation, taken_after=taken_after, taken_before=taken_before,
+                               taken_year=taken_year, camera=camera, image_format=image_format,
+                               min_width=min_width, min_height=min_height)
+    query = db.query(Image)
+    if fields is not None:
+        query = query.options(load_fields(Image, fields))
+    images = query.filter(and_(*conditions)). \
         order_by(desc(Image.created_at)).limit(limit).offset(offset).all()
     return images
 
 
-async def get_image(image_id: int, user: User, db: Session):
+
+def image_filters(user: User, orientation: str = None, taken_after: datetime = None, taken_before: datetime = None,
+                  taken_year: int = None, camera: str = None, image_format: str = None, min_width: int = None,
+                  min_height: int = None) -> list:
+    '''
+    The **image_filters** function returns the conditions selecting the images of a user by their metadata.
+    See **get_images** for the parameters.
+
+    :return: A list of SQL conditions
+    '''
+    conditions = [Image.user_id == user.id]
+    if orientation is not None:
+        conditions.append(Image.orientation == orientation)
+    if taken_after is not None:
+        conditions.append(Image.taken_at >= taken_after)
+    if taken_before is not None:
+        conditions.append(Image.taken_at <= taken_before)
+    if taken_year is not None:
+        conditions.append(Image.taken_at >= datetime(taken_year, 1, 1))
+        conditions.append(Image.taken_at < datetime(taken_year + 1, 1, 1))
+    if camera is not None:
+        conditions.append(Image.camera == camera)
+    if image_format is not None:
+        conditions.append(Image.format == image_format.lower())
+    if min_width is not None:
+        conditions.append(Image.width >= min_width)
+    if min_height is not None:
+        conditions.append(Image.height >= min_height)
+    return conditions
+
+
+async def get_image_versions(limit: int, offset: int, user: User, db: Session, **filters) -> list:
+    '''
+    The **get_image_versions** function returns the ids and versions of the page **get_images** would return.
+    Only the two columns are read, so it is a cheap way to tell whether the page changed.
+
+    :param limit: int: The number of images
+    :param offset: int: The number of images to skip
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :param filters: The metadata filters of **get_images**
+    :return: A list of rows with the id and updated_at of the images
+    '''
+    return db.query(Image.id, Image.updated_at).filter(and_(*image_filters(user, **filters))). \
+        order_by(desc(Image.created_at)).limit(limit).offset(offset).all()
+
+
+async def get_image_version(image_id: int, user: User, db: Session):
+    '''
+    The **get_image_version** function returns the version of a single image without loading it.
+
+    :param image_id: int: The id of the image
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A row with the updated_at of the image, None if the user has no such image
+    '''
+    return db.query(Image.updated_at).filter(and_(Image.user_id == user.id, Image.id == image_id)).first()
+
+
+async def get_image_url(image_id: int, user: User, db: Session):
+    '''
+    The **get_image_url** function returns the url of a single image without loading it.
+
+    :param image_id: int: The id of the image
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The url of the image, None if the user has no such image
+    '''
+    return db.query(Image.image_url).filter(and_(Image.user_id == user.id, Image.id == image_id)).scalar()
+
+
+async def get_image(image_id: int, user: User, db: Session, fields: tuple = None):
     '''
     The **get_image** function gets a single image from the database.
     
     :param image_id: int: The id of the image to return
     :param user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
+    :param fields: tuple: Only load these columns, see **load_fields**
     :return: A image object
     '''
-    image = db.query(Image).filter(and_(Image.user_id == user.id, Image.id == image_id)). \
+    query = db.query(Image)
+    if fields is not None:
+        query = query.options(load_fields(Image, fields))
+    image = query.filter(and_(Image.user_id == user.id, Image.id == image_id)). \
         order_by(desc(Image.created_at)).first()
     return image
 
 
+async def get_images_by_ids(image_ids: list, user: User, db: Session, fields: tuple = None) -> list:
+    '''
+    The **get_images_by_ids** function gets several images of a user with one query.
+
+    :param image_ids: list: The ids of the images
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :param fields: tuple: Only load these columns, see **load_fields**
+    :return: The images of the user in the order of the ids, ids of other users' images are skipped
+    '''
+    if not image_ids:
+        return []
+    query = db.query(Image)
+    if fields is not None:
+        query = query.options(load_fields(Image, fields))
+    images = {image.id: image for image in query.filter(and_(Image.id.in_(image_ids), Image.user_id == user.id))}
+    return [images[image_id] for image_id in image_ids if image_id in images]
+
+
 async def get_image_from_id(image_id: int, user: User, db: Session):
     '''
     The **get_image_from_id** function gets a single image from the database.
@@ -114,6 +333,47 @@ async def get_image_from_url(image_url: str, user: User, db: Session):
     return image
 
 
+async def get_image_by_hash(content_hash: str, db: Session):
+    '''
+    The **get_image_by_hash** function finds an image with the same content, uploaded by any user.
+
+    :param content_hash: str: The SHA-256 of the file
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A image object or None
+    '''
+    return db.query(Image).filter(Image.content_hash == content_hash).first()
+
+
+async def find_similar(perceptual_hash: int, db: Session, max_distance: int = None, user: User = None,
+                       exclude_id: int = None, limit: int = 20) -> list:
+    '''
+    The **find_similar** function finds images whose perceptual hash is within ``max_distance`` bits.
+    Candidates are selected through the indexed hash chunks and only they are compared bit by bit.
+
+    :param perceptual_hash: int: The dHash to search for
+    :param db: Session: A connection to our Postgres SQL database.
+    :param max_distance: int: The maximum Hamming distance, ``settings.phash_max_distance`` by default,
+        at most ``MAX_SEARCH_DISTANCE``
+    :param user: User: Only search the images of this user
+    :param exclude_id: int: The id of an image to leave out, e.g. the searched one
+    :param limit: int: The maximum number of images
+    :return: A list of (image, distance) pairs, the most similar first
+    '''
+    max_distance = settings.phash_max_distance if max_distance is None else max_distance
+    max_distance = min(max_distance, MAX_SEARCH_DISTANCE)
+    columns = (Image.phash_0, Image.phash_1, Image.phash_2, Image.phash_3)
+    query = db.query(Image).filter(or_(*[column.in_(chunk_neighbours(chunk, max_distance))
+                                         for column, chunk in zip(columns, split_hash(perceptual_hash))]))
+    if user is not None:
+        query = query.filter(Image.user_id == user.id)
+    if exclude_id is not None:
+        query = query.filter(Image.id != exclude_id)
+    matches = [(image, hamming(int(image.phash, 16), perceptual_hash)) for image in query]
+    matches = [match for match in matches if match[1] <= max_distance]
+    matches.sort(key=lambda match: (match[1], match[0].id))
+    return matches[:limit]
+
+
 async def remove(image_id: int, user: User, db: Session):
     '''
     The **remove** function deletes a single image from the database.
@@ -124,69 +384,119 @@ async def remove(image_id: int, user: User, db: Session):
     :return: A image object
     '''
     image = await get_image_from_id(image_id, user, db)
-    db.delete(image)
-    db.commit()
+    if image:
+        enqueue_deletions(db, public_ids=[image.public_id], files=[image.qr_code_url])
+        db.delete(image)
+        db.commit()
     return image
 
 
+def build_transformation(body: EditImageModel) -> list:
+    '''
+    The **build_transformation** function turns the enabled filters of an edit request into
+    a Cloudinary-style transformation list.
+
+    :param body: EditImageModel: The body of the request
+    :return: A list of transformation steps, empty if no filter is enabled
+    '''
+    edit_data = []
+    if body.circle.use_filter and body.circle.height and body.circle.width:
+        edit_data.extend([{'gravity': "face", 'height': f"{body.circle.height}", 'width': f"{body.circle.width}",
+                           'crop': "thumb"},
+                          {'radius': "max"}])
+
+    if body.effect.use_filter:
+        effect = ""
+        if body.effect.art_audrey:
+            effect = "art:audrey"
+        if body.effect.art_zorro:
+            effect = "art:zorro"
+        if body.effect.blur:
+            effect = "blur:300"
+        if body.effect.cartoonify:
+            effect = "cartoonify"
+        if effect:
+            edit_data.append({"effect": f"{effect}"})
+
+    if body.resize.use_filter and body.resize.height and body.resize.width:
+        crop = ""
+        if body.resize.crop:
+            crop = "crop"
+        if body.resize.fill:
+            crop = "fill"
+        if crop:
+            edit_data.append({"gravity": "auto", 'height': f"{body.resize.height}", 'width': f"{body.resize.width}",
+                              'crop': f"{crop}"})
+
+    if body.rotate.use_filter and body.rotate.width and body.rotate.degree:
+        edit_data.extend([{'width': f"{body.rotate.width}", 'crop': "scale"}, {'angle': "vflip"},
+                          {'angle': f"{body.rotate.degree}"}])
+    return edit_data
+
+
+def transformation_hash(transformation: list) -> str:
+    '''
+    The **transformation_hash** function computes a canonical hash of a transformation list,
+    so equal edits get the same key whatever order the options were given in.
+
+    :param transformation: list: The transformation steps
+    :return: The SHA-256 of the canonical JSON of the transformation
+    '''
+    canonical = json.dumps(transformation, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
 async def image_editor(image_id: int,
                        body: EditImageModel,
                        user: User,
                        db: Session):
     '''
-    The **image_editor** function edits a single image from the database.
+    The **image_editor** function makes an edited version of a single image.
+    Versions are stored as derived images keyed by the hash of their transformation,
+    so repeating an edit returns the stored version. The original image is not changed.
     
     :param image_id: int: The id of the image to edit
     :param body: EditImageModel: The body of the request
     :param user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
-    :return: A image object
+    :return: A derived image object
     '''
     image = await get_image_from_id(image_id, user, db)
     if image:
-        edit_data = []
-        if body.circle.use_filter and body.circle.height and body.circle.width:
-            trans_list = [{'gravity': "face", 'height': f"{body.circle.height}", 'width': f"{body.circle.width}",
-                           'crop': "thumb"},
-                          {'radius': "max"}]
-            [edit_data.append(elem) for elem in trans_list]
-
-        if body.effect.use_filter:
-            effect = ""
-            if body.effect.art_audrey:
-                effect = "art:audrey"
-            if body.effect.art_zorro:
-                effect = "art:zorro"
-            if body.effect.blur:
-                effect = "blur:300"
-            if body.effect.cartoonify:
-                effect = "cartoonify"
-            if effect:
-                edit_data.append({"effect": f"{effect}"})
-
-        if body.resize.use_filter and body.resize.height and body.resize.height:
-            crop = ""
-            if body.resize.crop:
-                crop = "crop"
-            if body.resize.fill:
-                crop = "fill"
-            if crop:
-                trans_list = [{"gravity": "auto", 'height': f"{body.resize.height}", 'width': f"{body.resize.width}",
-                               'crop': f"{crop}"}]
-                [edit_data.append(elem) for elem in trans_list]
-
-        if body.rotate.use_filter and body.rotate.width and body.rotate.degree:
-            trans_list = [{'width': f"{body.rotate.width}", 'crop': "scale"}, {'angle': "vflip"},
-                          {'angle': f"{body.rotate.degree}"}]
-            [edit_data.append(elem) for elem in trans_list]
-
+        edit_data = build_transformation(body)
         if edit_data:
-            CloudImage()
-            new_image = CloudinaryImage(image.public_id).image(transformation=edit_data)
-            image.image_url = new_image
-            db.commit()
-            db.refresh(image)
-            return image
+            transform_hash = transformation_hash(edit_data)
+            derived = db.query(DerivedImage).filter(and_(DerivedImage.image_id == image.id,
+                                                         DerivedImage.transform_hash == transform_hash)).first()
+            if derived:
+                return derived
+            derived = DerivedImage(image_id=image.id, transform_hash=transform_hash, transformation=edit_data,
+                                   image_url=CloudImage.transform(image.public_id, edit_data))
+            db.add(derived)
+            try:
+                db.commit()
+            except IntegrityError:
+                # the same edit was stored by a concurrent request
+                db.rollback()
+                return db.query(DerivedImage).filter(and_(DerivedImage.image_id == image.id,
+                                                          DerivedImage.transform_hash == transform_hash)).first()
+            db.refresh(derived)
+            return derived
+
+
+async def get_derived_images(image_id: int, user: User, db: Session):
+    '''
+    The **get_derived_images** function gets all edited versions of a single image.
+
+    :param image_id: int: The id of the image
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A list of derived image objects or None if the image is not found
+    '''
+    image = await get_image_from_id(image_id, user, db)
+    if image:
+        return db.query(DerivedImage).filter(DerivedImage.image_id == image.id). \
+            order_by(desc(DerivedImage.created_at)).all()
 
 
 async def edit_description(image_id: int,
@@ -213,7 +523,8 @@ async def qr_code_generator(image_id: int,
                             user: User,
                             db: Session):
     '''
-    The **qr_code_generator** function edits a single image from the database.
+    The **qr_code_generator** function makes the QR code of an image available at its QR code url.
+    The code is rendered in the image processing pool, unless it is cached already.
     
     :param image_id: int: The id of the image to edit
     :param user: User: The user object
@@ -222,17 +533,35 @@ async def qr_code_generator(image_id: int,
     '''
     image = await get_image_from_id(image_id, user, db)
     if image:
-        image_url = image.image_url
-        qr = qrcode.QRCode(
-            version=1,
-            box_size=10,
-            border=5
-        )
-        qr.add_data(image_url)
-        qr.make(fit=True)
-        img = qr.make_image(fill='black', back_color='white')
-        img.save(f'./src/services/qr_codes/{image_id}.png')
-        image.qr_code_url = f'./src/services/qr_codes/{image_id}.png'
+        await get_qr_service().get(image.image_url)
+        enqueue_deletions(db, files=[image.qr_code_url])
+        image.qr_code_url = QR_CODE_URL.format(image_id=image.id)
         db.commit()
         db.refresh(image)
         return image
+
+
+async def set_qr_code_urls(image_ids, user: User, db: Session) -> list:
+    '''
+    The **set_qr_code_urls** function points the QR code urls of several images to their QR code endpoint
+    with one batched UPDATE.
+
+    :param image_ids: The ids of the images, or None for all images of the user
+    :param user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The ids, urls and QR code urls of the images of the user, ordered by id
+    '''
+    query = db.query(Image.id, Image.image_url, Image.qr_code_url).filter(Image.user_id == user.id)
+    if image_ids is not None:
+        query = query.filter(Image.id.in_(image_ids))
+    rows = query.order_by(Image.id).all()
+    images = [{'id': row.id, 'image_url': row.image_url, 'qr_code_url': QR_CODE_URL.format(image_id=row.id)}
+              for row in rows]
+    changed = [{'id': image['id'], 'qr_code_url': image['qr_code_url']}
+               for image, row in zip(images, rows) if row.qr_code_url != image['qr_code_url']]
+    if changed:
+        enqueue_deletions(db, files=[row.qr_code_url for image, row in zip(images, rows)
+                                     if row.qr_code_url != image['qr_code_url']])
+        db.execute(update(Image), changed)
+        db.commit()
+    return images
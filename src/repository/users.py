@@ -1,25 +1,46 @@
+import logging
+from datetime import datetime
 from typing import List
 
 from libgravatar import Gravatar
 from sqlalchemy.orm import Session
 
-from src.database.models import User, Image, Role, Comment
+from src.database.models import User, Image, Role, Comment, UserPurgeJob
 from src.schemas.users import UserModel, UpdateUser
+from src.services.serialization import load_fields
+from src.services.user_purge import ACTIVE, create_purge_job
 
+logger = logging.getLogger(__name__)
 
-async def get_me(user: User, db: Session) -> User:
+
+async def get_me(user: User, db: Session, fields: tuple = None) -> User:
     """
     The **get_me** function returns the user object of the current logged in user.
 
 
     :param user: User: Get the user id
     :param db: Session: Access the database
+    :param fields: tuple: Only load these columns, see **load_fields**
     :return: A user object
     """
-    user = db.query(User).filter(User.id == user.id).first()
+    query = db.query(User)
+    if fields is not None:
+        query = query.options(load_fields(User, fields))
+    user = query.filter(User.id == user.id, User.deleted_at.is_(None)).first()
     return user
 
 
+async def get_user_version(user_id: int, db: Session):
+    """
+    The **get_user_version** function returns the version of a user without loading the user.
+
+    :param user_id: int: The id of the user
+    :param db: Session: Access the database
+    :return: A row with the updated_at of the user, None if there is no such user
+    """
+    return db.query(User.updated_at).filter(User.id == user_id, User.deleted_at.is_(None)).first()
+
+
 async def get_user_by_email(email: str, db: Session) -> User | None:
     """
     The **get_user_by_emai** function takes in an email and a database session,
@@ -132,7 +153,7 @@ async def get_user_info(current_user, db):
     :return: user info
     :rtype: dict
     """
-    user = db.query(User).filter(User.id == current_user.id).first()
+    user = db.query(User).filter(User.id == current_user.id, User.deleted_at.is_(None)).first()
     images_count = len(db.query(Image).filter(Image.user_id == current_user.id).all())
 
     return {
@@ -154,7 +175,7 @@ async def ban_user(id_, db: Session):
     :rtype: dict
 
     """
-    user = db.query(User).filter(User.id == id_).first()
+    user = db.query(User).filter(User.id == id_, User.deleted_at.is_(None)).first()
     if user:
         user.is_active = False
         db.commit()
@@ -185,16 +206,20 @@ async def make_user_role(email: str, role: Role, db: Session) -> None:
     db.commit()
 
 
-async def get_users(skip: int, limit: int, db: Session) -> List[User]:
+async def get_users(skip: int, limit: int, db: Session, fields: tuple = None) -> List[User]:
     """
     The **get_users** function returns a list of users from the database.
 
     :param skip: int: Skip the first n records in the database
     :param limit: int: Limit the number of results returned
     :param db: Session: Pass the database session to the function
-    :return: A list of users
+    :param fields: tuple: Only load these columns, see **load_fields**
+    :return: A list of users, without the deleted ones waiting for the purge
     """
-    return db.query(User).offset(skip).limit(limit).all()
+    query = db.query(User)
+    if fields is not None:
+        query = query.options(load_fields(User, fields))
+    return query.filter(User.deleted_at.is_(None)).offset(skip).limit(limit).all()
 
 
 async def get_all_commented_images(user: User, db: Session):
@@ -210,17 +235,38 @@ async def get_all_commented_images(user: User, db: Session):
 
 async def remove_from_users(id_: int, db: Session) -> None:
     """
-    The **remove_from_blacklist** function removes a user
+    The **remove_from_blacklist** function removes a user.
+    The user is only marked as deleted here, the images, comments and the account itself are removed
+    in chunks by the purge worker afterwards.
 
     :param id_: int: id of user to remove
     :param db: Session: Access the database
     :return: None
     """
     user = db.query(User).filter(User.id == id_).first()
-    print(user)
     if user:
-        db.delete(user)
+        logger.info("removing user %s", id_)
+        db.query(User).filter(User.id == id_). \
+            update({User.is_active: False, User.refresh_token: None, User.deleted_at: datetime.utcnow()})
+        if not db.query(UserPurgeJob).filter(UserPurgeJob.user_id == id_, UserPurgeJob.status.in_(ACTIVE)).first():
+            create_purge_job(db, id_)
         db.commit()
     return user
 
 
+async def get_purge_jobs(db: Session, user_id: int = None, status: str = None, limit: int = 50) -> List[UserPurgeJob]:
+    """
+    The **get_purge_jobs** function returns the removal jobs of deleted users, newest first.
+
+    :param db: Session: Access the database
+    :param user_id: int: Only return the jobs of this user
+    :param status: str: Only return the jobs with this status
+    :param limit: int: The maximum number of jobs
+    :return: A list of jobs
+    """
+    query = db.query(UserPurgeJob)
+    if user_id is not None:
+        query = query.filter(UserPurgeJob.user_id == user_id)
+    if status is not None:
+        query = query.filter(UserPurgeJob.status == status)
+    return query.order_by(UserPurgeJob.id.desc()).limit(limit).all()
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Depends, Query, status, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List
 
 from src.database.db import get_db
-from src.schemas.comments import CommentBase, CommentUpdate, CommentModel
+from src.schemas.comments import CommentBase, CommentUpdate, CommentModel, CommentBulkDelete, \
+    CommentBulkDeleteResponse
 from src.repository import comments as repository_comments
 from src.services.auth import auth_service
+from src.services.comment_events import get_comment_broker, event_stream, COMMENT_ADDED, COMMENT_EDITED, \
+    COMMENT_DELETED, COMMENTS_DELETED
 from src.config import detail
 from src.services.roles import CheckRole
+from src.services.serialization import ORMListResponse
 from src.database.models import User, Role
 
 router = APIRouter(prefix='/comments', tags=["comments"])
@@ -18,6 +25,66 @@ allowed_edit_comments = CheckRole([Role.admin, Role.moderator, Role.user])
 allowed_delete_comments = CheckRole([Role.admin, Role.moderator])
 
 
+async def bulk_delete_response(deleted: Dict[int, int]) -> dict:
+    broker = get_comment_broker()
+    for image_id, count in deleted.items():
+        await broker.publish(image_id, COMMENTS_DELETED, {"count": count})
+    return {"deleted": sum(deleted.values()), "images": deleted}
+
+
+@router.post("/bulk_delete",
+             response_model=CommentBulkDeleteResponse,
+             dependencies=[Depends(allowed_delete_comments)])
+async def delete_comments_by_ids(body: CommentBulkDelete, db: Session = Depends(get_db)):
+    """
+    Deletes the comments with the given ids. Ids of comments that do not exist are ignored.
+
+    :param body: CommentBulkDelete: The ids of the comments to delete
+    :param db: Session: Get the database session from the dependency
+    :return: The number of deleted comments, in total and per image
+    """
+    deleted = await repository_comments.delete_comments(db, comment_ids=body.comment_ids)
+    return await bulk_delete_response(deleted)
+
+
+@router.delete("/author/{user_id}",
+               response_model=CommentBulkDeleteResponse,
+               dependencies=[Depends(allowed_delete_comments)])
+async def delete_user_comments(user_id: int, created_after: datetime = None, created_before: datetime = None,
+                               db: Session = Depends(get_db)):
+    """
+    Deletes the comments of a user, optionally only the ones created within a time range.
+
+    :param user_id: int: The id of the author
+    :param created_after: datetime: Only delete comments created at or after this time
+    :param created_before: datetime: Only delete comments created at or before this time
+    :param db: Session: Get the database session from the dependency
+    :return: The number of deleted comments, in total and per image
+    """
+    deleted = await repository_comments.delete_comments(db, user_id=user_id, created_after=created_after,
+                                                        created_before=created_before)
+    return await bulk_delete_response(deleted)
+
+
+@router.delete("/image/{image_id}",
+               response_model=CommentBulkDeleteResponse,
+               dependencies=[Depends(allowed_delete_comments)])
+async def delete_image_comments(image_id: int, created_after: datetime = None, created_before: datetime = None,
+                                db: Session = Depends(get_db)):
+    """
+    Deletes the comments of an image, optionally only the ones created within a time range.
+
+    :param image_id: int: The id of the image
+    :param created_after: datetime: Only delete comments created at or after this time
+    :param created_before: datetime: Only delete comments created at or before this time
+    :param db: Session: Get the database session from the dependency
+    :return: The number of deleted comments, in total and per image
+    """
+    deleted = await repository_comments.delete_comments(db, image_id=image_id, created_after=created_after,
+                                                        created_before=created_before)
+    return await bulk_delete_response(deleted)
+
+
 @router.post("/{image_id}",
              response_model=CommentModel,
              dependencies=[Depends(allowed_add_comments)])
@@ -33,6 +100,7 @@ async def add_comment(image_id: int, body: CommentBase, db: Session = Depends(ge
     :return: A comment object, which is then serialized as json
     """
     new_comment = await repository_comments.add_comment(image_id, body, db, current_user)
+    await get_comment_broker().publish(image_id, COMMENT_ADDED, CommentModel.from_orm(new_comment))
     return new_comment
 
 
@@ -53,6 +121,9 @@ async def edit_comment(comment_id: int, body: CommentBase, db: Session = Depends
     edited_comment = await repository_comments.edit_comment(comment_id, body, db, current_user)
     if edited_comment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.COMMENT_NOT_FOUND)
+    if repository_comments.can_edit_comment(edited_comment, current_user):
+        await get_comment_broker().publish(edited_comment.image_id, COMMENT_EDITED,
+                                           CommentModel.from_orm(edited_comment))
     return edited_comment
 
 
@@ -72,9 +143,49 @@ async def delete_comment(comment_id: int, db: Session = Depends(get_db),
     deleted_comment = await repository_comments.delete_comment(comment_id, db, current_user)
     if deleted_comment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.COMMENT_NOT_FOUND)
+    await get_comment_broker().publish(deleted_comment.image_id, COMMENT_DELETED,
+                                       CommentModel.from_orm(deleted_comment))
     return deleted_comment
 
 
+@router.get("/image/{image_id}",
+            response_model=List[CommentModel],
+            dependencies=[Depends(allowed_get_comments)])
+async def image_comments(image_id: int, limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0),
+                         db: Session = Depends(get_db)):
+    """
+    Returns a page of the comments of an image, oldest first, with their authors.
+    Use **image_comments_stream** to follow the changes afterwards.
+
+    :param image_id: int: The id of the image
+    :param limit: int: The number of comments to return
+    :param offset: int: The number of comments to skip
+    :param db: Session: Pass the database session to the function
+    :return: A list of comments
+    """
+    comments = await repository_comments.get_image_comments(image_id, db, limit, offset)
+    return ORMListResponse(comments, CommentModel)
+
+
+@router.get("/image/{image_id}/stream",
+            response_class=StreamingResponse,
+            responses={200: {"content": {"text/event-stream": {}}}},
+            dependencies=[Depends(allowed_get_comments)])
+async def image_comments_stream(image_id: int, request: Request):
+    """
+    Streams the changes of the comments of an image as Server-Sent Events, instead of polling the comments.
+    The events are ``comment_added``, ``comment_edited``, ``comment_deleted`` with the comment, and
+    ``comments_deleted`` with the number of comments removed by a bulk moderation.
+
+    :param image_id: int: The id of the image
+    :param request: Request: The request, to notice when the client disconnects
+    :return: The event stream
+    """
+    return StreamingResponse(event_stream(image_id, get_comment_broker(), request.is_disconnected),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @router.get("/{comment_id}",
             response_model=CommentModel,
             dependencies=[Depends(allowed_get_comments)])
@@ -110,7 +221,7 @@ async def all_user_comments(user_id: int, db: Session = Depends(get_db),
     comments = await repository_comments.get_comments_by_user_id(user_id, db)
     if comments is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.COMMENT_NOT_FOUND)
-    return comments
+    return ORMListResponse(comments, CommentModel)
 
 
 @router.get("/image_by_author/{user_id}/{image_id}",
@@ -130,4 +241,4 @@ async def user_comments_for_image(user_id: int, image_id: int, db: Session = Dep
     comments = await repository_comments.get_user_comments_by_image(user_id, image_id, db)
     if comments is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.COMMENT_NOT_FOUND)
-    return comments
+    return ORMListResponse(comments, CommentModel)
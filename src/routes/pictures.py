@@ -1,21 +1,42 @@
-from fastapi import Depends, status, APIRouter, UploadFile, File, Query
+import shutil
+import time
+from datetime import datetime
+
+from fastapi import Depends, status, APIRouter, UploadFile, File, Form, Header, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from typing import List
 
+from src.config import detail
+from src.config.config import settings
 from src.database.db import get_db
 from src.database.models import User
 from src.schemas.pictures import ImageModel, ImageResponseCreated, ImageResponseEdited, ImageResponseUpdated
-from src.schemas.pictures import EditImageModel
+from src.schemas.pictures import EditImageModel, BatchUploadItem, BatchUploadResponse, DerivedImageModel
+from src.schemas.pictures import ImageBatchResponse
+from src.schemas.pictures import SignedUploadResponse, FinalizeUploadModel, UploadJobResponse, UploadJobStatus
+from src.schemas.pictures import SimilarImageModel, ImageOrientation, QRCodeBatchModel, QRCodeBatchResponse
 from src.services.auth import auth_service
 from src.repository import pictures as repository_pictures
 from src.services.cloud_image import CloudImage
+from src.services.perceptual_hash import MAX_SEARCH_DISTANCE
+from src.services.etags import etag_headers, etag_matches, not_modified, version_etag
+from src.services.storage_gc import enqueue_deletions
+from src.services.serialization import FieldsQuery, ORMListResponse, ORMResponse, encode_row
+from src.services.qr_codes import PNG, SVG, QR_CACHE_CONTROL, get_qr_service, qr_key, stream_zip
+from src.services.uploads import spool_upload, store_upload, store_uploads, create_variants
+from src.services.upload_jobs import get_upload_queue, new_job, spool_path
 
 router = APIRouter(prefix="/pictures", tags=['pictures'])
 
+image_fields = FieldsQuery(ImageModel)
+
 
 @router.post("/", response_model=ImageResponseCreated, status_code=status.HTTP_201_CREATED)
 async def create_image(description: str,
+                       response: Response,
                        tags: str = None,
                        image_file: UploadFile = File(...),
                        current_user: User = Depends(auth_service.get_current_user),
@@ -24,58 +45,323 @@ async def create_image(description: str,
     The **create_image** function creates a new image in the database.
     It takes a description and an image file as input.
     The image file is uploaded to Cloudinary and the url is stored in the database.
+    The file is hashed while it is spooled, and a file that was already uploaded reuses the stored asset
+    (``X-Upload-Deduplicated: true``). When ``settings.image_normalize`` is on, the image is re-encoded
+    without metadata first and the bytes saved and CPU time spent are returned in the
+    ``X-Upload-Bytes-Saved`` and ``X-Upload-Cpu-Ms`` headers. Earlier images of the user that look the
+    same, like resized or re-compressed copies, are listed in the ``X-Upload-Near-Duplicates`` header.
 
     :param description: str: The description of the image
+    :param response: Response: The response the upload statistics are added to
     :param tags: TagModelAddToPicture: 5 tags
     :param image_file: UploadFile: The image file
     :param current_user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
     :return: A image object
     """
+    upload = await run_in_threadpool(spool_upload, image_file.file, image_file.filename)
+    try:
+        stored = await store_upload(upload, db)
+    finally:
+        upload.close()
+    if stored.deduplicated:
+        response.headers["X-Upload-Deduplicated"] = "true"
+    if stored.normalized:
+        response.headers["X-Upload-Bytes-Saved"] = str(stored.normalized.bytes_saved)
+        response.headers["X-Upload-Cpu-Ms"] = f"{stored.normalized.cpu_ms:.1f}"
+    image = await repository_pictures.create(description, tags, stored.image_url, stored.public_id, current_user, db,
+                                             content_hash=stored.content_hash, variants=stored.variants,
+                                             perceptual_hash=stored.perceptual_hash, metadata=stored.metadata)
+    if stored.perceptual_hash is not None:
+        similar = await repository_pictures.find_similar(stored.perceptual_hash, db, user=current_user,
+                                                         exclude_id=image.id)
+        if similar:
+            response.headers["X-Upload-Near-Duplicates"] = ",".join(str(match.id) for match, _ in similar)
+
+    return image
+
+
+@router.post("/batch", response_model=BatchUploadResponse, status_code=status.HTTP_200_OK)
+async def create_images(image_files: List[UploadFile] = File(...),
+                        descriptions: List[str] = Form(None),
+                        tags: List[str] = Form(None),
+                        current_user: User = Depends(auth_service.get_current_user),
+                        db: Session = Depends(get_db)):
+    """
+    The **create_images** function creates several images in one request.
+    The files are uploaded concurrently, limited by ``settings.upload_concurrency``, and all images
+    with their tags are inserted in one transaction. A file that can not be stored is reported as failed
+    without affecting the others.
+
+    :param image_files: List[UploadFile]: The image files
+    :param descriptions: List[str]: The description of every file, in the same order
+    :param tags: List[str]: The tags of every file, in the same order
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The status of every file
+    """
+    if len(image_files) > settings.upload_batch_max_files:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail.TOO_MANY_FILES)
+    descriptions = descriptions or []
+    tags = tags or []
 
+    uploads = []
+    try:
+        for image_file in image_files:
+            uploads.append(await run_in_threadpool(spool_upload, image_file.file, image_file.filename))
+        results = await store_uploads(uploads, db)
+    finally:
+        for upload in uploads:
+            upload.close()
+
+    items = []
+    created = []
+    for index, (upload, result) in enumerate(zip(uploads, results)):
+        item = BatchUploadItem(index=index, filename=upload.filename, status="failed")
+        if isinstance(result, HTTPException):
+            item.detail = result.detail
+        elif isinstance(result, Exception):
+            item.detail = detail.UPLOAD_FAILED
+        else:
+            item.status = "created"
+            item.deduplicated = result.deduplicated
+            created.append((item, {"description": descriptions[index] if index < len(descriptions) else None,
+                                   "tags": tags[index] if index < len(tags) else None,
+                                   "image_url": result.image_url,
+                                   "public_id": result.public_id,
+                                   "content_hash": result.content_hash,
+                                   "variants": result.variants,
+                                   "perceptual_hash": result.perceptual_hash,
+                                   "metadata": result.metadata}))
+        items.append(item)
+
+    try:
+        images = await repository_pictures.create_many([values for _, values in created], current_user, db)
+    except Exception:
+        # the new files belong to no image, duplicates are shared with images that already exist
+        db.rollback()
+        enqueue_deletions(db, public_ids=[values["public_id"] for item, values in created if not item.deduplicated])
+        db.commit()
+        raise
+    for (item, _), image in zip(created, images):
+        item.image = ImageModel.from_orm(image)
+    return {"items": items, "created": len(created), "failed": len(items) - len(created)}
+
+
+def save_spooled_file(source, job_id: str) -> None:
+    path = spool_path(job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as fh:
+        shutil.copyfileobj(source, fh)
+
+
+@router.post("/async", response_model=UploadJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_image_async(description: str,
+                             tags: str = None,
+                             image_file: UploadFile = File(...),
+                             current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The **create_image_async** function accepts an image and creates it in the background.
+    The file is spooled and an upload job is queued; the response only contains the job id,
+    and the progress is reported by **get_upload_job**.
+
+    :param description: str: The description of the image
+    :param tags: str: 5 tags
+    :param image_file: UploadFile: The image file
+    :param current_user: User: The user object
+    :return: The id and status url of the job
+    """
+    job = new_job(current_user, image_file.filename, description, tags)
+    await run_in_threadpool(save_spooled_file, image_file.file, job["id"])
+    try:
+        await get_upload_queue().enqueue(job)
+    except Exception:
+        spool_path(job["id"]).unlink(missing_ok=True)
+        raise
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/api/pictures/jobs/{job['id']}"}
+
+
+@router.get("/jobs/{job_id}", response_model=UploadJobStatus)
+async def get_upload_job(job_id: str, current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The **get_upload_job** function returns the state of an upload job of the current user.
+
+    :param job_id: str: The id of the job
+    :param current_user: User: The user object
+    :return: The state of the job
+    """
+    job = await get_upload_queue().get(job_id)
+    if job is None or job["user_id"] != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
+    return {**job, "job_id": job["id"]}
+
+
+@router.post("/signed_upload", response_model=SignedUploadResponse, status_code=status.HTTP_201_CREATED)
+async def create_signed_upload(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    The **create_signed_upload** function issues short-lived parameters for uploading an image directly
+    to the storage, so the file does not pass through the API. After the upload the client registers
+    the image with **finalize_signed_upload** and the returned upload token.
+
+    :param current_user: User: The user object
+    :return: The upload url, the form fields to send with the file and the upload token
+    """
+    expires_in = settings.signed_upload_expire_seconds
+    expires_at = int(time.time()) + expires_in
     public_id = CloudImage.generate_name_image()
-    CloudImage.upload(image_file.file, public_id, overwrite=False)
-    image_url = CloudImage.get_url_for_image(public_id)
-    image = await repository_pictures.create(description, tags, image_url, public_id, current_user, db)
+    signed = CloudImage.sign_upload(public_id, expires_at)
+    upload_token = auth_service.create_upload_token({"sub": current_user.email, "public_id": public_id},
+                                                    expires_in)
+    return {"public_id": public_id,
+            "upload_url": signed["upload_url"],
+            "fields": signed["fields"],
+            "upload_token": upload_token,
+            "expires_at": datetime.utcfromtimestamp(expires_at)}
+
+
+@router.post("/signed_upload/finalize", response_model=ImageResponseCreated, status_code=status.HTTP_201_CREATED)
+async def finalize_signed_upload(body: FinalizeUploadModel,
+                                 current_user: User = Depends(auth_service.get_current_user),
+                                 db: Session = Depends(get_db)):
+    """
+    The **finalize_signed_upload** function registers an image uploaded directly to the storage.
+    It checks that the upload token was issued to the current user and that the file is in the storage.
+    A token can be used once, registering the same upload again is answered with 409.
 
+    :param body: FinalizeUploadModel: The upload token, description and tags of the image
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A image object
+    """
+    payload = auth_service.decode_upload_token(body.upload_token)
+    if payload.get("sub") != current_user.email:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail.OPERATION_FORBIDDEN)
+    public_id = payload["public_id"]
+    if not await run_in_threadpool(CloudImage.exists, public_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.UPLOAD_NOT_FOUND)
+    if not await repository_pictures.claim_signed_upload(public_id, current_user, db):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail.UPLOAD_ALREADY_REGISTERED)
+    try:
+        image_url = CloudImage.get_url_for_image(public_id)
+        variants = await create_variants(public_id)
+        image = await repository_pictures.create(body.description, body.tags or '', image_url, public_id,
+                                                 current_user, db, variants=variants)
+    except Exception:
+        await repository_pictures.release_signed_upload(public_id, db)
+        raise
     return image
 
 
 @router.get("/", response_model=List[ImageModel], status_code=status.HTTP_200_OK)
 async def get_images(limit: int = Query(10, le=50), offset: int = 0,
+                     orientation: ImageOrientation = None,
+                     taken_after: datetime = None,
+                     taken_before: datetime = None,
+                     taken_year: int = Query(None, ge=1800, le=9998),
+                     camera: str = Query(None, max_length=100),
+                     image_format: str = Query(None, alias="format", max_length=10),
+                     min_width: int = Query(None, ge=0),
+                     min_height: int = Query(None, ge=0),
+                     fields: tuple = Depends(image_fields),
+                     if_none_match: str = Header(None),
                      current_user: User = Depends(auth_service.get_current_user),
                      db: Session = Depends(get_db)):
     """
     The **get_images** function gets all the images from the database.
+    The images can be filtered by the metadata read from their files, e.g.
+    ``?orientation=landscape&taken_year=2025`` for the landscape photos taken in 2025.
+    The ETag of the page is made of the ids and versions of its images. They are read first, and a request
+    with a matching ``If-None-Match`` is answered with 304 without loading the images.
+    With ``fields``, e.g. ``?fields=id,image_url`` for a grid of thumbnails, only those fields are loaded and sent.
 
     :param limit: int: The number of images to return
     :param offset: int: The number of images to skip
+    :param orientation: ImageOrientation: landscape, portrait or square
+    :param taken_after: datetime: The earliest capture time
+    :param taken_before: datetime: The latest capture time
+    :param taken_year: int: The year the photos were taken in
+    :param camera: str: The camera make and model
+    :param image_format: str: The file format, e.g. jpeg
+    :param min_width: int: The minimum width in pixels
+    :param min_height: int: The minimum height in pixels
+    :param fields: tuple: The fields to return, all of them if not given
+    :param if_none_match: str: The ETags of the pages the client has
     :param current_user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
     :return: A list of image objects
     """
-    images = await repository_pictures.get_images(limit, offset, current_user, db)
+    filters = dict(orientation=orientation.value if orientation else None, taken_after=taken_after,
+                   taken_before=taken_before, taken_year=taken_year, camera=camera, image_format=image_format,
+                   min_width=min_width, min_height=min_height)
+    if if_none_match:
+        versions = await repository_pictures.get_image_versions(limit, offset, current_user, db, **filters)
+        etag = version_etag('images', fields, *[(row.id, row.updated_at) for row in versions])
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    images = await repository_pictures.get_images(limit, offset, current_user, db, fields=fields, **filters)
     if images is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return images
+    etag = version_etag('images', fields, *[(image.id, image.updated_at) for image in images])
+    return ORMListResponse(images, ImageModel, fields, headers=etag_headers(etag))
+
+
+@router.get("/batch", response_model=ImageBatchResponse, status_code=status.HTTP_200_OK)
+async def get_images_batch(ids: str = Query(..., regex=r"^\s*\d+(\s*,\s*\d+)*\s*$",
+                                            description="Comma separated ids, e.g. 3,1,2"),
+                           fields: tuple = Depends(image_fields),
+                           current_user: User = Depends(auth_service.get_current_user),
+                           db: Session = Depends(get_db)):
+    """
+    The **get_images_batch** function gets up to ``settings.pictures_batch_max_ids`` images with one query,
+    instead of a request per image. The images are returned in the order of the ids, and the ids of images
+    that do not exist or belong to another user are reported as missing.
+
+    :param ids: str: The comma separated ids of the images
+    :param fields: tuple: The fields to return, all of them if not given
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The images and the missing ids
+    """
+    image_ids = list(dict.fromkeys(int(image_id) for image_id in ids.split(",")))
+    if len(image_ids) > settings.pictures_batch_max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"{detail.TOO_MANY_IDS}, the maximum is {settings.pictures_batch_max_ids}")
+    images = await repository_pictures.get_images_by_ids(image_ids, current_user, db, fields=fields)
+    found = {image.id for image in images}
+    return ORJSONResponse({"items": [encode_row(image, ImageModel, fields) for image in images],
+                           "missing": [image_id for image_id in image_ids if image_id not in found]})
 
 
 @router.get("/{image_id}", response_model=ImageModel, status_code=status.HTTP_200_OK)
 async def get_image(image_id: int,
+                    fields: tuple = Depends(image_fields),
+                    if_none_match: str = Header(None),
                     current_user: User = Depends(auth_service.get_current_user),
                     db: Session = Depends(get_db)):
     """
     The **get_image** function gets a single image from the database.
+    The ETag is made of the version of the image. A request with a matching ``If-None-Match`` is answered
+    with 304 after reading only the version. With ``fields`` only those fields are loaded and sent.
 
     :param image_id: int: The id of the image to return
+    :param fields: tuple: The fields to return, all of them if not given
+    :param if_none_match: str: The ETags of the image the client has
     :param current_user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
     :return: A image object
     """
-    image = await repository_pictures.get_image(image_id, current_user, db)
+    if if_none_match:
+        version = await repository_pictures.get_image_version(image_id, current_user, db)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+        etag = version_etag('image', image_id, version.updated_at, fields)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+    image = await repository_pictures.get_image(image_id, current_user, db, fields=fields)
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return image
+    etag = version_etag('image', image.id, image.updated_at, fields)
+    return ORMResponse(image, ImageModel, fields, headers=etag_headers(etag))
 
 
 @router.delete("/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -108,12 +394,57 @@ async def image_editor(image_id: int,
     :param body: EditImageModel: The body of the request
     :param current_user: User: The user object
     :param db: Session: A connection to our Postgres SQL database.
-    :return: A image object
+    :return: A image object with the edited version
+    """
+    derived = await repository_pictures.image_editor(image_id, body, current_user, db)
+    if derived is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return {**ImageModel.from_orm(derived.image).dict(), "edited": derived}
+
+
+@router.get("/{image_id}/versions", response_model=List[DerivedImageModel])
+async def get_image_versions(image_id: int,
+                             current_user: User = Depends(auth_service.get_current_user),
+                             db: Session = Depends(get_db)):
+    """
+    The **get_image_versions** function gets all edited versions of a single image.
+
+    :param image_id: int: The id of the image
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A list of derived image objects
+    """
+    versions = await repository_pictures.get_derived_images(image_id, current_user, db)
+    if versions is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return versions
+
+
+@router.get("/{image_id}/similar", response_model=List[SimilarImageModel])
+async def get_similar_images(image_id: int,
+                             max_distance: int = Query(None, ge=0, le=MAX_SEARCH_DISTANCE),
+                             limit: int = Query(20, le=100),
+                             current_user: User = Depends(auth_service.get_current_user),
+                             db: Session = Depends(get_db)):
+    """
+    The **get_similar_images** function finds the near-duplicates of an image among the images of the user,
+    by the Hamming distance of their perceptual hashes.
+
+    :param image_id: int: The id of the image
+    :param max_distance: int: The maximum number of different hash bits, ``settings.phash_max_distance`` by default
+    :param limit: int: The maximum number of images
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A list of similar images with their distance, the most similar first
     """
-    image = await repository_pictures.image_editor(image_id, body, current_user, db)
+    image = await repository_pictures.get_image_from_id(image_id, current_user, db)
     if image is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
-    return image
+    if image.phash is None:
+        return []
+    similar = await repository_pictures.find_similar(int(image.phash, 16), db, max_distance, current_user,
+                                                     exclude_id=image.id, limit=limit)
+    return [{"image": match, "distance": distance} for match, distance in similar]
 
 
 @router.patch("/description/{image_id}", response_model=ImageResponseUpdated)
@@ -136,12 +467,77 @@ async def edit_description(image_id: int,
     return image
 
 
+@router.get("/{image_id}/qr_code", response_class=Response,
+            responses={200: {"content": {"image/png": {}, "image/svg+xml": {}}}, 304: {}})
+async def get_qr_code(image_id: int,
+                      image_format: str = Query(PNG, alias="format", regex=f"^({PNG}|{SVG})$"),
+                      if_none_match: str = Header(None),
+                      current_user: User = Depends(auth_service.get_current_user),
+                      db: Session = Depends(get_db)):
+    """
+    The **get_qr_code** function returns the QR code of the url of an image, as PNG or SVG.
+    The ETag is the hash of the url and the format, so a request with a matching ``If-None-Match``
+    is answered with 304 after reading only the url of the image, without rendering or reading the code.
+    The url of the image can change, so clients keep the code for a short time and then revalidate it.
+
+    :param image_id: int: The id of the image
+    :param image_format: str: png or svg
+    :param if_none_match: str: The ETags of the codes the client has
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The QR code image
+    """
+    image_url = await repository_pictures.get_image_url(image_id, current_user, db)
+    if image_url is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    etag = f'"{qr_key(image_url, image_format)}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, QR_CACHE_CONTROL)
+    qr_code = await get_qr_service().get(image_url, image_format)
+    return Response(content=qr_code.content, media_type=qr_code.media_type,
+                    headers=etag_headers(etag, QR_CACHE_CONTROL))
+
+
+@router.post("/qr_codes", response_model=QRCodeBatchResponse,
+             responses={200: {"content": {"application/zip": {}}}})
+async def generate_qr_codes(body: QRCodeBatchModel,
+                            image_format: str = Query(PNG, alias="format", regex=f"^({PNG}|{SVG})$"),
+                            archive: bool = False,
+                            current_user: User = Depends(auth_service.get_current_user),
+                            db: Session = Depends(get_db)):
+    """
+    The **generate_qr_codes** function generates the QR codes of several images, or of all images of the user
+    if no ids are given. The QR code urls are updated with one query and the codes are rendered concurrently
+    in the image processing pool.
+    With ``archive=true`` the codes are streamed as a ZIP archive while they are rendered.
+
+    :param body: QRCodeBatchModel: The ids of the images
+    :param image_format: str: png or svg
+    :param archive: bool: Whether to return the codes in a ZIP archive
+    :param current_user: User: The user object
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The QR code urls and ETags of the images and the ids that were not found, or the ZIP archive
+    """
+    images = await repository_pictures.set_qr_code_urls(body.image_ids, current_user, db)
+    service = get_qr_service()
+    if archive:
+        items = [(f"image_{image['id']}", image['image_url']) for image in images]
+        return StreamingResponse(stream_zip(service, items, image_format), media_type="application/zip",
+                                 headers={"Content-Disposition": 'attachment; filename="qr_codes.zip"'})
+    codes = await service.get_many([image['image_url'] for image in images], image_format)
+    found = {image['id'] for image in images}
+    return {"items": [{"image_id": image['id'], "qr_code_url": image['qr_code_url'], "etag": qr_code.etag}
+                      for image, qr_code in zip(images, codes)],
+            "missing": [image_id for image_id in dict.fromkeys(body.image_ids or []) if image_id not in found]}
+
+
 @router.post("/qr_code", status_code=status.HTTP_201_CREATED)
 async def generate_qr_code(image_id: int,
                            current_user: User = Depends(auth_service.get_current_user),
                            db: Session = Depends(get_db)):
     """
     The **generate_qr_code** function generates a QR code for a single image from the database.
+    The code is served by **get_qr_code** at the ``qr_code_url`` of the image.
 
     :param image_id: int: The id of the image to generate a QR code for
     :param current_user: User: The user object
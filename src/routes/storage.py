@@ -0,0 +1,81 @@
+from urllib.parse import quote
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+
+from src.config import detail
+from src.config.config import settings
+from src.services.image_transforms import decode_transformation, get_transform_engine
+from src.services.storage import LocalStorage, SendfileResponse, get_storage, sniff_media_type
+
+router = APIRouter(prefix="/storage", tags=['storage'])
+
+
+def read_media_type(path) -> str:
+    with open(path, 'rb') as fh:
+        return sniff_media_type(fh.read(16))
+
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED)
+async def upload_signed_file(public_id: str = Form(...),
+                             expires_at: int = Form(...),
+                             signature: str = Form(...),
+                             file: UploadFile = File(...)):
+    """
+    The **upload_signed_file** function accepts a direct upload to the local storage.
+    It stands in for the upload API of the hosted storage and only accepts parameters signed by
+    **LocalStorage.sign_upload**.
+
+    :param public_id: str: The name the image is stored under
+    :param expires_at: int: Unix time after which the parameters are not valid
+    :param signature: str: The signature of the parameters
+    :param file: UploadFile: The image file
+    :return: The public id and url of the stored image
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
+    if not storage.verify_upload(public_id, expires_at, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail.INVALID_UPLOAD_TOKEN)
+    result = await run_in_threadpool(storage.put, file.file, public_id, False)
+    return {"public_id": result["public_id"], "url": result["url"]}
+
+
+@router.get("/{public_id:path}")
+async def get_stored_file(public_id: str, tr: str = None, sig: str = None):
+    """
+    The **get_stored_file** function serves an image kept by the local storage backend.
+    The file is handed to the server with ``sendfile`` when it supports it.
+    With ``tr`` the image is served with the encoded transformation applied, if ``sig`` shows that the
+    url was issued by **LocalStorage.transform**. Rendered images are cached on disk, and the time spent
+    on every filter is reported in the ``Server-Timing`` header.
+
+    :param public_id: str: The name of the image in the storage
+    :param tr: str: A transformation encoded by **LocalStorage.transform**
+    :param sig: str: The signature of the transformation
+    :return: The image file
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
+    try:
+        path = storage.path(public_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
+    if not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
+    if tr is not None:
+        if not storage.verify_transform(public_id, tr, sig):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail.UNSIGNED_TRANSFORMATION)
+        try:
+            rendered = await get_transform_engine().render(path, decode_transformation(tr))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail.INVALID_TRANSFORMATION)
+        timings = ", ".join(f"{name};dur={duration:.1f}" for name, duration in rendered.timings.items())
+        server_timing = timings if not rendered.cached else "cache;desc=hit"
+        return SendfileResponse(rendered.path, media_type="image/webp", headers={"Server-Timing": server_timing})
+    media_type = await run_in_threadpool(read_media_type, path)
+    accel_redirect = None
+    if settings.storage_local_accel_redirect:
+        accel_redirect = f"{settings.storage_local_accel_redirect.rstrip('/')}/{quote(public_id)}"
+    return SendfileResponse(path, media_type=media_type, accel_redirect=accel_redirect)
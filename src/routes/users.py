@@ -1,17 +1,22 @@
+import logging
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Security
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
 from src.config import detail
 from src.database.db import get_db
 from src.database.models import User, Role
-from src.schemas.users import UserDb, UpdateUser, UserInfoResponse, UserBanned, RequestRole
+from src.schemas.users import UserDb, UpdateUser, UserInfoResponse, UserBanned, RequestRole, UserPurgeJobModel
 from src.schemas.pictures import ImageModel
 from src.services.auth import auth_service
+from src.services.etags import etag_headers, etag_matches, not_modified, version_etag
 from src.services.roles import CheckRole
+from src.services.serialization import FieldsQuery, ORMListResponse, ORMResponse
 from src.repository import users as repository_users
 
+logger = logging.getLogger(__name__)
+
 user_router = APIRouter(prefix="/user", tags=['users'])
 
 security = HTTPBearer()
@@ -22,18 +27,33 @@ allowed_remove_user = CheckRole([Role.admin, Role.moderator])
 allowed_ban_user = CheckRole([Role.admin])
 allowed_change_user_role = CheckRole([Role.admin])
 
+user_fields = FieldsQuery(UserDb)
+
 
 @user_router.get("/me", response_model=UserDb, dependencies=[Depends(allowed_all_user)])
-async def read_users_me(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+async def read_users_me(fields: tuple = Depends(user_fields), if_none_match: str = Header(None),
+                        current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
     """
     The **read_users_me** function is a GET endpoint that returns the current user's information.
     It uses the auth_service to get the current user, and then returns it.
+    A request with an ``If-None-Match`` matching the version of the user is answered with 304.
 
+    :param fields: tuple: The fields to return, all of them if not given
+    :param if_none_match: str: The ETags of the user the client has
     :param current_user: User: Get the current user
     :return: The current user object
     """
-    user = await repository_users.get_me(current_user, db)
-    return user
+    if if_none_match:
+        version = await repository_users.get_user_version(current_user.id, db)
+        if version is not None:
+            etag = version_etag('user', current_user.id, version.updated_at, fields)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+    user = await repository_users.get_me(current_user, db, fields=fields)
+    if user is None:
+        return user
+    etag = version_etag('user', user.id, user.updated_at, fields)
+    return ORMResponse(user, UserDb, fields, headers=etag_headers(etag))
 
 
 @user_router.patch('/me/', response_model=UserDb, dependencies=[Depends(allowed_all_user)])
@@ -59,7 +79,8 @@ async def update_user_info(body: UpdateUser, current_user: User = Depends(auth_s
 @user_router.delete('/{user_id}', dependencies=[Depends(allowed_remove_user)])
 async def user_remove(user_id, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
-    Ban user
+    Remove user. The account is disabled at once, its content is removed in the background,
+    see **read_purge_jobs** for the progress.
 
     :param current_user: user whose info is changing
     :type current_user: User
@@ -68,10 +89,35 @@ async def user_remove(user_id, db: Session = Depends(get_db), current_user: User
     :return: banned user info with message of success
     :rtype: dict
     """
-    await repository_users.remove_from_users(user_id, db)
+    user = await repository_users.remove_from_users(user_id, db)
+    if user:
+        # the cached user would stay signed in until the cache expires
+        auth_service.r.delete(f"user:{user.email}")
     return {"user_id": user_id, "detail": detail.USER_REMOVE}
 
 
+@user_router.get('/purge_jobs/', response_model=List[UserPurgeJobModel],
+                 dependencies=[Depends(allowed_get_all_users)])
+async def read_purge_jobs(user_id: int = None, job_status: str = Query(None, alias='status'),
+                          limit: int = Query(50, ge=1, le=500),
+                          db: Session = Depends(get_db)):
+    """
+    Get the progress of removing deleted users, newest first
+
+    :param user_id: only the jobs of this user
+    :type user_id: int
+    :param job_status: only the jobs with this status: pending, running, done or failed
+    :type job_status: str
+    :param limit: the maximum number of jobs
+    :type limit: int
+    :param db: The database session
+    :type db: Session
+    :return: purge jobs
+    :rtype: list
+    """
+    return await repository_users.get_purge_jobs(db, user_id=user_id, status=job_status, limit=limit)
+
+
 @user_router.get('/info/', response_model=UserInfoResponse, dependencies=[Depends(allowed_all_user)])
 async def user_info(db: Session = Depends(get_db),
                     current_user: User = Depends(auth_service.get_current_user)):
@@ -101,15 +147,16 @@ async def ban_user(id_, db: Session = Depends(get_db), current_user: User = Depe
     :return: banned user info with message of success
     :rtype: dict
     """
-    print('current user role', str(current_user.roles))
     if str(current_user.roles) != "Role.admin":
         raise HTTPException(status_code=403, detail=detail.PRIVILEGES_DENIED)
     banned_user = await repository_users.ban_user(id_, db)
+    logger.info("user %s banned by %s", id_, current_user.id)
     return {"user": banned_user, "detail": detail.USER_BANNED}
 
 
 @user_router.get("/all/", response_model=List[UserDb], dependencies=[Depends(allowed_get_all_users)])
-async def read_all_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def read_all_users(skip: int = 0, limit: int = 10, fields: tuple = Depends(user_fields),
+                         db: Session = Depends(get_db)):
     """
     The **read_all_users** function returns a list of users.
         ---
@@ -122,11 +169,12 @@ async def read_all_users(skip: int = 0, limit: int = 10, db: Session = Depends(g
 
     :param skip: int: Skip the first n records
     :param limit: int: Limit the number of results returned
+    :param fields: tuple: The fields to return, all of them if not given
     :param db: Session: Pass the database connection to the function
     :return: A list of users
     """
-    users = await repository_users.get_users(skip, limit, db)
-    return users
+    users = await repository_users.get_users(skip, limit, db, fields=fields)
+    return ORMListResponse(users, UserDb, fields)
 
 
 @user_router.patch("/make_role/{email}/", dependencies=[Depends(allowed_change_user_role)])
@@ -165,4 +213,4 @@ async def read_commented_images_by_me(db: Session = Depends(get_db),
     images = await repository_users.get_all_commented_images(current_user, db)
     if not images:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail.NOT_FOUND)
-    return images
+    return ORMListResponse(images, ImageModel)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from pydantic import BaseModel, Field
 
@@ -8,12 +8,22 @@ class CommentBase(BaseModel):
     comment: str = Field(max_length=500)
 
 
+class CommentAuthor(BaseModel):
+    id: int
+    username: Optional[str]
+    avatar: Optional[str]
+
+    class Config:
+        orm_mode = True
+
+
 class CommentModel(CommentBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime]
     user_id: int
     image_id: int
+    author: Optional[CommentAuthor]
 
     class Config:
         orm_mode = True
@@ -23,4 +33,13 @@ class CommentUpdate(CommentModel):
     updated_at = datetime
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class CommentBulkDelete(BaseModel):
+    comment_ids: List[int] = Field(min_items=1, max_items=10000)
+
+
+class CommentBulkDeleteResponse(BaseModel):
+    deleted: int
+    images: Dict[int, int]
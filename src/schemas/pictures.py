@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import Any, Dict, List, Optional
 
 
 class ImageCircleModel(BaseModel):
@@ -38,6 +39,12 @@ class EditImageModel(BaseModel):
     rotate: ImageRotateModel
 
 
+class ImageOrientation(str, Enum):
+    landscape = 'landscape'
+    portrait = 'portrait'
+    square = 'square'
+
+
 class ImageBase(BaseModel):
     image_url: str = Field(max_length=500)
     description: Optional[str] = Field(max_length=500)
@@ -48,11 +55,24 @@ class ImageModel(ImageBase):
     created_at: datetime
     updated_at: Optional[datetime]
     user_id: int
+    variants: Optional[Dict[str, str]]
+    width: Optional[int]
+    height: Optional[int]
+    orientation: Optional[str]
+    format: Optional[str]
+    taken_at: Optional[datetime]
+    camera: Optional[str]
+    byte_size: Optional[int]
 
     class Config:
         orm_mode = True
 
 
+class ImageBatchResponse(BaseModel):
+    items: List[ImageModel]
+    missing: List[int]
+
+
 class ImageResponseCreated(ImageModel):
     detail: str = "Image successfully created"
 
@@ -67,8 +87,88 @@ class ImageResponseUpdated(ImageModel):
         orm_mode = True
 
 
+class DerivedImageModel(BaseModel):
+    id: int
+    image_id: int
+    transform_hash: str
+    transformation: List[Dict[str, Any]]
+    image_url: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
 class ImageResponseEdited(ImageModel):
+    edited: DerivedImageModel
     detail: str = "Image successfully edited"
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class SimilarImageModel(BaseModel):
+    image: ImageModel
+    distance: int
+
+
+class BatchUploadItem(BaseModel):
+    index: int
+    filename: Optional[str]
+    status: str
+    deduplicated: bool = False
+    image: Optional[ImageModel]
+    detail: Optional[str]
+
+
+class BatchUploadResponse(BaseModel):
+    items: List[BatchUploadItem]
+    created: int
+    failed: int
+
+
+class SignedUploadResponse(BaseModel):
+    public_id: str
+    upload_url: str
+    fields: Dict[str, Any]
+    upload_token: str
+    expires_at: datetime
+
+
+class FinalizeUploadModel(BaseModel):
+    upload_token: str
+    description: Optional[str] = Field(max_length=500)
+    tags: Optional[str] = None
+
+
+class UploadJobResponse(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+
+
+class UploadJobStatus(BaseModel):
+    job_id: str
+    status: str
+    progress: int
+    filename: Optional[str]
+    image_id: Optional[int]
+    image_url: Optional[str]
+    detail: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+
+class QRCodeBatchModel(BaseModel):
+    image_ids: Optional[List[int]] = Field(None, max_items=1000)
+
+
+class QRCodeItem(BaseModel):
+    image_id: int
+    qr_code_url: str
+    etag: str
+
+
+class QRCodeBatchResponse(BaseModel):
+    items: List[QRCodeItem]
+    missing: List[int]
@@ -150,3 +150,21 @@ class ImageResponseEdited(ImageModel):
 #         return [self.tag1, self.tag2, self.tag3, self.tag4, self.tag5]
 
 
+
+
+class UserPurgeJobModel(BaseModel):
+    id: int
+    user_id: int
+    status: str
+    images_total: int
+    images_deleted: int
+    comments_total: int
+    comments_deleted: int
+    attempts: int
+    last_error: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    finished_at: Optional[datetime]
+
+    class Config:
+        orm_mode = True
@@ -7,11 +7,11 @@
 5. Отримання поточного юзера
 6. Отримання email з токена підтвердження
 """
+import logging
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 import pickle
-import redis
 
 from fastapi import Depends, HTTPException, status
 from passlib.context import CryptContext
@@ -22,9 +22,12 @@ from src.config import detail
 
 from src.config.config import settings
 from src.database.db import get_db
+from src.services.metrics import InstrumentedRedis
 
 from src.repository import users as repository_users
 
+logger = logging.getLogger(__name__)
+
 
 class Auth:
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -36,7 +39,7 @@ class Auth:
         detail=detail.NOT_VALIDATE,
         headers={"WWW-Authenticate": "Bearer"},
     )
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r = InstrumentedRedis(host=settings.redis_host, port=settings.redis_port, db=0)
 
     async def blocklist(self, token):
         payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
@@ -149,7 +152,7 @@ class Auth:
         user = self.r.get(f"user:{email}")
         if user is None:
             user = await repository_users.get_user_by_email(email, db)
-            if user is None:
+            if user is None or user.deleted_at is not None:
                 raise self.credentials_exception
             self.r.set(f"user:{email}", pickle.dumps(user))
             self.r.expire(f"user:{email}", 900)
@@ -193,6 +196,36 @@ class Auth:
         token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return token
 
+    def create_upload_token(self, data: dict, expires_delta: float):
+        """
+        Creates a token that allows the user to register one direct upload.
+
+        :data: dict: The user's email in ``sub`` and the ``public_id`` of the upload
+        :expires_delta: float: The number of seconds until the token expires
+        :return: A token
+        """
+        to_encode = data.copy()
+        expire = datetime.utcnow() + timedelta(seconds=expires_delta)
+        to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "upload_token"})
+        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        return token
+
+    def decode_upload_token(self, token: str):
+        """
+        Decodes an upload token. Raises an HTTPException with status code 401 if the token is
+        invalid, expired or has another scope.
+
+        :token: str: The token returned with the signed upload parameters
+        :return: The payload of the token
+        """
+        try:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail.INVALID_UPLOAD_TOKEN)
+        if payload.get("scope") != "upload_token":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail.INVALID_TOKEN)
+        return payload
+
     def get_email_from_token(self, token: str):
         """
         Takes a token as an argument and returns the email associated with that token.
@@ -217,7 +250,7 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail.INVALID_TOKEN)
 
         except JWTError as e:
-            print(e)
+            logger.warning("invalid email token: %s", e)
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail.INVALID_TOKEN_EMAIL)
 
 
@@ -1,27 +1,17 @@
 import hashlib
 from uuid import uuid4
 
-import cloudinary
-import cloudinary.uploader
 from src.config.config import settings
+from src.services.image_processing import parse_variants
+from src.services.metrics import timed
+from src.services.storage import get_storage
 
 
 class CloudImage:
     '''
-    The **CloudImage** class is a wrapper around the Cloudinary API.
+    The **CloudImage** class is a wrapper around the storage backend selected in the settings.
     It provides methods to upload, edit and delete images.
-    
-    :param cloud_name: str: The name of the cloudinary account
-    :param api_key: str: The api key of the cloudinary account
-    :param api_secret: str: The api secret of the cloudinary account
-    :param secure: bool: Whether to use https or not
     '''
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
 
     @staticmethod
     def generate_name_image():
@@ -37,15 +27,16 @@ class CloudImage:
     @staticmethod
     def upload(file, public_id: str, overwrite=True):
         '''
-        The **upload** function uploads an image to Cloudinary.
+        The **upload** function uploads an image to the storage.
         
         :param file: The image file
         :param public_id: The name of the image
         :param overwrite: Whether to overwrite the image or not
-        :return: The response from Cloudinary
+        :return: The response from the storage
         '''
-        r = cloudinary.uploader.upload(file, public_id=public_id, overwrite=overwrite)
-        return r
+        storage = get_storage()
+        with timed(storage.name, 'upload'):
+            return storage.put(file, public_id, overwrite=overwrite)
     
     @staticmethod
     def get_url_for_image(file_name):
@@ -55,8 +46,64 @@ class CloudImage:
         :param file_name: The name of the image
         :return: The url of the image
         '''
-        src_url = cloudinary.utils.cloudinary_url(file_name)
-        return src_url[0]
-    
+        return get_storage().url(file_name)
+
+    @staticmethod
+    def delete(file_name):
+        '''
+        The **delete** function removes an image from the storage.
+
+        :param file_name: The name of the image
+        :return: None
+        '''
+        storage = get_storage()
+        with timed(storage.name, 'delete'):
+            storage.delete(file_name)
 
-        
\ No newline at end of file
+    @staticmethod
+    def exists(file_name):
+        '''
+        The **exists** function checks whether an image was uploaded to the storage.
+
+        :param file_name: The name of the image
+        :return: True if the image is stored
+        '''
+        return get_storage().exists(file_name)
+
+    @staticmethod
+    def sign_upload(file_name, expires_at: int):
+        '''
+        The **sign_upload** function gets the parameters for uploading an image directly to the storage.
+
+        :param file_name: The name of the image
+        :param expires_at: Unix time after which the parameters are not valid
+        :return: A dict with the upload url and form fields
+        '''
+        return get_storage().sign_upload(file_name, expires_at)
+
+    @staticmethod
+    def create_variants(file_name):
+        '''
+        The **create_variants** function makes the resized copies of an image configured in
+        ``settings.image_variants``.
+
+        :param file_name: The name of the image
+        :return: A dict of variant name to url
+        '''
+        variants = parse_variants(settings.image_variants)
+        if not variants:
+            return {}
+        storage = get_storage()
+        with timed(storage.name, 'create_variants'):
+            return storage.create_variants(file_name, variants)
+
+    @staticmethod
+    def transform(file_name, transformation: list):
+        '''
+        The **transform** function gets the url of an image with a transformation applied.
+
+        :param file_name: The name of the image
+        :param transformation: Cloudinary-style list of transformation steps
+        :return: The url of the transformed image
+        '''
+        return get_storage().transform(file_name, transformation)
@@ -0,0 +1,202 @@
+"""
+Live comment events of images.
+
+The comment routes publish every change to the ``comments:{image_id}`` Redis channel. Every worker
+keeps one pattern subscription to all comment channels and hands the events to the streams of its own
+clients, so the number of Redis connections does not grow with the number of open image pages.
+``settings.comment_events_backend = "memory"`` delivers the events inside the process, for tests and
+single-process setups.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+import redis.asyncio as redis
+from fastapi.encoders import jsonable_encoder
+
+from src.config.config import settings
+
+logger = logging.getLogger(__name__)
+
+COMMENT_ADDED = 'comment_added'
+COMMENT_EDITED = 'comment_edited'
+COMMENT_DELETED = 'comment_deleted'
+COMMENTS_DELETED = 'comments_deleted'
+CLOSED = None
+
+
+class CommentBroker:
+    '''
+    The **CommentBroker** class delivers comment events to the subscribers of this process.
+
+    :param queue_size: int: The number of events kept for a slow subscriber before it is disconnected
+    '''
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers = defaultdict(set)
+
+    @staticmethod
+    def channel(image_id: int) -> str:
+        return f"comments:{image_id}"
+
+    def dispatch(self, image_id: int, message: str) -> None:
+        '''
+        The **dispatch** function hands an event to the local subscribers of an image.
+        A subscriber whose queue is full is closed, it has to reconnect and load the comments again.
+
+        :param image_id: int: The id of the image
+        :param message: str: The JSON encoded event
+        :return: None
+        '''
+        for queue in list(self.subscribers.get(image_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.subscribers[image_id].discard(queue)
+                self.close_queue(queue)
+
+    @staticmethod
+    def close_queue(queue: asyncio.Queue) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(CLOSED)
+
+    async def send(self, image_id: int, message: str) -> None:
+        self.dispatch(image_id, message)
+
+    async def publish(self, image_id: int, event: str, data) -> None:
+        '''
+        The **publish** function sends a comment event to the clients watching an image in all workers.
+        Live updates are best effort, so a failure is only logged.
+
+        :param image_id: int: The id of the image
+        :param event: str: The type of the event
+        :param data: The data of the event, e.g. the comment
+        :return: None
+        '''
+        message = json.dumps({'event': event, 'image_id': image_id, 'data': jsonable_encoder(data)})
+        try:
+            await self.send(image_id, message)
+        except Exception:
+            logger.exception("can not publish %s of image %s", event, image_id)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        for queues in self.subscribers.values():
+            for queue in queues:
+                self.close_queue(queue)
+        self.subscribers.clear()
+
+    @asynccontextmanager
+    async def subscribe(self, image_id: int):
+        '''
+        The **subscribe** function opens a stream of the comment events of an image.
+
+        :param image_id: int: The id of the image
+        :return: A queue of JSON encoded events, ``None`` marks the end of the stream
+        '''
+        await self.start()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers[image_id].add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(image_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[image_id]
+
+
+class RedisCommentBroker(CommentBroker):
+    '''
+    The **RedisCommentBroker** class publishes comment events to Redis and fans out the events of all
+    workers to the subscribers of this process.
+
+    :param client: Redis: The Redis client
+    :param queue_size: int: The number of events kept for a slow subscriber before it is disconnected
+    '''
+
+    def __init__(self, client: redis.Redis, queue_size: int = 100):
+        super().__init__(queue_size)
+        self.client = client
+        self.listener = None
+
+    async def send(self, image_id: int, message: str) -> None:
+        await self.client.publish(self.channel(image_id), message)
+
+    async def start(self) -> None:
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.create_task(self.listen())
+
+    async def listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.psubscribe(self.channel('*'))
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    channel = channel.decode('utf-8') if isinstance(channel, bytes) else channel
+                    data = message['data']
+                    self.dispatch(int(channel.rsplit(':', 1)[1]),
+                                  data.decode('utf-8') if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("comment events subscription failed")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def close(self) -> None:
+        if self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+        await super().close()
+
+
+@lru_cache()
+def get_comment_broker() -> CommentBroker:
+    '''
+    The **get_comment_broker** function returns the comment event broker selected in the settings.
+
+    :return: A comment broker
+    '''
+    if settings.comment_events_backend == 'memory':
+        return CommentBroker(settings.comment_events_queue_size)
+    client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    return RedisCommentBroker(client, settings.comment_events_queue_size)
+
+
+async def event_stream(image_id: int, broker: CommentBroker, is_disconnected, heartbeat: float = None):
+    '''
+    The **event_stream** function formats the comment events of an image as Server-Sent Events.
+    A comment line is sent when nothing happened for ``heartbeat`` seconds, so proxies keep the connection open.
+
+    :param image_id: int: The id of the image
+    :param broker: CommentBroker: The broker to subscribe to
+    :param is_disconnected: An async function telling whether the client went away
+    :param heartbeat: float: The seconds between heartbeats
+    :return: An async iterator of the stream
+    '''
+    heartbeat = settings.comment_events_heartbeat if heartbeat is None else heartbeat
+    async with broker.subscribe(image_id) as queue:
+        yield "retry: 3000\n\n"
+        while not await is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if message is CLOSED:
+                break
+            event = json.loads(message)['event']
+            yield f"event: {event}\ndata: {message}\n\n"
@@ -0,0 +1,46 @@
+"""
+ETags of responses derived from the versions of the rows they show.
+
+The version of a row is its ``updated_at``, so a route can find out with a narrow query whether the
+client has the current representation, and answer 304 before loading and serializing the full rows.
+"""
+import hashlib
+
+from fastapi import Response, status
+
+REVALIDATE = "private, no-cache"
+
+
+def version_etag(*parts) -> str:
+    '''
+    The **version_etag** function returns a weak ETag for the given versions.
+
+    :param parts: The kind of the response and the ids and versions of the rows it shows
+    :return: The ETag
+    '''
+    digest = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    '''
+    The **etag_matches** function checks an ``If-None-Match`` header with the weak comparison.
+
+    :param if_none_match: str: The header sent by the client
+    :param etag: str: The current ETag
+    :return: True if the client has the current representation
+    '''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return opaque in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def etag_headers(etag: str, cache_control: str = REVALIDATE) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag, cache_control))
@@ -0,0 +1,87 @@
+"""
+Metadata of uploaded images.
+
+``PIL.Image.open`` only parses the header of a file, the pixels are decoded on first access, so the
+dimensions, format and EXIF tags can be read from the spooled upload without decoding the image.
+"""
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Optional
+
+from PIL import Image as PILImage, UnidentifiedImageError
+
+EXIF_IFD = 0x8769
+DATE_TIME_ORIGINAL = 36867
+DATE_TIME = 306
+MAKE = 271
+MODEL = 272
+ORIENTATION = 274
+LANDSCAPE = 'landscape'
+PORTRAIT = 'portrait'
+SQUARE = 'square'
+
+
+@dataclass
+class ImageMetadata:
+    byte_size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[str] = None
+    format: Optional[str] = None
+    taken_at: Optional[datetime] = None
+    camera: Optional[str] = None
+
+    def columns(self) -> dict:
+        return asdict(self)
+
+
+def exif_text(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'ignore')
+    if not isinstance(value, str):
+        return None
+    return value.strip('\x00 ').strip() or None
+
+
+def parse_exif_datetime(value) -> Optional[datetime]:
+    value = exif_text(value)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value[:19], '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def read_metadata(file, byte_size: int) -> ImageMetadata:
+    '''
+    The **read_metadata** function reads the dimensions, format, capture time and camera of an image
+    from its header. The width and height are the ones the image is shown with, after the EXIF orientation.
+
+    :param file: A file object with the image
+    :param byte_size: int: The size of the file in bytes
+    :return: The metadata, with only the byte size if the file is not an image Pillow can read
+    '''
+    metadata = ImageMetadata(byte_size=byte_size)
+    file.seek(0)
+    try:
+        with PILImage.open(file) as image:
+            width, height = image.size
+            metadata.format = (image.format or '').lower() or None
+            exif = image.getexif()
+    except (UnidentifiedImageError, OSError):
+        return metadata
+    finally:
+        file.seek(0)
+    if exif.get(ORIENTATION) in (5, 6, 7, 8):
+        width, height = height, width
+    metadata.width, metadata.height = width, height
+    metadata.orientation = LANDSCAPE if width > height else PORTRAIT if height > width else SQUARE
+    metadata.taken_at = parse_exif_datetime(exif.get_ifd(EXIF_IFD).get(DATE_TIME_ORIGINAL)) or \
+        parse_exif_datetime(exif.get(DATE_TIME))
+    make, model = exif_text(exif.get(MAKE)), exif_text(exif.get(MODEL))
+    if make and model and model.lower().startswith(make.lower()):
+        make = None
+    camera = ' '.join(part for part in (make, model) if part)
+    metadata.camera = camera[:100] or None
+    return metadata
@@ -0,0 +1,151 @@
+"""
+CPU bound image processing done before an upload reaches the storage.
+
+Decoding and encoding images holds the GIL for a long time, so the work is sent to a process pool
+and the event loop only waits for the result.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from io import BytesIO
+
+from PIL import Image as PILImage, ImageOps
+
+from src.config.config import settings
+
+_process_pool = None
+
+
+@dataclass
+class NormalizedImage:
+    data: bytes
+    format: str
+    width: int
+    height: int
+    original_bytes: int
+    cpu_ms: float
+
+    @property
+    def bytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.bytes
+
+
+def normalize_image(data: bytes, max_edge: int, image_format: str, quality: int) -> NormalizedImage:
+    '''
+    The **normalize_image** function prepares an uploaded image for the storage.
+    It applies the EXIF orientation, limits the longest edge and re-encodes the image.
+    The metadata is not copied to the new file.
+
+    :param data: bytes: The uploaded image
+    :param max_edge: int: The maximum size of the longest edge in pixels
+    :param image_format: str: The Pillow format to encode to, e.g. WEBP or AVIF
+    :param quality: int: The encoder quality
+    :return: The normalized image with the CPU time spent on it
+    '''
+    started = time.process_time()
+    with PILImage.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), PILImage.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        output = BytesIO()
+        image.save(output, format=image_format, quality=quality)
+    return NormalizedImage(data=output.getvalue(),
+                           format=image_format.lower(),
+                           width=image.width,
+                           height=image.height,
+                           original_bytes=len(data),
+                           cpu_ms=(time.process_time() - started) * 1000)
+
+
+def parse_variants(spec: str) -> dict:
+    '''
+    The **parse_variants** function reads the configured image variants.
+
+    :param spec: str: Comma separated ``name:width`` pairs, e.g. ``thumb:200,medium:800``
+    :return: A dict of variant name to width
+    '''
+    variants = {}
+    for item in spec.split(','):
+        if item.strip():
+            name, width = item.split(':')
+            variants[name.strip()] = int(width)
+    return variants
+
+
+def make_variants(source, variants: dict, quality: int = 80) -> dict:
+    '''
+    The **make_variants** function makes WebP copies of an image for every variant width.
+    The image is decoded once, and every copy is resized from the next larger one.
+
+    :param source: A path or file object with the image
+    :param variants: dict: Variant name to maximum width in pixels
+    :param quality: int: The encoder quality
+    :return: A dict of variant name to encoded image
+    '''
+    result = {}
+    with PILImage.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for name, width in sorted(variants.items(), key=lambda item: item[1], reverse=True):
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), PILImage.LANCZOS)
+            output = BytesIO()
+            image.save(output, format='WEBP', quality=quality)
+            result[name] = output.getvalue()
+    return result
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    '''
+    The **get_process_pool** function returns the process pool used for image processing.
+    The pool is created on the first call.
+
+    :return: A process pool executor
+    '''
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.image_workers)
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    '''
+    The **shutdown_process_pool** function stops the workers of the image processing pool.
+
+    :return: None
+    '''
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+async def run_in_process_pool(func, *args, **kwargs):
+    '''
+    The **run_in_process_pool** function runs a picklable function in the image processing pool.
+
+    :param func: The function to run
+    :return: The result of the function
+    '''
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+
+async def normalize_upload(data: bytes) -> NormalizedImage:
+    '''
+    The **normalize_upload** function normalizes an uploaded image with the configured limits.
+
+    :param data: bytes: The uploaded image
+    :return: The normalized image
+    '''
+    return await run_in_process_pool(normalize_image, data, settings.image_max_edge,
+                                     settings.image_format, settings.image_quality)
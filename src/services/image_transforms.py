@@ -0,0 +1,321 @@
+"""
+Local rendering of image edits.
+
+The engine understands the Cloudinary-style transformation lists built by
+``repository.pictures.build_transformation`` and renders them with Pillow in the image processing
+pool. Only transformations signed by the storage are rendered, and the width and height of a step are
+limited to ``settings.transform_max_size``. Rendered files are kept in a disk cache keyed by the hash of
+the source file and the hash of the transformation, and the least recently used files are removed when
+the cache grows over its limit.
+"""
+import base64
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image as PILImage, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+
+from src.config.config import settings
+from src.services.image_processing import run_in_process_pool
+
+ALLOWED_KEYS = {'gravity', 'height', 'width', 'crop', 'radius', 'effect', 'angle'}
+
+
+def encode_transformation(transformation: list) -> str:
+    '''
+    The **encode_transformation** function packs a transformation list into a url-safe string.
+
+    :param transformation: list: The transformation steps
+    :return: The encoded transformation
+    '''
+    canonical = json.dumps(transformation, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(canonical.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def check_step(step: dict, max_size: int) -> None:
+    '''
+    The **check_step** function checks the values of a transformation step.
+
+    :param step: dict: A transformation step
+    :param max_size: int: The maximum width and height
+    :return: None
+    :raises ValueError: If a value is not valid
+    '''
+    if not isinstance(step, dict) or not set(step) <= ALLOWED_KEYS:
+        raise ValueError("Invalid transformation")
+    for key in ('width', 'height'):
+        if key in step and not 0 < int(step[key]) <= max_size:
+            raise ValueError(f"The {key} must be between 1 and {max_size}")
+    if 'angle' in step and step['angle'] != 'vflip':
+        int(step['angle'])
+
+
+def decode_transformation(token: str, max_size: int = None) -> list:
+    '''
+    The **decode_transformation** function unpacks a transformation encoded by **encode_transformation**.
+
+    :param token: str: The encoded transformation
+    :param max_size: int: The maximum width and height, ``settings.transform_max_size`` by default
+    :return: The transformation steps
+    :raises ValueError: If the token is not a valid transformation
+    '''
+    try:
+        transformation = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(transformation, list):
+            raise ValueError("Invalid transformation")
+        for step in transformation:
+            check_step(step, max_size or settings.transform_max_size)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid transformation")
+    return transformation
+
+
+def step_filter(step: dict) -> str:
+    '''
+    The **step_filter** function names the editor filter a transformation step belongs to.
+
+    :param step: dict: A transformation step
+    :return: circle, effect, resize or rotate
+    '''
+    if step.get('crop') == 'thumb' or 'radius' in step:
+        return 'circle'
+    if 'effect' in step:
+        return 'effect'
+    if step.get('crop') in ('crop', 'fill'):
+        return 'resize'
+    return 'rotate'
+
+
+def apply_effect(image: PILImage.Image, effect: str) -> PILImage.Image:
+    name, _, value = effect.partition(':')
+    rgb = image.convert('RGB')
+    if name == 'blur':
+        radius = int(value or 100) / 20
+        result = rgb.filter(ImageFilter.GaussianBlur(radius))
+    elif name == 'cartoonify':
+        edges = rgb.convert('L').filter(ImageFilter.FIND_EDGES).point(lambda p: 0 if p > 40 else 255)
+        result = ImageOps.posterize(rgb.filter(ImageFilter.SMOOTH_MORE), 3)
+        result.paste((0, 0, 0), mask=ImageOps.invert(edges))
+    elif name == 'art' and value == 'audrey':
+        result = ImageEnhance.Contrast(ImageOps.grayscale(rgb)).enhance(1.4).convert('RGB')
+    elif name == 'art' and value == 'zorro':
+        result = ImageOps.colorize(ImageOps.autocontrast(ImageOps.grayscale(rgb)), (20, 10, 40), (250, 230, 200))
+    else:
+        raise ValueError(f"Unknown effect: {effect}")
+    if image.mode == 'RGBA':
+        result.putalpha(image.getchannel('A'))
+    return result
+
+
+def apply_step(image: PILImage.Image, step: dict) -> PILImage.Image:
+    '''
+    The **apply_step** function applies one transformation step to an image.
+
+    :param image: Image: The image
+    :param step: dict: A transformation step
+    :return: The transformed image
+    '''
+    width = int(step['width']) if 'width' in step else None
+    height = int(step['height']) if 'height' in step else None
+    crop = step.get('crop')
+    if crop in ('thumb', 'fill'):
+        # face detection is not available locally, the center of the image is used instead
+        return ImageOps.fit(image, (width, height), PILImage.LANCZOS)
+    if crop == 'crop':
+        left = max(0, (image.width - width) // 2)
+        top = max(0, (image.height - height) // 2)
+        return image.crop((left, top, left + min(width, image.width), top + min(height, image.height)))
+    if crop == 'scale':
+        return image.resize((width, max(1, round(image.height * width / image.width))), PILImage.LANCZOS)
+    if step.get('radius') == 'max':
+        image = image.convert('RGBA')
+        mask = PILImage.new('L', image.size, 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, image.width - 1, image.height - 1), fill=255)
+        image.putalpha(mask)
+        return image
+    if 'effect' in step:
+        return apply_effect(image, step['effect'])
+    if step.get('angle') == 'vflip':
+        return ImageOps.flip(image)
+    if 'angle' in step:
+        # Cloudinary rotates clockwise
+        return image.rotate(-int(step['angle']), expand=True, resample=PILImage.BICUBIC)
+    raise ValueError(f"Unsupported transformation step: {step}")
+
+
+def render_transformation(source, transformation: list) -> tuple:
+    '''
+    The **render_transformation** function renders a transformation of an image.
+
+    :param source: A path or file object with the image
+    :param transformation: list: The transformation steps
+    :return: The WebP encoded result and the milliseconds spent on every filter
+    '''
+    timings = {}
+    with PILImage.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for step in transformation:
+            started = time.perf_counter()
+            image = apply_step(image, step)
+            name = step_filter(step)
+            timings[name] = timings.get(name, 0) + (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        output = BytesIO()
+        image.save(output, format='WEBP', quality=settings.image_quality)
+        timings['encode'] = (time.perf_counter() - started) * 1000
+    return output.getvalue(), timings
+
+
+class RenderCache:
+    '''
+    The **RenderCache** class keeps rendered images on disk and removes the least recently used
+    ones when their total size is over ``max_bytes``. The modification time of a file is its last use.
+
+    :param root: str: The directory of the cache
+    :param max_bytes: int: The maximum total size of the cached files
+    :param suffix: str: The extension of the cached files
+    '''
+
+    def __init__(self, root: str, max_bytes: int, suffix: str = '.webp'):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.size = None
+        self.lock = Lock()
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{self.suffix}"
+
+    def get(self, key: str):
+        '''
+        The **get** function returns the path of a cached image and marks it as used.
+
+        :param key: str: The cache key
+        :return: The path of the file or None
+        '''
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key: str, data: bytes) -> Path:
+        '''
+        The **put** function stores a rendered image and evicts old ones if needed.
+
+        :param key: str: The cache key
+        :param data: bytes: The rendered image
+        :return: The path of the file
+        '''
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(file.stat().st_size for file in self.root.rglob(f'*{self.suffix}'))
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path = None) -> None:
+        files = []
+        for file in self.root.rglob(f'*{self.suffix}'):
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        files.sort()
+        self.size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self.size <= self.max_bytes:
+                break
+            if file == keep:
+                continue
+            file.unlink(missing_ok=True)
+            self.size -= size
+
+
+@dataclass
+class RenderResult:
+    path: Path
+    cached: bool
+    timings: dict = field(default_factory=dict)
+
+
+class TransformEngine:
+    '''
+    The **TransformEngine** class renders transformations of local files through the render cache.
+
+    :param cache: RenderCache: The cache of rendered images
+    '''
+
+    def __init__(self, cache: RenderCache):
+        self.cache = cache
+        self.source_hashes = {}
+        self.lock = Lock()
+
+    def source_hash(self, source: Path) -> str:
+        '''
+        The **source_hash** function returns the SHA-256 of a source file.
+        It is remembered until the file changes, the function is called from several threads.
+
+        :param source: Path: The source file
+        :return: The hash of the file content
+        '''
+        stat = source.stat()
+        version = (str(source), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            known = self.source_hashes.get(version)
+        if known is not None:
+            return known
+        digest = hashlib.sha256()
+        with open(source, 'rb') as fh:
+            while chunk := fh.read(64 * 1024):
+                digest.update(chunk)
+        with self.lock:
+            if len(self.source_hashes) >= 10000:
+                self.source_hashes.clear()
+            self.source_hashes[version] = digest.hexdigest()
+        return digest.hexdigest()
+
+    async def render(self, source: Path, transformation: list) -> RenderResult:
+        '''
+        The **render** function returns the rendered transformation of a file, from the cache if possible.
+
+        :param source: Path: The source file
+        :param transformation: list: The transformation steps
+        :return: The rendered file with the time spent on every filter
+        '''
+        transform_hash = hashlib.sha256(encode_transformation(transformation).encode('ascii')).hexdigest()
+        key = f"{await run_in_threadpool(self.source_hash, source)}-{transform_hash}"
+        path = await run_in_threadpool(self.cache.get, key)
+        if path is not None:
+            return RenderResult(path=path, cached=True)
+        data, timings = await run_in_process_pool(render_transformation, str(source), transformation)
+        path = await run_in_threadpool(self.cache.put, key, data)
+        return RenderResult(path=path, cached=False, timings=timings)
+
+
+@lru_cache()
+def get_transform_engine() -> TransformEngine:
+    '''
+    The **get_transform_engine** function returns the local transformation engine.
+
+    :return: A transformation engine
+    '''
+    return TransformEngine(RenderCache(settings.transform_cache_dir, settings.transform_cache_max_bytes))
@@ -0,0 +1,116 @@
+"""
+Batched loading of rows by key.
+
+A **BatchLoader** collects the keys asked for while the current event loop tick runs and loads them
+with one ``WHERE key IN (...)`` query, so code that loads related rows one at a time, e.g. with
+``asyncio.gather``, does not send a query per row. Loaded rows are remembered until the transaction
+of the session ends, which keeps the loaders scoped to one request and never serves rows from before
+a commit or rollback.
+"""
+import asyncio
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_loaders = weakref.WeakKeyDictionary()
+
+
+class BatchLoader:
+    '''
+    The **BatchLoader** class loads the rows of a model by the values of a column in batches.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param column: The mapped column to load by, e.g. ``User.id``
+    :param max_batch_size: int: The maximum number of keys in one query
+    '''
+
+    def __init__(self, db: Session, column, max_batch_size: int = 500):
+        self.db = db
+        self.column = column
+        self.model = column.class_
+        self.max_batch_size = max_batch_size
+        self.cache = {}
+        self.pending = []
+
+    async def load(self, key):
+        '''
+        The **load** function returns the row with the given key.
+
+        :param key: The value of the column
+        :return: The row or None if there is none
+        '''
+        future = self.cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.cache[key] = loop.create_future()
+            if not self.pending:
+                loop.call_soon(self.dispatch)
+            self.pending.append(key)
+        return await future
+
+    async def load_many(self, keys) -> list:
+        '''
+        The **load_many** function returns the rows with the given keys.
+
+        :param keys: The values of the column
+        :return: The rows in the order of the keys, None for keys without a row
+        '''
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def prime(self, key, row) -> None:
+        '''
+        The **prime** function remembers a row that was loaded or added otherwise, so it is not queried again.
+
+        :param key: The value of the column
+        :param row: The row
+        :return: None
+        '''
+        future = self.cache.get(key)
+        if future is None or future.done():
+            future = self.cache[key] = asyncio.get_running_loop().create_future()
+        future.set_result(row)
+
+    def clear(self) -> None:
+        self.cache = {key: future for key, future in self.cache.items() if not future.done()}
+
+    def dispatch(self) -> None:
+        keys, self.pending = self.pending, []
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = keys[start:start + self.max_batch_size]
+            try:
+                rows = {getattr(row, self.column.key): row
+                        for row in self.db.query(self.model).filter(self.column.in_(batch)).all()}
+            except Exception as err:
+                for key in batch:
+                    future = self.cache.pop(key)
+                    if not future.done():
+                        future.set_exception(err)
+                continue
+            for key in batch:
+                future = self.cache[key]
+                if not future.done():
+                    future.set_result(rows.get(key))
+
+
+def get_loader(db: Session, column) -> BatchLoader:
+    '''
+    The **get_loader** function returns the loader of a column for a session, creating it when needed.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param column: The mapped column to load by, e.g. ``User.id``
+    :return: The loader
+    '''
+    loaders = _loaders.setdefault(db, {})
+    name = (column.class_, column.key)
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = BatchLoader(db, column)
+    return loader
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def clear_loaders(session: Session, transaction) -> None:
+    if transaction.parent is None:
+        for loader in _loaders.get(session, {}).values():
+            loader.clear()
@@ -0,0 +1,144 @@
+"""
+Prometheus metrics of the application, served at ``/metrics``.
+
+* ``http_request_duration_seconds`` - the latency of the requests by method, route template and status,
+  requests matching no route are counted as ``unmatched``;
+* ``http_requests_in_progress`` - the requests being handled;
+* ``db_query_duration_seconds`` - the time of the SQL statements by their kind;
+* ``dependency_duration_seconds`` - the calls to Redis, the image storage and the SMTP server
+  by service, operation and outcome.
+
+Recording a value only updates a few counters in memory, the text format is built when ``/metrics``
+is scraped. When the application runs in several worker processes, set the ``PROMETHEUS_MULTIPROC_DIR``
+environment variable to an empty directory shared by the workers before starting them, the workers then
+keep their values in files there and ``/metrics`` adds up the values of all of them.
+"""
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+import redis
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, \
+    generate_latest, multiprocess
+from sqlalchemy import event
+from starlette.responses import Response
+
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+QUERY_KINDS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+FAST_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Latency of HTTP requests',
+                             ['method', 'route', 'status'])
+REQUESTS_IN_PROGRESS = Gauge('http_requests_in_progress', 'HTTP requests being handled', ['method'],
+                             multiprocess_mode='livesum')
+QUERY_DURATION = Histogram('db_query_duration_seconds', 'Time of SQL statements', ['kind'],
+                           buckets=FAST_BUCKETS)
+DEPENDENCY_DURATION = Histogram('dependency_duration_seconds', 'Time of calls to external services',
+                                ['service', 'operation', 'outcome'], buckets=FAST_BUCKETS)
+
+
+@contextmanager
+def timed(service: str, operation: str):
+    '''
+    The **timed** function records the time of a call to an external service.
+    The outcome is ``error`` if the block raises.
+
+    :param service: str: The service, e.g. redis
+    :param operation: str: The operation of the service, e.g. get
+    :return: A context manager
+    '''
+    start = perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        DEPENDENCY_DURATION.labels(service, operation, outcome).observe(perf_counter() - start)
+
+
+class InstrumentedRedis(redis.Redis):
+    '''
+    The **InstrumentedRedis** class is a Redis client recording the time of every command.
+    '''
+
+    def execute_command(self, *args, **options):
+        with timed('redis', str(args[0]).lower()):
+            return super().execute_command(*args, **options)
+
+
+def instrument_engine(engine) -> None:
+    '''
+    The **instrument_engine** function records the time of the statements executed by an engine.
+
+    :param engine: The SQLAlchemy engine
+    :return: None
+    '''
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        kind = statement.lstrip()[:6].upper()
+        QUERY_DURATION.labels(kind if kind in QUERY_KINDS else 'OTHER'). \
+            observe(perf_counter() - context.metrics_start)
+
+
+class MetricsMiddleware:
+    '''
+    The **MetricsMiddleware** class records the latency of the requests and the requests in progress.
+    The route template is used as the label, so the number of series does not grow with the ids in the paths.
+
+    :param app: The ASGI application
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        method = scope['method']
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # the router puts the matched route in the scope
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            REQUEST_DURATION.labels(method, route, str(status_code)).observe(perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    '''
+    The **metrics_response** function returns the metrics in the Prometheus text format,
+    of all the worker processes in the multiprocess mode.
+
+    :return: The response
+    '''
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead() -> None:
+    '''
+    The **mark_process_dead** function drops the live values of a stopping worker in the multiprocess mode.
+
+    :return: None
+    '''
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
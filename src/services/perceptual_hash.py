@@ -0,0 +1,75 @@
+"""
+Perceptual hashes for finding near-duplicate images.
+
+The difference hash (dHash) of an image stays the same or changes in a few bits when the image is
+re-compressed, resized or slightly edited, so the number of different bits tells how similar two
+images are. To search for hashes within a Hamming distance the 64-bit hash is split into four 16-bit
+chunks stored in indexed columns (multi-index hashing): two hashes within distance ``r`` always have
+a chunk within distance ``r // 4``, so only rows matching one of the few neighbours of a chunk have to
+be compared. Searches are limited to ``MAX_SEARCH_DISTANCE``: at 8 bits a chunk has 137 neighbours, at
+16 bits it would have about 2.5 thousand per column, too many values for one indexed query.
+"""
+from functools import lru_cache
+from io import BytesIO
+from itertools import combinations
+
+from PIL import Image as PILImage, ImageOps
+
+CHUNKS = 4
+CHUNK_BITS = 16
+HASH_SIZE = 8
+MAX_SEARCH_DISTANCE = 8
+
+
+def dhash(data: bytes) -> int:
+    '''
+    The **dhash** function computes the 64-bit difference hash of an image.
+    The image is shrunk to 9x8 grey pixels and every bit tells whether a pixel is brighter than its
+    right neighbour. JPEG files are decoded at a reduced size, which makes it cheap for large photos.
+
+    :param data: bytes: The image file
+    :return: The hash as an unsigned integer
+    '''
+    with PILImage.open(BytesIO(data)) as image:
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        image = ImageOps.exif_transpose(image).convert('L').resize((HASH_SIZE + 1, HASH_SIZE), PILImage.LANCZOS)
+        pixels = list(image.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        for col in range(HASH_SIZE):
+            left = pixels[row * (HASH_SIZE + 1) + col]
+            right = pixels[row * (HASH_SIZE + 1) + col + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def split_hash(value: int) -> list:
+    '''
+    The **split_hash** function splits a hash into the chunks stored in the ``phash_0`` to ``phash_3`` columns.
+
+    :param value: int: The hash
+    :return: The chunks, the most significant first
+    '''
+    mask = (1 << CHUNK_BITS) - 1
+    return [value >> (CHUNK_BITS * (CHUNKS - 1 - index)) & mask for index in range(CHUNKS)]
+
+
+@lru_cache(maxsize=8)
+def flip_masks(radius: int) -> tuple:
+    return tuple(sum(1 << bit for bit in bits)
+                 for distance in range(radius + 1) for bits in combinations(range(CHUNK_BITS), distance))
+
+
+def chunk_neighbours(chunk: int, max_distance: int) -> list:
+    '''
+    The **chunk_neighbours** function lists the chunk values a matching hash can have in one column.
+
+    :param chunk: int: A chunk of the searched hash
+    :param max_distance: int: The maximum Hamming distance of the whole hashes
+    :return: The chunk values within ``max_distance // 4`` bits
+    '''
+    return [chunk ^ mask for mask in flip_masks(max_distance // CHUNKS)]
@@ -0,0 +1,210 @@
+"""
+QR codes of image urls.
+
+A QR code only depends on the encoded url and the output format, so it is identified by the hash of
+both. Rendered codes are kept in a small in-memory LRU cache and in a disk cache shared by the
+workers, and only rendered in the image processing pool when neither has them. The hash is also the
+ETag of the code, so a client that has a code already only costs the lookup of the url of the image.
+The code served for an image changes with its url, so clients revalidate it after ``QR_CACHE_CONTROL``.
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from threading import Lock
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+import qrcode
+import qrcode.image.svg
+from fastapi.concurrency import run_in_threadpool
+
+from src.config.config import settings
+from src.services.image_processing import run_in_process_pool
+from src.services.image_transforms import RenderCache
+
+PNG = 'png'
+SVG = 'svg'
+MEDIA_TYPES = {PNG: 'image/png', SVG: 'image/svg+xml'}
+QR_CODE_URL = '/api/pictures/{image_id}/qr_code'
+QR_CACHE_CONTROL = 'private, max-age=60, must-revalidate'
+BOX_SIZE = 10
+BORDER = 5
+
+
+def qr_key(data: str, image_format: str) -> str:
+    '''
+    The **qr_key** function identifies the QR code of a text in a format.
+
+    :param data: str: The encoded text
+    :param image_format: str: png or svg
+    :return: The SHA-256 of the text and the rendering options
+    '''
+    return hashlib.sha256(f"{image_format}:{BOX_SIZE}:{BORDER}:{data}".encode('utf-8')).hexdigest()
+
+
+def render_qr(data: str, image_format: str) -> bytes:
+    '''
+    The **render_qr** function renders the QR code of a text.
+
+    :param data: str: The text to encode
+    :param image_format: str: png or svg
+    :return: The encoded image
+    '''
+    qr = qrcode.QRCode(version=1, box_size=BOX_SIZE, border=BORDER)
+    qr.add_data(data)
+    qr.make(fit=True)
+    output = BytesIO()
+    if image_format == SVG:
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(output)
+    else:
+        qr.make_image(fill_color='black', back_color='white').save(output, format='PNG')
+    return output.getvalue()
+
+
+class MemoryCache:
+    '''
+    The **MemoryCache** class keeps the most recently used values up to ``max_items``.
+    '''
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value) -> None:
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+
+@dataclass
+class QRCode:
+    key: str
+    content: bytes
+    media_type: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.key}"'
+
+
+class QRCodeService:
+    '''
+    The **QRCodeService** class returns QR codes from the memory cache, the disk cache or the process pool.
+
+    :param cache_dir: str: The directory of the disk cache
+    :param max_bytes: int: The maximum size of the disk cache
+    :param memory_items: int: The number of codes kept in memory
+    '''
+
+    def __init__(self, cache_dir: str, max_bytes: int, memory_items: int):
+        self.memory = MemoryCache(memory_items)
+        self.disk = {image_format: RenderCache(Path(cache_dir) / image_format, max_bytes // len(MEDIA_TYPES),
+                                               suffix=f".{image_format}")
+                     for image_format in MEDIA_TYPES}
+
+    def read_disk(self, key: str, image_format: str):
+        path = self.disk[image_format].get(key)
+        try:
+            return path.read_bytes() if path is not None else None
+        except FileNotFoundError:
+            # removed by another worker's eviction in the meantime
+            return None
+
+    async def get(self, data: str, image_format: str = PNG) -> QRCode:
+        '''
+        The **get** function returns the QR code of a text.
+
+        :param data: str: The text to encode
+        :param image_format: str: png or svg
+        :return: The QR code
+        '''
+        key = qr_key(data, image_format)
+        content = self.memory.get(key)
+        if content is None:
+            content = await run_in_threadpool(self.read_disk, key, image_format)
+            if content is None:
+                content = await run_in_process_pool(render_qr, data, image_format)
+                await run_in_threadpool(self.disk[image_format].put, key, content)
+            self.memory.put(key, content)
+        return QRCode(key=key, content=content, media_type=MEDIA_TYPES[image_format])
+
+
+    async def get_many(self, texts: list, image_format: str = PNG) -> list:
+        '''
+        The **get_many** function returns the QR codes of several texts.
+        The missing codes are rendered concurrently by all workers of the image processing pool.
+
+        :param texts: list: The texts to encode
+        :param image_format: str: png or svg
+        :return: The QR codes in the order of the texts
+        '''
+        return await asyncio.gather(*[self.get(text, image_format) for text in texts])
+
+
+class ZipBuffer(RawIOBase):
+    '''
+    The **ZipBuffer** class collects what a **ZipFile** writes, so it can be sent while the archive is written.
+    It is not seekable, which makes the **ZipFile** write the sizes after the data of every file.
+    '''
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def stream_zip(service: QRCodeService, items: list, image_format: str = PNG, batch_size: int = 32):
+    '''
+    The **stream_zip** function streams a ZIP archive of QR codes.
+    The codes are rendered in batches while the archive is sent, so only one batch is kept in memory.
+
+    :param service: QRCodeService: The QR code service
+    :param items: list: Pairs of file name and text to encode, the extension is added to the name
+    :param image_format: str: png or svg
+    :param batch_size: int: The number of codes rendered at a time
+    :return: An async iterator of the archive bytes
+    '''
+    buffer = ZipBuffer()
+    # PNG files are compressed already
+    compression = ZIP_STORED if image_format == PNG else ZIP_DEFLATED
+    with ZipFile(buffer, 'w', compression=compression) as archive:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            codes = await service.get_many([text for _, text in batch], image_format)
+            for (name, _), qr_code in zip(batch, codes):
+                archive.writestr(f"{name}.{image_format}", qr_code.content)
+            yield buffer.take()
+    yield buffer.take()
+
+
+@lru_cache()
+def get_qr_service() -> QRCodeService:
+    '''
+    The **get_qr_service** function returns the QR code service of the application.
+
+    :return: A QR code service
+    '''
+    return QRCodeService(settings.qr_cache_dir, settings.qr_cache_max_bytes, settings.qr_memory_cache_items)
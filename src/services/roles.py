@@ -1,3 +1,4 @@
+import logging
 from typing import List
 
 from fastapi import Depends, HTTPException, status, Request
@@ -6,15 +7,16 @@ from src.database.models import User, Role
 from src.services.auth import auth_service
 from src.config import detail
 
+logger = logging.getLogger(__name__)
+
 
 class CheckRole:
     def __init__(self, allowed_roles: List[Role]):
         self.allowed_roles = allowed_roles
 
     async def __call__(self, request: Request, current_user: User = Depends(auth_service.get_current_user)):
-        print(request.method, request.url)
-        print(f'User role {current_user.roles}')
-        print(f'Allowed roles: {self.allowed_roles}')
+        logger.debug("%s %s role %s, allowed %s", request.method, request.url.path, current_user.roles,
+                     self.allowed_roles)
         if current_user.roles not in self.allowed_roles:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail.OPERATION_FORBIDDEN)
 
@@ -0,0 +1,158 @@
+"""
+Fast JSON encoding of ORM rows for list responses.
+
+The rows of a list come from the database with the types their response model declares, so validating
+every row with ``orm_mode`` and encoding it again with ``jsonable_encoder`` is wasted work for long
+pages. **dump_rows** reads the fields of the model straight from the rows and encodes them with orjson.
+The output is the same JSON FastAPI would send for the model. Run ``python -m benchmarks.serialization``
+to compare the two paths.
+
+Routes taking a ``fields`` parameter send only the requested fields, and load only their columns.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+import orjson
+from fastapi import HTTPException, Query, Response, status
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
+from sqlalchemy.orm import load_only
+
+from src.config import detail
+
+
+def to_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def select_fields(fields: str, model) -> tuple | None:
+    '''
+    The **select_fields** function parses a ``fields`` query parameter, e.g. ``id,image_url``.
+
+    :param fields: str: Comma separated names of fields of the model, None for all of them
+    :param model: The pydantic model of the response
+    :return: The names in the order of the model, None for all fields
+    :raises ValueError: if a name is not a field of the model
+    '''
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    if not names:
+        raise ValueError("no fields")
+    unknown = names - model.__fields__.keys()
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(name for name in model.__fields__ if name in names)
+
+
+class FieldsQuery:
+    '''
+    The **FieldsQuery** class is a dependency reading the ``fields`` query parameter of a response model.
+
+    :param model: The pydantic model of the response
+    '''
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, fields: str = Query(None, description="Comma separated fields to return, e.g. id,image_url")):
+        try:
+            return select_fields(fields, self.model)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{detail.INVALID_FIELDS}: {err}")
+
+
+def load_fields(model, fields: tuple):
+    '''
+    The **load_fields** function narrows a query to the columns of the requested response fields.
+    The id and the version are always loaded, the ETag of the response is made of them.
+
+    :param model: The mapped class
+    :param fields: tuple: The names of the columns
+    :return: A load_only option
+    '''
+    return load_only(*[getattr(model, name) for name in dict.fromkeys(('id', 'updated_at') + tuple(fields))])
+
+
+@lru_cache(maxsize=None)
+def field_plan(model, fields: tuple = None) -> tuple:
+    '''
+    The **field_plan** function lists how to read the fields of a response model from a row.
+
+    :param model: The pydantic model of one row
+    :param fields: tuple: The names of the fields to include, None for all of them
+    :return: Tuples of the attribute name, the JSON key and a conversion function or None
+    '''
+    plan = []
+    for field in model.__fields__.values():
+        if fields is not None and field.name not in fields:
+            continue
+        convert = None
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            nested = field.type_
+            if field.shape == SHAPE_SINGLETON:
+                def convert(value, nested=nested):
+                    return None if value is None else encode_row(value, nested)
+            elif field.shape == SHAPE_LIST:
+                def convert(value, nested=nested):
+                    return None if value is None else [encode_row(item, nested) for item in value]
+        elif field.type_ is date and field.shape == SHAPE_SINGLETON:
+            # a date field of a DateTime column
+            convert = to_date
+        plan.append((field.name, field.alias, convert))
+    return tuple(plan)
+
+
+def encode_row(row, model, fields: tuple = None) -> dict:
+    '''
+    The **encode_row** function turns a row into the dict of its response model, without validating it.
+
+    :param row: The ORM object
+    :param model: The pydantic model of the row
+    :param fields: tuple: The names of the fields to include, None for all of them
+    :return: A dict ready for orjson
+    '''
+    return {alias: getattr(row, name) if convert is None else convert(getattr(row, name))
+            for name, alias, convert in field_plan(model, fields)}
+
+
+def dump_rows(rows, model, fields: tuple = None) -> bytes:
+    '''
+    The **dump_rows** function encodes a list of rows as the JSON of a list of the response model.
+
+    :param rows: The ORM objects
+    :param model: The pydantic model of one row
+    :param fields: tuple: The names of the fields to include, None for all of them
+    :return: The JSON bytes
+    '''
+    return orjson.dumps([encode_row(row, model, fields) for row in rows], option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORMListResponse(Response):
+    '''
+    The **ORMListResponse** class sends a list of rows encoded by **dump_rows**.
+    Routes keep their ``response_model`` for the documentation, FastAPI does not validate a returned response.
+
+    :param rows: The ORM objects
+    :param model: The pydantic model of one row
+    :param fields: tuple: The names of the fields to include, None for all of them
+    '''
+    media_type = "application/json"
+
+    def __init__(self, rows, model, fields: tuple = None, status_code: int = 200, headers: dict = None):
+        super().__init__(content=dump_rows(rows, model, fields), status_code=status_code, headers=headers)
+
+
+class ORMResponse(Response):
+    '''
+    The **ORMResponse** class sends a single row like **ORMListResponse**.
+
+    :param row: The ORM object
+    :param model: The pydantic model of the row
+    :param fields: tuple: The names of the fields to include, None for all of them
+    '''
+    media_type = "application/json"
+
+    def __init__(self, row, model, fields: tuple = None, status_code: int = 200, headers: dict = None):
+        super().__init__(content=orjson.dumps(encode_row(row, model, fields), option=orjson.OPT_NON_STR_KEYS),
+                         status_code=status_code, headers=headers)
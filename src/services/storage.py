@@ -0,0 +1,423 @@
+"""
+Storage backends for uploaded images.
+
+The application talks to a **StorageBackend** instead of calling Cloudinary directly.
+The backend in use is selected by ``settings.storage_backend``:
+
+* ``cloudinary`` - :class:`CloudinaryStorage`, the hosted service used in production;
+* ``local`` - :class:`LocalStorage`, plain files under ``settings.storage_local_root`` served by the
+  ``/api/storage`` route, so the whole upload and serving pipeline runs without network access.
+"""
+import hashlib
+import hmac
+import os
+import shutil
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+import cloudinary.utils
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from src.config.config import settings
+from src.services.image_processing import make_variants
+from src.services.image_transforms import encode_transformation
+
+
+class StorageBackend:
+    '''
+    The **StorageBackend** class describes the operations every storage must provide.
+    '''
+    name = 'base'
+
+    def put(self, file, public_id: str, overwrite: bool = True) -> dict:
+        '''
+        The **put** function stores a file under the given public id.
+
+        :param file: A file-like object or bytes with the image
+        :param public_id: str: The name of the image in the storage
+        :param overwrite: bool: Whether to overwrite an existing image or not
+        :return: A dict with at least the ``public_id`` and ``url`` keys
+        '''
+        raise NotImplementedError
+
+    def delete(self, public_id: str) -> None:
+        '''
+        The **delete** function removes an image from the storage. Missing images are ignored.
+
+        :param public_id: str: The name of the image in the storage
+        :return: None
+        '''
+        raise NotImplementedError
+
+    def delete_many(self, public_ids: list) -> list:
+        '''
+        The **delete_many** function removes a batch of images from the storage.
+
+        :param public_ids: list: The names of the images in the storage
+        :return: The names that are no longer stored, deleted now or missing already
+        '''
+        raise NotImplementedError
+
+    def list_ids(self, prefix: str):
+        '''
+        The **list_ids** function iterates over the stored images. Variants are not listed,
+        they are removed together with their image.
+
+        :param prefix: str: The prefix of the names to list
+        :return: An iterator of ``(public_id, created_at)`` pairs, ``created_at`` in UTC
+        '''
+        raise NotImplementedError
+
+    def url(self, public_id: str) -> str:
+        '''
+        The **url** function returns the public url of an image.
+
+        :param public_id: str: The name of the image in the storage
+        :return: The url of the image
+        '''
+        raise NotImplementedError
+
+    def transform(self, public_id: str, transformation: list) -> str:
+        '''
+        The **transform** function returns the url of an image with the transformation applied.
+
+        :param public_id: str: The name of the image in the storage
+        :param transformation: list: Cloudinary-style list of transformation steps
+        :return: The url of the transformed image
+        '''
+        raise NotImplementedError
+
+    def create_variants(self, public_id: str, variants: dict) -> dict:
+        '''
+        The **create_variants** function makes resized WebP copies of a stored image.
+
+        :param public_id: str: The name of the image in the storage
+        :param variants: dict: Variant name to maximum width
+        :return: A dict of variant name to url
+        '''
+        raise NotImplementedError
+
+    def exists(self, public_id: str) -> bool:
+        '''
+        The **exists** function checks whether an image is in the storage.
+
+        :param public_id: str: The name of the image in the storage
+        :return: True if the image is stored
+        '''
+        raise NotImplementedError
+
+    def sign_upload(self, public_id: str, expires_at: int) -> dict:
+        '''
+        The **sign_upload** function returns the parameters a client needs to upload an image
+        directly to the storage, without sending it through the API.
+
+        :param public_id: str: The name the image must be stored under
+        :param expires_at: int: Unix time after which the parameters are not valid
+        :return: A dict with the ``upload_url`` and the form ``fields`` to send with the file
+        '''
+        raise NotImplementedError
+
+
+class CloudinaryStorage(StorageBackend):
+    '''
+    The **CloudinaryStorage** class stores images in Cloudinary.
+
+    :param cloud_name: str: The name of the cloudinary account
+    :param api_key: str: The api key of the cloudinary account
+    :param api_secret: str: The api secret of the cloudinary account
+    '''
+    name = 'cloudinary'
+    signature_ttl = 60 * 60
+
+    def __init__(self, cloud_name: str, api_key, api_secret: str):
+        self.cloud_name = cloud_name
+        self.api_key = api_key
+        self.api_secret = api_secret
+        cloudinary.config(
+            cloud_name=cloud_name,
+            api_key=api_key,
+            api_secret=api_secret,
+            secure=True
+        )
+
+    def put(self, file, public_id: str, overwrite: bool = True) -> dict:
+        r = cloudinary.uploader.upload(file, public_id=public_id, overwrite=overwrite)
+        return {**r, 'public_id': public_id, 'url': self.url(public_id)}
+
+    def delete(self, public_id: str) -> None:
+        cloudinary.uploader.destroy(public_id, invalidate=True)
+
+    def delete_many(self, public_ids: list) -> list:
+        removed = []
+        # the admin api accepts up to 100 public ids per call
+        for start in range(0, len(public_ids), 100):
+            r = cloudinary.api.delete_resources(public_ids[start:start + 100], invalidate=True)
+            removed.extend(public_id for public_id, result in r.get('deleted', {}).items()
+                           if result in ('deleted', 'not_found'))
+        return removed
+
+    def list_ids(self, prefix: str):
+        options = {'type': 'upload', 'prefix': prefix, 'max_results': 500}
+        while True:
+            r = cloudinary.api.resources(**options)
+            for resource in r.get('resources', []):
+                yield resource['public_id'], datetime.strptime(resource['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+            if not r.get('next_cursor'):
+                break
+            options['next_cursor'] = r['next_cursor']
+
+    def url(self, public_id: str) -> str:
+        return cloudinary.utils.cloudinary_url(public_id)[0]
+
+    def transform(self, public_id: str, transformation: list) -> str:
+        return cloudinary.utils.cloudinary_url(public_id, transformation=transformation)[0]
+
+    @staticmethod
+    def variant_transformation(width: int) -> dict:
+        return {'width': width, 'crop': 'limit', 'format': 'webp'}
+
+    def create_variants(self, public_id: str, variants: dict) -> dict:
+        eager = [self.variant_transformation(width) for width in variants.values()]
+        cloudinary.uploader.explicit(public_id, type='upload', eager=eager, eager_async=True)
+        return {name: cloudinary.utils.cloudinary_url(public_id, **self.variant_transformation(width))[0]
+                for name, width in variants.items()}
+
+    def exists(self, public_id: str) -> bool:
+        try:
+            cloudinary.api.resource(public_id)
+        except cloudinary.exceptions.NotFound:
+            return False
+        return True
+
+    def sign_upload(self, public_id: str, expires_at: int) -> dict:
+        # Cloudinary accepts a signed request for an hour after its timestamp, backdating the timestamp
+        # makes the parameters expire at expires_at; longer expiries are cut to Cloudinary's hour
+        timestamp = min(int(time.time()), expires_at - self.signature_ttl)
+        fields = {'public_id': public_id, 'timestamp': timestamp}
+        fields['signature'] = cloudinary.utils.api_sign_request(fields, self.api_secret)
+        fields['api_key'] = self.api_key
+        return {'upload_url': f"https://api.cloudinary.com/v1_1/{self.cloud_name}/image/upload", 'fields': fields}
+
+
+class LocalStorage(StorageBackend):
+    '''
+    The **LocalStorage** class stores images as files on the local disk.
+
+    :param root: str: The directory the images are stored in
+    :param base_url: str: The url prefix the images are served from
+    :param secret: str: The key direct uploads are signed with
+    '''
+    name = 'local'
+    chunk_size = 64 * 1024
+    # variants are kept apart from the images, a public id may contain any character allowed in a path
+    variants_dir = '.variants'
+
+    def __init__(self, root: str, base_url: str, secret: str = ''):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret.encode('utf-8')
+
+    def path(self, public_id: str) -> Path:
+        '''
+        The **path** function maps a public id to a file inside the storage root.
+
+        :param public_id: str: The name of the image in the storage
+        :return: The path of the file
+        :raises ValueError: If the public id points outside of the storage root
+        '''
+        path = (self.root / public_id).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid public id: {public_id}")
+        return path
+
+    def put(self, file, public_id: str, overwrite: bool = True) -> dict:
+        path = self.path(public_id)
+        if path.exists() and not overwrite:
+            return {'public_id': public_id, 'url': self.url(public_id), 'bytes': path.stat().st_size}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, 'wb') as fh:
+            if isinstance(file, (bytes, bytearray, memoryview)):
+                fh.write(file)
+            else:
+                if hasattr(file, 'seek'):
+                    file.seek(0)
+                shutil.copyfileobj(file, fh, self.chunk_size)
+        os.replace(tmp_path, path)
+        return {'public_id': public_id, 'url': self.url(public_id), 'bytes': path.stat().st_size}
+
+    def variant_id(self, public_id: str, name: str) -> str:
+        return f"{self.variants_dir}/{public_id}/{name}"
+
+    def delete(self, public_id: str) -> None:
+        self.path(public_id).unlink(missing_ok=True)
+        shutil.rmtree(self.path(f"{self.variants_dir}/{public_id}"), ignore_errors=True)
+
+    def delete_many(self, public_ids: list) -> list:
+        for public_id in public_ids:
+            self.delete(public_id)
+        return list(public_ids)
+
+    def list_ids(self, prefix: str):
+        for directory, directories, files in os.walk(self.root):
+            # the variants directory and temporary files of unfinished writes
+            directories[:] = [name for name in directories if not name.startswith('.')]
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = Path(directory) / name
+                public_id = path.relative_to(self.root).as_posix()
+                if public_id.startswith(prefix):
+                    try:
+                        yield public_id, datetime.utcfromtimestamp(path.stat().st_mtime)
+                    except FileNotFoundError:
+                        continue
+
+    def url(self, public_id: str) -> str:
+        return f"{self.base_url}/{public_id}"
+
+    def transform(self, public_id: str, transformation: list) -> str:
+        # rendered on request by the /api/storage route, like Cloudinary does for transformation urls
+        token = encode_transformation(transformation)
+        return f"{self.url(public_id)}?tr={token}&sig={self._transform_signature(public_id, token)}"
+
+    def _transform_signature(self, public_id: str, token: str) -> str:
+        message = f"transform:{public_id}:{token}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def verify_transform(self, public_id: str, token: str, signature: str) -> bool:
+        '''
+        The **verify_transform** function checks that a transformation url was issued by **transform**.
+
+        :param public_id: str: The name of the image
+        :param token: str: The encoded transformation
+        :param signature: str: The signature of the url
+        :return: True if the signature is valid
+        '''
+        return bool(signature) and hmac.compare_digest(self._transform_signature(public_id, token), signature)
+
+    def create_variants(self, public_id: str, variants: dict) -> dict:
+        urls = {}
+        for name, data in make_variants(self.path(public_id), variants).items():
+            variant_id = self.variant_id(public_id, name)
+            self.put(data, variant_id)
+            urls[name] = self.url(variant_id)
+        return urls
+
+    def exists(self, public_id: str) -> bool:
+        return self.path(public_id).is_file()
+
+    def _signature(self, public_id: str, expires_at: int) -> str:
+        message = f"{public_id}:{expires_at}".encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).hexdigest()
+
+    def sign_upload(self, public_id: str, expires_at: int) -> dict:
+        fields = {'public_id': public_id, 'expires_at': expires_at,
+                  'signature': self._signature(public_id, expires_at)}
+        return {'upload_url': f"{self.base_url}/upload", 'fields': fields}
+
+    def verify_upload(self, public_id: str, expires_at: int, signature: str) -> bool:
+        '''
+        The **verify_upload** function checks the parameters of a direct upload made to the local storage.
+
+        :param public_id: str: The name the image is stored under
+        :param expires_at: int: Unix time after which the parameters are not valid
+        :param signature: str: The signature returned by **sign_upload**
+        :return: True if the signature is valid and not expired
+        '''
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self._signature(public_id, expires_at), signature)
+
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def sniff_media_type(head: bytes) -> str:
+    '''
+    The **sniff_media_type** function detects the media type of an image from its first bytes.
+    Local files are stored without an extension, so the name can not be used for it.
+
+    :param head: bytes: The first bytes of the file
+    :return: The media type, ``application/octet-stream`` if it is unknown
+    '''
+    for signature, media_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'):
+        return 'image/avif'
+    return 'application/octet-stream'
+
+
+class SendfileResponse(FileResponse):
+    '''
+    The **SendfileResponse** class serves a file without copying it through Python when possible.
+
+    If the ASGI server supports the ``http.response.zerocopysend`` extension the open file descriptor
+    is handed over to the server, which uses ``sendfile``. If ``accel_redirect`` is given, the body is
+    left empty and a ``X-Accel-Redirect`` header tells the fronting nginx to send the file itself.
+    Otherwise the file is streamed in chunks as a regular **FileResponse**.
+    '''
+
+    def __init__(self, path, accel_redirect: str = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.accel_redirect = accel_redirect
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.accel_redirect:
+            response = Response(status_code=self.status_code, media_type=self.media_type,
+                                headers={'X-Accel-Redirect': self.accel_redirect})
+            await response(scope, receive, send)
+            return
+        if 'http.response.zerocopysend' not in scope.get('extensions', {}):
+            await super().__call__(scope, receive, send)
+            return
+        stat_result = os.stat(self.path)
+        self.set_stat_headers(stat_result)
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        if scope['method'].upper() == 'HEAD':
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+        with open(self.path, 'rb') as fh:
+            await send({'type': 'http.response.zerocopysend', 'file': fh.fileno(),
+                        'count': stat_result.st_size, 'more_body': False})
+
+
+def create_storage(config=settings) -> StorageBackend:
+    '''
+    The **create_storage** function builds the storage backend selected in the settings.
+
+    :param config: Settings: The application settings
+    :return: A storage backend
+    :raises ValueError: If the backend name is unknown
+    '''
+    if config.storage_backend == CloudinaryStorage.name:
+        return CloudinaryStorage(config.cloudinary_name, config.cloudinary_api_key, config.cloudinary_api_secret)
+    if config.storage_backend == LocalStorage.name:
+        return LocalStorage(config.storage_local_root, config.storage_local_base_url, config.secret_key)
+    raise ValueError(f"Unknown storage backend: {config.storage_backend}")
+
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    '''
+    The **get_storage** function returns the storage backend of the application.
+    It is created on the first call, not at import time.
+
+    :return: A storage backend
+    '''
+    return create_storage(settings)
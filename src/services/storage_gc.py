@@ -0,0 +1,246 @@
+"""
+Garbage collection of storage assets that no image refers to any more.
+
+Deleting an image or a user only records its assets in the ``storage_deletions`` table, in the same
+transaction as the delete, so nothing is lost if the process stops. A background worker drains the
+table in batches of ``settings.storage_gc_batch_size``, pausing ``settings.storage_gc_batch_delay``
+seconds between batches, and retries failed deletions with an exponential backoff. Every
+``settings.storage_gc_reconcile_interval`` seconds it also looks for stored objects without an image
+and queues them. The time of the last reconcile is kept in the ``maintenance_runs`` table, so only one
+of the workers of all the processes runs it, and restarts do not run it again before it is due.
+The worker runs in the application or alone with ``python -m src.services.storage_gc``.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.config.config import settings
+from src.database.db import DBSession
+from src.database.models import Image, MaintenanceRun, StorageDeletion
+from src.services.storage import StorageBackend, get_storage
+
+logger = logging.getLogger(__name__)
+
+STORAGE = 'storage'
+FILE = 'file'
+PUBLIC_ID_PREFIX = 'photo_share/'
+QR_CODES_DIR = './src/services/qr_codes'
+RECONCILE = 'storage_reconcile'
+
+
+def enqueue_deletions(db: Session, public_ids=(), files=()) -> None:
+    '''
+    The **enqueue_deletions** function records assets to be removed by the garbage collector.
+    The session is not committed, the caller commits it together with the rows the assets belonged to.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param public_ids: The names of images in the storage
+    :param files: The paths of QR codes saved to ``QR_CODES_DIR``, other values are ignored
+    :return: None
+    '''
+    assets = dict.fromkeys([(STORAGE, public_id) for public_id in public_ids if public_id] +
+                           [(FILE, path) for path in files if path and path.startswith(QR_CODES_DIR)])
+    if not assets:
+        return
+    queued = {tuple(row) for row in db.query(StorageDeletion.kind, StorageDeletion.asset).
+              filter(StorageDeletion.asset.in_([asset for _, asset in assets]))}
+    for kind, asset in assets:
+        if (kind, asset) in queued:
+            continue
+        db.add(StorageDeletion(kind=kind, asset=asset, attempts=0, not_before=datetime.utcnow()))
+
+
+def referenced(db: Session, kind: str, assets: list) -> set:
+    '''
+    The **referenced** function finds the assets that still belong to an image.
+    Identical uploads share one public id, so an asset is only removed when no image uses it.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param kind: str: The kind of the assets
+    :param assets: list: The public ids or file paths
+    :return: The assets in use
+    '''
+    if not assets:
+        return set()
+    column = Image.public_id if kind == STORAGE else Image.qr_code_url
+    return {row[0] for row in db.query(column).filter(column.in_(assets)).distinct()}
+
+
+def delete_files(paths: list) -> list:
+    root = Path(QR_CODES_DIR).resolve()
+    for path in paths:
+        file = Path(path).resolve()
+        if root in file.parents:
+            file.unlink(missing_ok=True)
+    return list(paths)
+
+
+def drain_deletions(db: Session, storage: StorageBackend = None, batch_size: int = None) -> int:
+    '''
+    The **drain_deletions** function removes one batch of queued assets.
+    Assets that could not be removed are retried later, ``storage_gc_retry_delay * 2 ** attempts``
+    seconds after the failure, until ``storage_gc_max_attempts`` is reached.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param storage: StorageBackend: The storage to remove the images from
+    :param batch_size: int: The maximum number of assets to take
+    :return: The number of queue entries handled
+    '''
+    storage = storage or get_storage()
+    batch_size = batch_size or settings.storage_gc_batch_size
+    now = datetime.utcnow()
+    entries = db.query(StorageDeletion). \
+        filter(StorageDeletion.attempts < settings.storage_gc_max_attempts,
+               or_(StorageDeletion.not_before.is_(None), StorageDeletion.not_before <= now)). \
+        order_by(StorageDeletion.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    for kind, remove in ((STORAGE, storage.delete_many), (FILE, delete_files)):
+        batch = [entry for entry in entries if entry.kind == kind]
+        in_use = referenced(db, kind, [entry.asset for entry in batch])
+        orphans = [entry for entry in batch if entry.asset not in in_use]
+        try:
+            removed = set(remove([entry.asset for entry in orphans])) if orphans else set()
+            error = "not deleted"
+        except Exception as err:
+            logger.warning("can not delete %s assets: %s", kind, err)
+            removed, error = set(), str(err)[:255]
+        for entry in batch:
+            if entry.asset in in_use or entry.asset in removed:
+                db.delete(entry)
+            else:
+                entry.attempts += 1
+                entry.last_error = error
+                entry.not_before = now + timedelta(seconds=settings.storage_gc_retry_delay * 2 ** entry.attempts)
+    db.commit()
+    return len(entries)
+
+
+def reconcile(db: Session, storage: StorageBackend = None, grace_seconds: int = None) -> int:
+    '''
+    The **reconcile** function queues stored images and QR codes that no image refers to.
+    Objects newer than the grace period are skipped, they may belong to an upload in progress.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param storage: StorageBackend: The storage to check
+    :param grace_seconds: int: The minimum age of an object in seconds
+    :return: The number of queued assets
+    '''
+    storage = storage or get_storage()
+    grace_seconds = settings.storage_gc_grace_seconds if grace_seconds is None else grace_seconds
+    created_before = datetime.utcnow() - timedelta(seconds=grace_seconds)
+    qr_codes = Path(QR_CODES_DIR)
+    stored_files = ((f"{QR_CODES_DIR}/{file.name}", datetime.utcfromtimestamp(file.stat().st_mtime))
+                    for file in qr_codes.glob('*.png')) if qr_codes.is_dir() else ()
+    queued = 0
+    for kind, objects in ((STORAGE, storage.list_ids(PUBLIC_ID_PREFIX)), (FILE, stored_files)):
+        page = []
+        for asset, created_at in objects:
+            if created_at < created_before:
+                page.append(asset)
+            if len(page) >= 500:
+                queued += queue_orphans(db, kind, page)
+                page = []
+        queued += queue_orphans(db, kind, page)
+    db.commit()
+    return queued
+
+
+def queue_orphans(db: Session, kind: str, assets: list) -> int:
+    orphans = set(assets) - referenced(db, kind, assets)
+    if orphans:
+        enqueue_deletions(db, **{'public_ids' if kind == STORAGE else 'files': sorted(orphans)})
+    return len(orphans)
+
+
+def claim_run(db: Session, name: str, interval: int) -> bool:
+    '''
+    The **claim_run** function records the run of a periodic task if it is due.
+    The check and the update are one statement, so of several workers asking at once only one gets the run.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param name: str: The name of the task
+    :param interval: int: The number of seconds between two runs
+    :return: True if the caller should run the task now
+    '''
+    now = datetime.utcnow()
+    claimed = db.query(MaintenanceRun). \
+        filter(MaintenanceRun.name == name,
+               or_(MaintenanceRun.last_run_at.is_(None),
+                   MaintenanceRun.last_run_at <= now - timedelta(seconds=interval))). \
+        update({MaintenanceRun.last_run_at: now}, synchronize_session=False)
+    if not claimed and db.query(MaintenanceRun.name).filter(MaintenanceRun.name == name).first() is None:
+        db.add(MaintenanceRun(name=name, last_run_at=now))
+        claimed = 1
+    try:
+        db.commit()
+    except IntegrityError:
+        # another worker recorded the first run
+        db.rollback()
+        return False
+    return bool(claimed)
+
+
+def reconcile_if_due(db: Session) -> int:
+    '''
+    The **reconcile_if_due** function runs **reconcile** if no worker did in the last
+    ``settings.storage_gc_reconcile_interval`` seconds.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: The number of queued assets
+    '''
+    if not claim_run(db, RECONCILE, settings.storage_gc_reconcile_interval):
+        return 0
+    return reconcile(db)
+
+
+def run_once(job) -> int:
+    db = DBSession()
+    try:
+        return job(db)
+    finally:
+        db.close()
+
+
+async def run_gc_worker() -> None:
+    '''
+    The **run_gc_worker** function drains the deletion queue and reconciles the storage until it is cancelled.
+
+    :return: None
+    '''
+    checked_at = None
+    while True:
+        try:
+            now = datetime.utcnow()
+            if checked_at is None or (now - checked_at).total_seconds() >= settings.storage_gc_interval:
+                checked_at = now
+                queued = await run_in_threadpool(run_once, reconcile_if_due)
+                if queued:
+                    logger.info("queued %s orphaned assets", queued)
+            handled = await run_in_threadpool(run_once, drain_deletions)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("storage garbage collection failed")
+            handled = 0
+        await asyncio.sleep(settings.storage_gc_batch_delay if handled else settings.storage_gc_interval)
+
+
+def start_gc_worker() -> list:
+    '''
+    The **start_gc_worker** function starts the garbage collector in the running event loop
+    if ``settings.storage_gc_enabled`` is set.
+
+    :return: The worker tasks
+    '''
+    if not settings.storage_gc_enabled:
+        return []
+    return [asyncio.create_task(run_gc_worker())]
+
+
+if __name__ == '__main__':
+    asyncio.run(run_gc_worker())
@@ -0,0 +1,334 @@
+"""
+Queue of uploads processed in the background.
+
+The upload endpoint only spools the file to ``settings.upload_spool_dir`` and enqueues a job; workers
+store the file, create the image and record the progress, which clients poll by job id.
+The queue is kept in Redis (``settings.upload_queue_backend = "redis"``), so workers can run in other
+processes (``python -m src.services.upload_jobs``), or in memory for tests and single-process setups.
+The workers read the spooled files, so they must run on the same host as the API, or
+``settings.upload_spool_dir`` must be a directory shared by the hosts.
+
+A job taken by a worker stays in a processing list until the worker acknowledges it. Jobs of workers
+that crashed are put back in the queue after ``settings.upload_job_timeout`` seconds.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+import redis.asyncio as redis
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from src.config import detail
+from src.config.config import settings
+from src.database.db import DBSession
+from src.database.models import User
+from src.repository import pictures as repository_pictures
+from src.services.uploads import spool_upload, store_upload
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class UploadJobQueue:
+    '''
+    The **UploadJobQueue** class describes the storage of upload jobs and their state.
+    '''
+
+    async def enqueue(self, job: dict) -> None:
+        raise NotImplementedError
+
+    async def dequeue(self, timeout: int = 1) -> Optional[str]:
+        '''
+        The **dequeue** function waits for the next job id.
+
+        :param timeout: int: The number of seconds to wait
+        :return: A job id or None if no job arrived in time
+        '''
+        raise NotImplementedError
+
+    async def ack(self, job_id: str) -> None:
+        '''
+        The **ack** function marks a job taken by **dequeue** as handled.
+
+        :param job_id: str: The id of the job
+        :return: None
+        '''
+
+    async def requeue_stale(self, timeout: int) -> int:
+        '''
+        The **requeue_stale** function puts back the jobs taken longer than ``timeout`` seconds ago
+        and not acknowledged, so the jobs of crashed workers are not lost.
+
+        :param timeout: int: The number of seconds a worker may take for a job
+        :return: The number of jobs put back
+        '''
+        return 0
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def update(self, job_id: str, **fields) -> None:
+        raise NotImplementedError
+
+
+class InMemoryUploadJobQueue(UploadJobQueue):
+    '''
+    The **InMemoryUploadJobQueue** class keeps the jobs in the current process.
+    '''
+
+    def __init__(self):
+        self.jobs = {}
+        self.queue = None
+
+    def _queue(self) -> asyncio.Queue:
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        return self.queue
+
+    async def enqueue(self, job: dict) -> None:
+        self.jobs[job['id']] = dict(job)
+        await self._queue().put(job['id'])
+
+    async def dequeue(self, timeout: int = 1) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._queue().get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def update(self, job_id: str, **fields) -> None:
+        self.jobs[job_id].update(fields)
+
+
+class RedisUploadJobQueue(UploadJobQueue):
+    '''
+    The **RedisUploadJobQueue** class keeps the jobs in Redis: a list of pending job ids, a list of the
+    job ids taken by workers with the time they were taken, and a key with the state of every job,
+    which expires after ``ttl`` seconds.
+    '''
+    queue_key = 'upload_jobs'
+    processing_key = 'upload_jobs:processing'
+    taken_at_key = 'upload_jobs:taken_at'
+
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def job_key(job_id: str) -> str:
+        return f"upload_job:{job_id}"
+
+    async def enqueue(self, job: dict) -> None:
+        await self.client.set(self.job_key(job['id']), json.dumps(job), ex=self.ttl)
+        await self.client.lpush(self.queue_key, job['id'])
+
+    async def dequeue(self, timeout: int = 1) -> Optional[str]:
+        job_id = await self.client.brpoplpush(self.queue_key, self.processing_key, timeout=timeout)
+        if job_id is None:
+            return None
+        job_id = job_id.decode('utf-8') if isinstance(job_id, bytes) else job_id
+        await self.client.hset(self.taken_at_key, job_id, int(time.time()))
+        return job_id
+
+    async def ack(self, job_id: str) -> None:
+        await self.client.lrem(self.processing_key, 1, job_id)
+        await self.client.hdel(self.taken_at_key, job_id)
+
+    async def requeue_stale(self, timeout: int) -> int:
+        now = int(time.time())
+        requeued = 0
+        for job_id in await self.client.lrange(self.processing_key, 0, -1):
+            taken_at = await self.client.hget(self.taken_at_key, job_id)
+            if taken_at is None:
+                # the worker stopped between taking the job and recording the time, start the clock now
+                await self.client.hsetnx(self.taken_at_key, job_id, now)
+                continue
+            if now - int(taken_at) < timeout:
+                continue
+            # only the worker that removes the id from the processing list puts it back
+            if await self.client.lrem(self.processing_key, 1, job_id):
+                await self.client.hdel(self.taken_at_key, job_id)
+                await self.client.rpush(self.queue_key, job_id)
+                requeued += 1
+        return requeued
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = await self.client.get(self.job_key(job_id))
+        return json.loads(job) if job else None
+
+    async def update(self, job_id: str, **fields) -> None:
+        job = await self.get(job_id) or {}
+        job.update(fields)
+        await self.client.set(self.job_key(job_id), json.dumps(job), ex=self.ttl)
+
+
+@lru_cache()
+def get_upload_queue() -> UploadJobQueue:
+    '''
+    The **get_upload_queue** function returns the upload job queue selected in the settings.
+
+    :return: An upload job queue
+    '''
+    if settings.upload_queue_backend == 'memory':
+        return InMemoryUploadJobQueue()
+    client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    return RedisUploadJobQueue(client, settings.upload_job_ttl)
+
+
+def spool_path(job_id: str) -> Path:
+    return Path(settings.upload_spool_dir) / job_id
+
+
+def new_job(user: User, filename: str, description: str, tags: str) -> dict:
+    '''
+    The **new_job** function describes a new upload job of the user.
+
+    :param user: User: The user the image is uploaded by
+    :param filename: str: The original name of the file
+    :param description: str: The description of the image
+    :param tags: str: The tags of the image
+    :return: The job
+    '''
+    now = datetime.utcnow().isoformat()
+    return {'id': uuid4().hex, 'status': QUEUED, 'progress': 0, 'user_id': user.id, 'filename': filename,
+            'description': description, 'tags': tags, 'image_id': None, 'image_url': None, 'detail': None,
+            'created_at': now, 'updated_at': now}
+
+
+def is_stale(job: dict) -> bool:
+    '''
+    The **is_stale** function checks if a job has not been updated for ``settings.upload_job_timeout`` seconds.
+
+    :param job: dict: The job
+    :return: True if the worker of the job is taken to have stopped
+    '''
+    updated_at = datetime.fromisoformat(job['updated_at'])
+    return (datetime.utcnow() - updated_at).total_seconds() >= settings.upload_job_timeout
+
+
+async def process_job(job_id: str, queue: UploadJobQueue, db: Session = None) -> None:
+    '''
+    The **process_job** function stores the spooled file of a job and creates its image.
+    The state of the job is updated after every step. The spooled file is kept until the job is done or failed,
+    so a job whose worker stopped can be processed again.
+
+    :param job_id: str: The id of the job
+    :param queue: UploadJobQueue: The queue the job belongs to
+    :param db: Session: A connection to our Postgres SQL database, a new one is opened if it is not given
+    :return: None
+    '''
+    job = await queue.get(job_id)
+    if job is None or job['status'] in (DONE, FAILED):
+        # expired, or handled by a worker that stopped before acknowledging it
+        return
+    if job['status'] == PROCESSING and not is_stale(job):
+        # requeued while another worker is still storing it
+        return
+    own_session = db is None
+    db = DBSession() if own_session else db
+    path = spool_path(job_id)
+
+    async def update(**fields):
+        await queue.update(job_id, updated_at=datetime.utcnow().isoformat(), **fields)
+
+    async def fail(message: str):
+        current = await queue.get(job_id)
+        if current is None or current['status'] != DONE:
+            await update(status=FAILED, detail=message)
+
+    try:
+        await update(status=PROCESSING, progress=10)
+        user = db.get(User, job['user_id'])
+        if user is None:
+            raise HTTPException(status_code=404, detail=detail.NOT_FOUND)
+        with open(path, 'rb') as fh:
+            upload = await run_in_threadpool(spool_upload, fh, job['filename'])
+        try:
+            stored = await store_upload(upload, db)
+        finally:
+            upload.close()
+        await update(progress=70)
+        image = await repository_pictures.create(job['description'], job['tags'] or '', stored.image_url,
+                                                 stored.public_id, user, db, content_hash=stored.content_hash,
+                                                 variants=stored.variants, perceptual_hash=stored.perceptual_hash,
+                                                 metadata=stored.metadata)
+        await update(status=DONE, progress=100, image_id=image.id, image_url=image.image_url)
+    except HTTPException as err:
+        await fail(err.detail)
+    except Exception:
+        logger.exception("upload job %s failed", job_id)
+        db.rollback()
+        await fail(detail.UPLOAD_FAILED)
+    finally:
+        if own_session:
+            db.close()
+    path.unlink(missing_ok=True)
+
+
+async def run_worker(queue: UploadJobQueue = None) -> None:
+    '''
+    The **run_worker** function processes upload jobs until it is cancelled.
+
+    :param queue: UploadJobQueue: The queue to take jobs from
+    :return: None
+    '''
+    queue = queue or get_upload_queue()
+    checked_at = 0
+    while True:
+        try:
+            if time.monotonic() - checked_at > settings.upload_job_timeout:
+                checked_at = time.monotonic()
+                if requeued := await queue.requeue_stale(settings.upload_job_timeout):
+                    logger.warning("requeued %s stale upload jobs", requeued)
+            job_id = await queue.dequeue()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("can not read the upload queue")
+            await asyncio.sleep(1)
+            continue
+        if job_id is None:
+            continue
+        try:
+            await process_job(job_id, queue)
+            await queue.ack(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # the job stays in the processing list and is requeued once it is stale
+            logger.exception("can not process the upload job %s", job_id)
+
+
+def start_workers() -> list:
+    '''
+    The **start_workers** function starts ``settings.upload_queue_workers`` workers in the running event loop.
+
+    :return: The worker tasks
+    '''
+    os.makedirs(settings.upload_spool_dir, exist_ok=True)
+    return [asyncio.create_task(run_worker()) for _ in range(settings.upload_queue_workers)]
+
+
+async def main():
+    os.makedirs(settings.upload_spool_dir, exist_ok=True)
+    await asyncio.gather(*[run_worker() for _ in range(max(settings.upload_queue_workers, 1))])
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
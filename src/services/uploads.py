@@ -0,0 +1,197 @@
+"""
+The upload pipeline shared by the picture endpoints.
+
+An upload is first spooled to a temporary file while its SHA-256 is computed, so identical
+files can be detected before anything is sent to the storage.
+"""
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, replace
+from tempfile import SpooledTemporaryFile
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from PIL import UnidentifiedImageError
+from sqlalchemy.orm import Session
+
+from src.config import detail
+from src.config.config import settings
+from src.repository import pictures as repository_pictures
+from src.services.cloud_image import CloudImage
+from src.services.image_metadata import read_metadata
+from src.services.image_processing import NormalizedImage, normalize_upload, run_in_process_pool
+from src.services.perceptual_hash import dhash
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    file: SpooledTemporaryFile
+    content_hash: str
+    size: int
+    filename: Optional[str] = None
+
+    def read(self) -> bytes:
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+@dataclass
+class StoredUpload:
+    public_id: str
+    image_url: str
+    content_hash: str
+    size: int
+    variants: Optional[dict] = None
+    deduplicated: bool = False
+    normalized: Optional[NormalizedImage] = None
+    perceptual_hash: Optional[int] = None
+    metadata: Optional[dict] = None
+
+
+def spool_upload(source, filename: str = None) -> SpooledUpload:
+    '''
+    The **spool_upload** function copies an uploaded file to a spooled temporary file in chunks
+    and computes the SHA-256 of its content on the way.
+
+    :param source: A readable file object or bytes
+    :param filename: str: The original name of the file
+    :return: The spooled upload
+    '''
+    spool = SpooledTemporaryFile(max_size=settings.upload_spool_max_memory)
+    digest = hashlib.sha256()
+    size = 0
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        spool.write(source)
+        size = len(source)
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        while chunk := source.read(CHUNK_SIZE):
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    spool.seek(0)
+    return SpooledUpload(file=spool, content_hash=digest.hexdigest(), size=size, filename=filename)
+
+
+async def create_variants(public_id: str) -> Optional[dict]:
+    '''
+    The **create_variants** function makes the resized copies of a stored image.
+    An image without variants is still usable, so a failure is only logged.
+
+    :param public_id: str: The name of the image in the storage
+    :return: A dict of variant name to url, or None if they could not be made
+    '''
+    try:
+        return await run_in_threadpool(CloudImage.create_variants, public_id) or None
+    except Exception:
+        logger.exception("can not create variants of %s", public_id)
+        return None
+
+
+async def perceptual_hash(data: bytes) -> Optional[int]:
+    '''
+    The **perceptual_hash** function computes the dHash of an upload in the image processing pool.
+
+    :param data: bytes: The uploaded file
+    :return: The hash, or None if the file is not an image Pillow can read
+    '''
+    try:
+        return await run_in_process_pool(dhash, data)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+async def store_upload(upload: SpooledUpload, db: Session) -> StoredUpload:
+    '''
+    The **store_upload** function puts a spooled upload into the storage.
+    If an image with the same content hash is already known, its asset is reused and nothing is uploaded.
+    The metadata is read from the header of the original file, before normalizing removes it.
+
+    :param upload: SpooledUpload: The spooled upload
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: Where the image is stored
+    '''
+    metadata = (await run_in_threadpool(read_metadata, upload.file, upload.size)).columns()
+    existing = await repository_pictures.get_image_by_hash(upload.content_hash, db)
+    if existing is not None:
+        logger.info("upload %s is a duplicate of %s", upload.filename, existing.public_id)
+        return StoredUpload(public_id=existing.public_id, image_url=existing.image_url,
+                            content_hash=upload.content_hash, size=upload.size, variants=existing.variants,
+                            deduplicated=True, perceptual_hash=int(existing.phash, 16) if existing.phash else None,
+                            metadata=metadata)
+
+    file = upload.file
+    data = upload.read()
+    phash = await perceptual_hash(data)
+    normalized = None
+    if settings.image_normalize:
+        try:
+            normalized = await normalize_upload(data)
+        except (UnidentifiedImageError, OSError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail.INVALID_IMAGE)
+        file = normalized.data
+        logger.info("normalized upload %s: %d -> %d bytes, %.1f ms cpu", upload.filename,
+                    normalized.original_bytes, normalized.bytes, normalized.cpu_ms)
+    else:
+        file.seek(0)
+
+    public_id = CloudImage.generate_name_image()
+    await run_in_threadpool(CloudImage.upload, file, public_id, overwrite=False)
+    image_url = CloudImage.get_url_for_image(public_id)
+    variants = await create_variants(public_id)
+    return StoredUpload(public_id=public_id, image_url=image_url, content_hash=upload.content_hash,
+                        size=upload.size, variants=variants, normalized=normalized, perceptual_hash=phash,
+                        metadata=metadata)
+
+
+async def store_uploads(uploads: List[SpooledUpload], db: Session) -> list:
+    '''
+    The **store_uploads** function stores several spooled uploads concurrently.
+    At most ``settings.upload_concurrency`` transfers run at the same time, and files with the same
+    content are only stored once.
+
+    :param uploads: List[SpooledUpload]: The spooled uploads
+    :param db: Session: A connection to our Postgres SQL database.
+    :return: A list with a StoredUpload or the raised exception for every upload, in the same order
+    '''
+    semaphore = asyncio.Semaphore(settings.upload_concurrency)
+
+    async def store(upload: SpooledUpload) -> StoredUpload:
+        async with semaphore:
+            try:
+                return await store_upload(upload, db)
+            except HTTPException:
+                raise
+            except Exception:
+                logger.exception("storing upload %s failed", upload.filename)
+                raise
+
+    tasks = {}
+    for upload in uploads:
+        if upload.content_hash not in tasks:
+            tasks[upload.content_hash] = asyncio.ensure_future(store(upload))
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    results = []
+    seen = set()
+    for upload in uploads:
+        task = tasks[upload.content_hash]
+        if task.exception() is not None:
+            results.append(task.exception())
+        elif upload.content_hash in seen:
+            results.append(replace(task.result(), deduplicated=True))
+        else:
+            results.append(task.result())
+        seen.add(upload.content_hash)
+    return results
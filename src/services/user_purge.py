@@ -0,0 +1,146 @@
+"""
+Background removal of deleted users and their content.
+
+Removing a user only marks the account as deleted and records a ``user_purge_jobs`` row. A background
+worker then deletes the images of the user with their comments, tag links and edited versions, then
+the comments the user wrote, and finally the user, ``settings.user_purge_chunk_size`` rows at a time.
+Every chunk is its own short transaction followed by a pause of ``settings.user_purge_batch_delay``
+seconds, so removing a heavy user never holds locks for long. The stored files of the images go to the
+storage garbage collector. The worker runs in the application or alone with
+``python -m src.services.user_purge``.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from src.config.config import settings
+from src.database.models import Comment, DerivedImage, Image, TagsImages, User, UserPurgeJob
+from src.services.storage_gc import enqueue_deletions, run_once
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+ACTIVE = (PENDING, RUNNING)
+
+
+def create_purge_job(db: Session, user_id: int) -> UserPurgeJob:
+    '''
+    The **create_purge_job** function records the removal of a user's content.
+    The totals are counted once, so the progress of the job can be reported.
+    The session is not committed, the caller commits it together with the soft delete of the user.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param user_id: int: The id of the deleted user
+    :return: The job
+    '''
+    image_ids = db.query(Image.id).filter(Image.user_id == user_id)
+    comments_total = db.query(Comment.id). \
+        filter((Comment.user_id == user_id) | Comment.image_id.in_(image_ids.scalar_subquery())).count()
+    job = UserPurgeJob(user_id=user_id, status=PENDING, images_total=image_ids.count(), images_deleted=0,
+                       comments_total=comments_total, comments_deleted=0, attempts=0)
+    db.add(job)
+    return job
+
+
+def purge_chunk(db: Session, job: UserPurgeJob, chunk_size: int) -> bool:
+    '''
+    The **purge_chunk** function deletes the next chunk of a user's content, without committing.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param job: UserPurgeJob: The job to advance
+    :param chunk_size: int: The maximum number of images or comments to delete
+    :return: True when the user is removed and the job is done
+    '''
+    images = db.query(Image.id, Image.public_id, Image.qr_code_url). \
+        filter(Image.user_id == job.user_id).order_by(Image.id).limit(chunk_size).all()
+    if images:
+        image_ids = [image.id for image in images]
+        enqueue_deletions(db, public_ids=[image.public_id for image in images],
+                          files=[image.qr_code_url for image in images])
+        comments = db.query(Comment).filter(Comment.image_id.in_(image_ids)).delete(synchronize_session=False)
+        db.query(TagsImages).filter(TagsImages.image_id.in_(image_ids)).delete(synchronize_session=False)
+        db.query(DerivedImage).filter(DerivedImage.image_id.in_(image_ids)).delete(synchronize_session=False)
+        db.query(Image).filter(Image.id.in_(image_ids)).delete(synchronize_session=False)
+        job.images_deleted += len(image_ids)
+        job.comments_deleted += comments
+        return False
+    comment_ids = [row.id for row in db.query(Comment.id).filter(Comment.user_id == job.user_id).
+                   order_by(Comment.id).limit(chunk_size)]
+    if comment_ids:
+        job.comments_deleted += db.query(Comment).filter(Comment.id.in_(comment_ids)). \
+            delete(synchronize_session=False)
+        return False
+    db.query(User).filter(User.id == job.user_id).delete(synchronize_session=False)
+    job.status = DONE
+    job.finished_at = datetime.utcnow()
+    return True
+
+
+def run_purge_step(db: Session, chunk_size: int = None) -> int:
+    '''
+    The **run_purge_step** function advances the oldest unfinished job by one chunk.
+    A failed chunk is rolled back and retried, the job fails after ``settings.user_purge_max_attempts`` errors.
+
+    :param db: Session: A connection to our Postgres SQL database.
+    :param chunk_size: int: The maximum number of images or comments to delete
+    :return: 1 if a job was advanced, 0 if there was nothing to do
+    '''
+    chunk_size = chunk_size or settings.user_purge_chunk_size
+    job = db.query(UserPurgeJob).filter(UserPurgeJob.status.in_(ACTIVE)). \
+        order_by(UserPurgeJob.id).with_for_update(skip_locked=True).first()
+    if job is None:
+        db.commit()
+        return 0
+    try:
+        job.status = RUNNING
+        if purge_chunk(db, job, chunk_size):
+            logger.info("removed user %s", job.user_id)
+        db.commit()
+    except Exception as err:
+        logger.exception("can not purge user %s", job.user_id)
+        db.rollback()
+        job.attempts += 1
+        job.last_error = str(err)[:255]
+        if job.attempts >= settings.user_purge_max_attempts:
+            job.status = FAILED
+        db.commit()
+    return 1
+
+
+async def run_purge_worker() -> None:
+    '''
+    The **run_purge_worker** function removes deleted users chunk by chunk until it is cancelled.
+
+    :return: None
+    '''
+    while True:
+        try:
+            handled = await run_in_threadpool(run_once, run_purge_step)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("user purge failed")
+            handled = 0
+        await asyncio.sleep(settings.user_purge_batch_delay if handled else settings.user_purge_interval)
+
+
+def start_purge_worker() -> list:
+    '''
+    The **start_purge_worker** function starts the purge worker in the running event loop
+    if ``settings.user_purge_enabled`` is set.
+
+    :return: The worker tasks
+    '''
+    if not settings.user_purge_enabled:
+        return []
+    return [asyncio.create_task(run_purge_worker())]
+
+
+if __name__ == '__main__':
+    asyncio.run(run_purge_worker())
@@ -1,14 +1,17 @@
 import sys
 import os
+import tempfile
 
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from main import app
-from src.database.models import Base
+from src.database.models import Base, User, Role
 from src.database.db import get_db
+from src.services.auth import auth_service
+from src.services.storage import LocalStorage
 
 sys.path.append(os.getcwd())
 
@@ -58,4 +61,59 @@ def user():
         "is_active": "True",
         "avatar": "http://someurl.jpeg",
         "roles": "Admin"
-    }
\ No newline at end of file
+    }
+
+
+@pytest.fixture()
+def auth_user(session):
+    """
+    Authenticates every request as a confirmed user without going through Redis.
+    Like the user cached by auth_service, the returned user is not bound to the session.
+
+    :param session: Access the database
+    :return: A user object
+    """
+    user = session.query(User).filter(User.email == "auth_user@example.com").first()
+    if user is None:
+        user = User(email="auth_user@example.com", username="auth_user", password="12345678", confirmed=True)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    current_user = User(id=user.id, email=user.email, username=user.username, roles=Role.user)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: current_user
+    yield current_user
+    app.dependency_overrides.pop(auth_service.get_current_user)
+
+
+@pytest.fixture()
+def local_storage(monkeypatch):
+    """
+    Replaces the storage backend with a local one in a temporary directory.
+
+    :return: The local storage
+    """
+    with tempfile.TemporaryDirectory() as root:
+        storage = LocalStorage(root, "/api/storage", "secret")
+        monkeypatch.setattr("src.services.cloud_image.get_storage", lambda: storage)
+        monkeypatch.setattr("src.routes.storage.get_storage", lambda: storage)
+        yield storage
+
+
+@pytest.fixture()
+def selects(session):
+    """
+    Records the SELECT statements sent to the database while the test runs.
+
+    :param session: Access the database
+    :return: The list of the statements
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    engine = session.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
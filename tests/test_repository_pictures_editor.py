@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+import pytest
+
+from src.database.models import User, Image, DerivedImage, Role
+from src.repository import pictures as repository_pictures
+from src.schemas.pictures import EditImageModel
+
+
+@pytest.fixture()
+def owner(session):
+    """
+    Creates the user the edited image belongs to.
+
+    :param session: Access the database
+    :return: A user object
+    """
+    user = session.query(User).filter(User.email == "editor@example.com").first()
+    if user is None:
+        user = User(email="editor@example.com", username="editor", password="12345678", roles=Role.user)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+    return user
+
+
+@pytest.fixture()
+def image(session, owner):
+    """
+    Creates the image that is edited.
+
+    :param session: Access the database
+    :param owner: The user the image belongs to
+    :return: An image object
+    """
+    image = Image(image_url="http://storage/original", public_id="photo_share/original", user_id=owner.id)
+    session.add(image)
+    session.commit()
+    session.refresh(image)
+    return image
+
+
+def edit_body(**overrides) -> EditImageModel:
+    body = {"circle": {"use_filter": True, "height": 300, "width": 300},
+            "effect": {"use_filter": True, "blur": True},
+            "resize": {},
+            "rotate": {}}
+    body.update(overrides)
+    return EditImageModel(**body)
+
+
+def test_transformation_hash_is_canonical():
+    first = [{"width": "300", "crop": "thumb"}, {"radius": "max"}]
+    second = [{"crop": "thumb", "width": "300"}, {"radius": "max"}]
+    assert repository_pictures.transformation_hash(first) == repository_pictures.transformation_hash(second)
+    assert repository_pictures.transformation_hash(first) != repository_pictures.transformation_hash(first[::-1])
+
+
+@pytest.mark.asyncio
+async def test_image_editor_memoizes_edits(session, owner, image):
+    with patch("src.repository.pictures.CloudImage.transform", return_value="http://storage/edited") as transform:
+        first = await repository_pictures.image_editor(image.id, edit_body(), owner, session)
+        second = await repository_pictures.image_editor(image.id, edit_body(), owner, session)
+    transform.assert_called_once()
+    assert first.id == second.id
+    assert first.image_url == "http://storage/edited"
+    assert session.get(Image, image.id).image_url == "http://storage/original"
+
+
+@pytest.mark.asyncio
+async def test_image_editor_keeps_versions(session, owner, image):
+    with patch("src.repository.pictures.CloudImage.transform", side_effect=["http://storage/v1", "http://storage/v2"]):
+        await repository_pictures.image_editor(image.id, edit_body(), owner, session)
+        await repository_pictures.image_editor(image.id, edit_body(effect={"use_filter": True, "cartoonify": True}),
+                                               owner, session)
+    versions = await repository_pictures.get_derived_images(image.id, owner, session)
+    assert {version.image_url for version in versions} == {"http://storage/v1", "http://storage/v2"}
+    assert session.query(DerivedImage).filter(DerivedImage.image_id == image.id).count() == 2
+
+
+@pytest.mark.asyncio
+async def test_image_editor_without_filters(session, owner, image):
+    assert await repository_pictures.image_editor(image.id, edit_body(circle={}, effect={}), owner, session) is None
@@ -0,0 +1,53 @@
+from src.database.models import Comment, Image, User
+
+
+def add_commented_image(session, owner_id, name, authors):
+    image = Image(image_url=f"http://storage/{name}", public_id=f"photo_share/{name}", user_id=owner_id)
+    session.add(image)
+    session.flush()
+    for number in range(authors):
+        author = User(email=f"{name}_{number}@example.com", username=f"{name}_{number}", password="12345678",
+                      avatar=f"http://avatars/{name}_{number}")
+        session.add(author)
+        session.flush()
+        session.add(Comment(comment=f"comment {number}", user_id=author.id, image_id=image.id))
+    session.commit()
+    return image.id
+
+
+def test_image_comments_embed_authors(client, session, auth_user):
+    image_id = add_commented_image(session, auth_user.id, "authors", 3)
+
+    response = client.get(f"/api/comments/image/{image_id}")
+
+    assert response.status_code == 200, response.text
+    assert [(comment["comment"], comment["author"]["username"], comment["author"]["avatar"])
+            for comment in response.json()] == [("comment 0", "authors_0", "http://avatars/authors_0"),
+                                                ("comment 1", "authors_1", "http://avatars/authors_1"),
+                                                ("comment 2", "authors_2", "http://avatars/authors_2")]
+    assert all(comment["author"]["id"] == comment["user_id"] for comment in response.json())
+
+
+def test_image_comments_query_count_does_not_grow_with_authors(client, session, auth_user, selects):
+    few = add_commented_image(session, auth_user.id, "few", 2)
+    many = add_commented_image(session, auth_user.id, "many", 20)
+
+    counts = []
+    for image_id, expected in ((few, 2), (many, 20)):
+        session.expire_all()
+        selects.clear()
+        response = client.get(f"/api/comments/image/{image_id}")
+        assert response.status_code == 200, response.text
+        assert len(response.json()) == expected
+        counts.append(len(selects))
+
+    assert counts[0] == counts[1] == 2
+
+
+def test_image_comments_are_paginated(client, session, auth_user):
+    image_id = add_commented_image(session, auth_user.id, "pages", 5)
+
+    response = client.get(f"/api/comments/image/{image_id}", params={"limit": 2, "offset": 2})
+
+    assert response.status_code == 200, response.text
+    assert [comment["author"]["username"] for comment in response.json()] == ["pages_2", "pages_3"]
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from src.database.models import Comment, Image, Role, User
+from src.repository import comments as repository_comments
+
+
+@pytest.fixture()
+def moderator(auth_user):
+    auth_user.roles = Role.moderator
+    return auth_user
+
+
+@pytest.fixture()
+def spam(session, auth_user):
+    """
+    Creates a spammer and an image with comments of the spammer and of another user.
+
+    :return: The ids of the spammer, the image and the spam comments
+    """
+    session.query(Comment).delete()
+    spammer = session.query(User).filter(User.email == "spammer@example.com").first()
+    if spammer is None:
+        spammer = User(email="spammer@example.com", username="spammer", password="12345678")
+        session.add(spammer)
+    image = Image(image_url="http://storage/spam", public_id="photo_share/spam", user_id=auth_user.id)
+    session.add(image)
+    session.commit()
+    comments = [Comment(comment=f"spam {index}", user_id=spammer.id, image_id=image.id,
+                        created_at=datetime(2025, 1, 1 + index)) for index in range(5)]
+    comments.append(Comment(comment="fine", user_id=auth_user.id, image_id=image.id, created_at=datetime(2025, 1, 2)))
+    session.add_all(comments)
+    session.commit()
+    return spammer.id, image.id, [comment.id for comment in comments[:5]]
+
+
+def test_delete_by_ids(client, session, moderator, spam):
+    _, image_id, ids = spam
+    response = client.post("/api/comments/bulk_delete", json={"comment_ids": ids[:2] + [999999]})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"deleted": 2, "images": {str(image_id): 2}}
+    assert session.query(Comment).count() == 4
+
+
+def test_delete_by_author_in_chunks(client, session, moderator, spam, monkeypatch):
+    spammer_id, _, _ = spam
+    monkeypatch.setattr(repository_comments.settings, "comment_delete_chunk_size", 2)
+    response = client.delete(f"/api/comments/author/{spammer_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == 5
+    assert [comment.comment for comment in session.query(Comment)] == ["fine"]
+
+
+def test_delete_by_image_in_time_range(client, session, moderator, spam):
+    _, image_id, _ = spam
+    response = client.delete(f"/api/comments/image/{image_id}",
+                             params={"created_after": "2025-01-02T00:00:00", "created_before": "2025-01-03T00:00:00"})
+    assert response.status_code == 200, response.text
+    assert response.json()["deleted"] == 3
+    assert session.query(Comment).count() == 3
+
+
+def test_bulk_delete_needs_moderator(client, auth_user, spam):
+    auth_user.roles = Role.user
+    response = client.post("/api/comments/bulk_delete", json={"comment_ids": spam[2]})
+    assert response.status_code == 403
@@ -0,0 +1,66 @@
+import pytest
+
+from src.database.models import Comment, Image, Role
+from src.services.comment_events import COMMENT_ADDED, COMMENT_DELETED, COMMENT_EDITED
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.events = []
+
+    async def publish(self, image_id, event, data):
+        self.events.append((image_id, event, data))
+
+
+@pytest.fixture()
+def broker(monkeypatch):
+    broker = RecordingBroker()
+    monkeypatch.setattr("src.routes.comments.get_comment_broker", lambda: broker)
+    return broker
+
+
+def test_comment_changes_are_published(client, session, auth_user, broker):
+    image = Image(image_url="http://storage/events", public_id="photo_share/events", user_id=auth_user.id)
+    session.add(image)
+    session.commit()
+    image_id = image.id
+
+    response = client.post(f"/api/comments/{image_id}", json={"comment": "first"})
+    assert response.status_code == 200, response.text
+    comment_id = response.json()["id"]
+    response = client.put(f"/api/comments/{comment_id}", json={"comment": "edited"})
+    assert response.status_code == 200, response.text
+
+    assert [(event_image_id, event) for event_image_id, event, _ in broker.events] == \
+        [(image_id, COMMENT_ADDED), (image_id, COMMENT_EDITED)]
+    assert broker.events[1][2].comment == "edited"
+
+    response = client.get(f"/api/comments/image/{image_id}")
+    assert response.status_code == 200, response.text
+    assert [comment["comment"] for comment in response.json()] == ["edited"]
+
+
+def test_only_real_changes_are_published(client, session, auth_user, broker):
+    image = Image(image_url="http://storage/events2", public_id="photo_share/events2", user_id=auth_user.id)
+    session.add(image)
+    session.commit()
+    image_id = image.id
+    comment_id = client.post(f"/api/comments/{image_id}", json={"comment": "mine"}).json()["id"]
+    session.query(Comment).filter(Comment.id == comment_id).update({Comment.user_id: auth_user.id + 1})
+    session.commit()
+    broker.events.clear()
+
+    response = client.put(f"/api/comments/{comment_id}", json={"comment": "not mine"})
+    assert response.status_code == 200, response.text
+    assert response.json()["comment"] == "mine"
+    assert broker.events == []
+
+    auth_user.roles = Role.admin
+    try:
+        response = client.delete(f"/api/comments/{comment_id}")
+    finally:
+        auth_user.roles = Role.user
+    assert response.status_code == 200, response.text
+    assert response.json()["comment"] == "mine"
+    assert [(event_image_id, event) for event_image_id, event, _ in broker.events] == [(image_id, COMMENT_DELETED)]
+    assert session.get(Comment, comment_id) is None
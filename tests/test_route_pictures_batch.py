@@ -0,0 +1,64 @@
+import pytest
+
+from src.database.models import Image, StorageDeletion, Tag
+from src.repository import pictures as repository_pictures
+
+
+def test_batch_upload(client, session, auth_user, local_storage):
+    """
+    Uploads three files, two of them identical, and checks that all images are created
+    while the duplicate is stored only once.
+    """
+    files = [("image_files", ("a.png", b"first image", "image/png")),
+             ("image_files", ("b.png", b"second image", "image/png")),
+             ("image_files", ("c.png", b"first image", "image/png"))]
+    data = {"descriptions": ["first", "second", "third"], "tags": ["#sea #sun", "#sea", ""]}
+    response = client.post("/api/pictures/batch", files=files, data=data)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["created"] == 3
+    assert body["failed"] == 0
+    assert [item["image"]["description"] for item in body["items"]] == ["first", "second", "third"]
+    assert body["items"][2]["deduplicated"] is True
+    assert body["items"][0]["image"]["image_url"] == body["items"][2]["image"]["image_url"]
+    assert len(list(local_storage.root.rglob("*"))) == 3  # photo_share directory and two files
+    assert session.query(Image).filter(Image.user_id == auth_user.id).count() == 3
+    assert {tag.tag for tag in session.query(Tag).all()} >= {"#sea", "#sun"}
+
+
+def test_batch_upload_reports_failed_items(client, auth_user, local_storage, monkeypatch):
+    """
+    Makes the storage fail for one file and checks that the other file is still created.
+    """
+    put = local_storage.put
+
+    def failing_put(file, public_id, overwrite=True):
+        if file.read(4) == b"fail":
+            raise ConnectionError("storage is down")
+        return put(file, public_id, overwrite)
+
+    monkeypatch.setattr(local_storage, "put", failing_put)
+    files = [("image_files", ("ok.png", b"good image", "image/png")),
+             ("image_files", ("bad.png", b"fail image", "image/png"))]
+    response = client.post("/api/pictures/batch", files=files)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["created"] == 1
+    assert body["failed"] == 1
+    assert body["items"][1]["status"] == "failed"
+    assert body["items"][1]["image"] is None
+
+
+def test_batch_upload_queues_orphaned_files(client, session, auth_user, local_storage, monkeypatch):
+    """
+    Makes the creation of the images fail and checks that the stored files are queued for removal.
+    """
+    async def failing_create_many(values, user, db):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(repository_pictures, "create_many", failing_create_many)
+    queued = session.query(StorageDeletion).count()
+    files = [("image_files", ("orphan.png", b"orphaned image", "image/png"))]
+    with pytest.raises(ConnectionError):
+        client.post("/api/pictures/batch", files=files)
+    assert session.query(StorageDeletion).count() == queued + 1
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+
+from src.database.models import Image, User
+
+
+@pytest.fixture()
+def image_id(session, auth_user):
+    image = Image(image_url="http://storage/etag", public_id="photo_share/etag", user_id=auth_user.id,
+                  updated_at=datetime(2025, 1, 1))
+    session.add(image)
+    session.commit()
+    return image.id
+
+
+def test_image_is_not_sent_again(client, session, image_id, selects):
+    response = client.get(f"/api/pictures/{image_id}")
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    selects.clear()
+    response = client.get(f"/api/pictures/{image_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    # only the version was read
+    assert len(selects) == 1 and "images.description" not in selects[0]
+
+    session.get(Image, image_id).updated_at = datetime(2025, 1, 2)
+    session.commit()
+    response = client.get(f"/api/pictures/{image_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_unknown_image_with_etag_is_not_found(client, auth_user):
+    response = client.get("/api/pictures/999999", headers={"If-None-Match": 'W/"abc"'})
+    assert response.status_code == 404
+
+
+def test_image_page_etag_follows_its_images(client, session, auth_user, image_id):
+    response = client.get("/api/pictures/")
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+
+    assert client.get("/api/pictures/", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/pictures/", params={"limit": 1, "offset": 1},
+                      headers={"If-None-Match": etag}).status_code == 200
+
+    session.add(Image(image_url="http://storage/etag2", public_id="photo_share/etag2", user_id=auth_user.id))
+    session.commit()
+    response = client.get("/api/pictures/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_me_is_not_sent_again(client, session, auth_user):
+    user = session.get(User, auth_user.id)
+    user.avatar = "http://avatars/etag"
+    session.commit()
+
+    response = client.get("/api/user/me")
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+    assert client.get("/api/user/me", headers={"If-None-Match": etag}).status_code == 304
+
+    user = session.get(User, auth_user.id)
+    user.username = "renamed"
+    user.updated_at = datetime(2030, 1, 1)
+    session.commit()
+    response = client.get("/api/user/me", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["username"] == "renamed"
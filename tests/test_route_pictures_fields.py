@@ -0,0 +1,60 @@
+import pytest
+
+from src.database.models import Image, Role, User
+
+
+@pytest.fixture()
+def image_id(session, auth_user):
+    image = Image(image_url="http://storage/fields", public_id="photo_share/fields", description="grid",
+                  user_id=auth_user.id, width=640, height=480)
+    session.add(image)
+    session.commit()
+    return image.id
+
+
+def test_image_list_with_fields(client, image_id, selects):
+    response = client.get("/api/pictures/", params={"fields": "image_url,id"})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == [{"id": image_id, "image_url": "http://storage/fields"}]
+    assert len(selects) == 1
+    assert "images.image_url" in selects[0]
+    assert "images.description" not in selects[0] and "images.camera" not in selects[0]
+
+
+def test_image_with_fields(client, image_id, selects):
+    response = client.get(f"/api/pictures/{image_id}", params={"fields": "width,height"})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"width": 640, "height": 480}
+    assert "images.description" not in selects[0]
+
+    etag = response.headers["ETag"]
+    assert client.get(f"/api/pictures/{image_id}", params={"fields": "width,height"},
+                      headers={"If-None-Match": etag}).status_code == 304
+    # another representation of the same version
+    assert client.get(f"/api/pictures/{image_id}", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_unknown_fields_are_rejected(client, auth_user):
+    response = client.get("/api/pictures/", params={"fields": "id,public_id"})
+    assert response.status_code == 400
+    assert "public_id" in response.json()["detail"]
+    assert client.get("/api/pictures/", params={"fields": ","}).status_code == 400
+
+
+def test_users_with_fields(client, session, auth_user):
+    user = session.get(User, auth_user.id)
+    user.avatar = "http://avatars/fields"
+    session.commit()
+    user_id, username, email = user.id, user.username, user.email
+
+    response = client.get("/api/user/me", params={"fields": "username"})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"username": username}
+
+    auth_user.roles = Role.admin
+    response = client.get("/api/user/all/", params={"fields": "id,email", "limit": 100})
+    assert response.status_code == 200, response.text
+    assert {"id": user_id, "email": email} in response.json()
+    assert all(set(row) == {"id", "email"} for row in response.json())
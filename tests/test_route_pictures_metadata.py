@@ -0,0 +1,35 @@
+from tests.test_unit_services_image_metadata import make_jpeg
+
+
+def upload(client, data, description):
+    response = client.post("/api/pictures/", params={"description": description, "tags": "#meta"},
+                           files={"image_file": (f"{description}.jpg", data, "image/jpeg")})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_filter_images_by_metadata(client, auth_user, local_storage):
+    """
+    Uploads photos with different metadata and filters them like "landscape photos from 2025".
+    """
+    landscape = upload(client, make_jpeg(size=(800, 600), taken_at="2025:03:10 08:00:00",
+                                         make="Canon", model="EOS R5"), "landscape_2025")
+    assert landscape["width"] == 800
+    assert landscape["orientation"] == "landscape"
+    assert landscape["taken_at"] == "2025-03-10T08:00:00"
+    assert landscape["camera"] == "Canon EOS R5"
+    upload(client, make_jpeg(size=(600, 800), taken_at="2025:07:01 12:00:00"), "portrait_2025")
+    upload(client, make_jpeg(size=(810, 600), taken_at="2024:12:31 23:59:59"), "landscape_2024")
+
+    response = client.get("/api/pictures/", params={"orientation": "landscape", "taken_year": 2025})
+    assert response.status_code == 200, response.text
+    assert [image["description"] for image in response.json()] == ["landscape_2025"]
+
+    response = client.get("/api/pictures/", params={"taken_after": "2025-01-01T00:00:00", "format": "jpeg"})
+    assert {image["description"] for image in response.json()} == {"landscape_2025", "portrait_2025"}
+
+    response = client.get("/api/pictures/", params={"camera": "Canon EOS R5", "min_width": 800})
+    assert [image["description"] for image in response.json()] == ["landscape_2025"]
+
+    response = client.get("/api/pictures/", params={"orientation": "diagonal"})
+    assert response.status_code == 422
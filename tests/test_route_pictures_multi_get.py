@@ -0,0 +1,54 @@
+import pytest
+
+from src.database.models import Image, User
+
+
+@pytest.fixture()
+def images(session, auth_user):
+    """
+    Creates three images of the authenticated user and one of another user.
+
+    :return: The ids of the own images and the id of the other image
+    """
+    other = session.query(User).filter(User.email == "multi_get@example.com").first()
+    if other is None:
+        other = User(email="multi_get@example.com", username="multi_get", password="12345678")
+        session.add(other)
+        session.flush()
+    own = [Image(image_url=f"http://storage/multi_{number}", public_id=f"photo_share/multi_{number}",
+                 user_id=auth_user.id) for number in range(3)]
+    foreign = Image(image_url="http://storage/foreign", public_id="photo_share/foreign", user_id=other.id)
+    session.add_all(own + [foreign])
+    session.commit()
+    return [image.id for image in own], foreign.id
+
+
+def test_images_in_the_order_of_the_ids(client, images, selects):
+    (first, second, third), foreign = images
+
+    response = client.get("/api/pictures/batch", params={"ids": f"{third},{first},999999,{foreign},{third}"})
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [third, first]
+    assert body["items"][0]["image_url"] == "http://storage/multi_2"
+    assert body["missing"] == [999999, foreign]
+    assert len(selects) == 1
+
+
+def test_images_with_fields(client, images):
+    (first, second, _), _ = images
+
+    response = client.get("/api/pictures/batch", params={"ids": f"{second}, {first}", "fields": "id"})
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"items": [{"id": second}, {"id": first}], "missing": []}
+
+
+def test_invalid_ids(client, auth_user, monkeypatch):
+    assert client.get("/api/pictures/batch", params={"ids": "1,a"}).status_code == 422
+    assert client.get("/api/pictures/batch").status_code == 422
+    monkeypatch.setattr("src.routes.pictures.settings.pictures_batch_max_ids", 2)
+    response = client.get("/api/pictures/batch", params={"ids": "1,2,3"})
+    assert response.status_code == 400
+    assert client.get("/api/pictures/batch", params={"ids": "1,2,2,1"}).status_code == 200
@@ -0,0 +1,82 @@
+import io
+import zipfile
+
+import pytest
+
+from src.database.models import Image
+from src.services.qr_codes import QRCodeService
+
+
+@pytest.fixture()
+def qr_service(monkeypatch, tmp_path):
+    service = QRCodeService(str(tmp_path), 10 ** 6, 10)
+    monkeypatch.setattr("src.routes.pictures.get_qr_service", lambda: service)
+    monkeypatch.setattr("src.repository.pictures.get_qr_service", lambda: service)
+    return service
+
+
+@pytest.fixture()
+def image(session, auth_user):
+    image = Image(image_url="http://storage/qr_image", public_id="photo_share/qr_image", user_id=auth_user.id)
+    session.add(image)
+    session.commit()
+    session.refresh(image)
+    return image
+
+
+def test_qr_code_endpoint(client, auth_user, image, qr_service):
+    response = client.post("/api/pictures/qr_code", params={"image_id": image.id})
+    assert response.status_code == 201, response.text
+    url = response.json()["qr_code_url"]
+    assert url == f"/api/pictures/{image.id}/qr_code"
+
+    response = client.get(url)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == "private, max-age=60, must-revalidate"
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(url, params={"format": "svg"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert response.headers["etag"] != etag
+
+    assert client.get(url, params={"format": "gif"}).status_code == 422
+    assert client.get("/api/pictures/999999/qr_code").status_code == 404
+
+
+def test_bulk_qr_codes(client, session, auth_user, qr_service):
+    images = [Image(image_url=f"http://storage/bulk_{index}", public_id=f"photo_share/bulk_{index}",
+                    user_id=auth_user.id) for index in range(3)]
+    session.add_all(images)
+    session.commit()
+    ids = [image.id for image in images]
+
+    response = client.post("/api/pictures/qr_codes", json={"image_ids": ids[:2] + [999999]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [item["image_id"] for item in body["items"]] == ids[:2]
+    assert body["missing"] == [999999]
+    session.expire_all()
+    assert [image.qr_code_url for image in session.query(Image).filter(Image.id.in_(ids)).order_by(Image.id)] == \
+        [f"/api/pictures/{ids[0]}/qr_code", f"/api/pictures/{ids[1]}/qr_code", None]
+
+    etag = client.get(f"/api/pictures/{ids[0]}/qr_code").headers["etag"]
+    assert body["items"][0]["etag"] == etag
+
+
+def test_bulk_qr_codes_zip(client, session, auth_user, qr_service):
+    count = session.query(Image).filter(Image.user_id == auth_user.id).count()
+    response = client.post("/api/pictures/qr_codes", params={"archive": True, "format": "svg"}, json={})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        assert len(names) == count
+        assert all(name.endswith(".svg") for name in names)
+        assert b"<svg" in archive.read(names[0])
+    assert session.query(Image).filter(Image.user_id == auth_user.id, Image.qr_code_url.is_(None)).count() == 0
@@ -0,0 +1,47 @@
+def test_signed_upload_flow(client, auth_user, local_storage):
+    """
+    Requests upload parameters, uploads the file directly to the local storage stand-in
+    and registers the image with the upload token.
+    """
+    response = client.post("/api/pictures/signed_upload")
+    assert response.status_code == 201, response.text
+    signed = response.json()
+    assert signed["upload_url"] == "/api/storage/upload"
+
+    response = client.post(signed["upload_url"], data=signed["fields"],
+                           files={"file": ("a.png", b"direct upload", "image/png")})
+    assert response.status_code == 201, response.text
+    assert local_storage.exists(signed["public_id"])
+
+    response = client.post("/api/pictures/signed_upload/finalize",
+                           json={"upload_token": signed["upload_token"], "description": "direct", "tags": "#x"})
+    assert response.status_code == 201, response.text
+    data = response.json()
+    assert data["image_url"] == f"/api/storage/{signed['public_id']}"
+    assert data["description"] == "direct"
+
+    response = client.post("/api/pictures/signed_upload/finalize",
+                           json={"upload_token": signed["upload_token"], "description": "again"})
+    assert response.status_code == 409, response.text
+
+
+def test_signed_upload_rejects_forged_signature(client, auth_user, local_storage):
+    signed = client.post("/api/pictures/signed_upload").json()
+    fields = {**signed["fields"], "signature": "0" * 64}
+    response = client.post(signed["upload_url"], data=fields,
+                           files={"file": ("a.png", b"direct upload", "image/png")})
+    assert response.status_code == 403, response.text
+    assert not local_storage.exists(signed["public_id"])
+
+
+def test_finalize_without_upload(client, auth_user, local_storage):
+    signed = client.post("/api/pictures/signed_upload").json()
+    response = client.post("/api/pictures/signed_upload/finalize",
+                           json={"upload_token": signed["upload_token"], "description": "missing"})
+    assert response.status_code == 404, response.text
+
+
+def test_finalize_with_invalid_token(client, auth_user, local_storage):
+    response = client.post("/api/pictures/signed_upload/finalize",
+                           json={"upload_token": "not a token", "description": "missing"})
+    assert response.status_code == 401, response.text
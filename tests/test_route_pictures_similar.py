@@ -0,0 +1,41 @@
+from tests.test_unit_services_perceptual_hash import make_photo
+
+
+def test_near_duplicate_upload(client, auth_user, local_storage):
+    """
+    Uploads a photo and a smaller re-compressed copy of it, and checks that the copy is linked
+    to the original while another photo is not.
+    """
+    response = client.post("/api/pictures/", params={"description": "original", "tags": "#photo"},
+                           files={"image_file": ("a.png", make_photo(11), "image/png")})
+    assert response.status_code == 201, response.text
+    original_id = response.json()["id"]
+    assert "X-Upload-Near-Duplicates" not in response.headers
+
+    copy = make_photo(11, size=(320, 240), image_format="JPEG", quality=60)
+    response = client.post("/api/pictures/", params={"description": "copy", "tags": "#photo"},
+                           files={"image_file": ("b.jpg", copy, "image/jpeg")})
+    assert response.status_code == 201, response.text
+    copy_id = response.json()["id"]
+    assert str(original_id) in response.headers["X-Upload-Near-Duplicates"].split(",")
+
+    response = client.post("/api/pictures/", params={"description": "other", "tags": "#photo"},
+                           files={"image_file": ("c.png", make_photo(12), "image/png")})
+    other_id = response.json()["id"]
+
+    response = client.get(f"/api/pictures/{copy_id}/similar")
+    assert response.status_code == 200, response.text
+    ids = [item["image"]["id"] for item in response.json()]
+    assert original_id in ids
+    assert other_id not in ids
+    assert copy_id not in ids
+
+
+def test_similar_of_missing_image(client, auth_user):
+    response = client.get("/api/pictures/999999/similar")
+    assert response.status_code == 404
+
+
+def test_similar_distance_is_limited(client, auth_user):
+    response = client.get("/api/pictures/999999/similar", params={"max_distance": 16})
+    assert response.status_code == 422
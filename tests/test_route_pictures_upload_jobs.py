@@ -0,0 +1,144 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.database.models import Image
+from src.services.upload_jobs import InMemoryUploadJobQueue, RedisUploadJobQueue, process_job, run_worker, \
+    DONE, FAILED, PROCESSING, QUEUED
+
+
+@pytest.fixture()
+def upload_queue(monkeypatch, tmp_path):
+    """
+    Replaces the upload job queue with an in-memory one and spools files to a temporary directory.
+
+    :return: The queue
+    """
+    queue = InMemoryUploadJobQueue()
+    monkeypatch.setattr("src.routes.pictures.get_upload_queue", lambda: queue)
+    monkeypatch.setattr("src.services.upload_jobs.settings.upload_spool_dir", str(tmp_path))
+    return queue
+
+
+def test_async_upload(client, session, auth_user, local_storage, upload_queue, tmp_path):
+    response = client.post("/api/pictures/async", params={"description": "queued", "tags": "#q"},
+                           files={"image_file": ("q.png", b"queued image", "image/png")})
+    assert response.status_code == 202, response.text
+    data = response.json()
+    assert data["status"] == QUEUED
+    assert (tmp_path / data["job_id"]).exists()
+
+    status = client.get(data["status_url"]).json()
+    assert status["progress"] == 0
+
+    asyncio.run(process_job(data["job_id"], upload_queue, session))
+
+    status = client.get(data["status_url"]).json()
+    assert status["status"] == DONE
+    assert status["progress"] == 100
+    image = session.get(Image, status["image_id"])
+    assert image.description == "queued"
+    assert local_storage.exists(image.public_id)
+    assert not (tmp_path / data["job_id"]).exists()
+
+
+def test_upload_job_of_other_user(client, auth_user, upload_queue):
+    job = {"id": "other", "status": QUEUED, "progress": 0, "user_id": auth_user.id + 1}
+    asyncio.run(upload_queue.enqueue(job))
+    response = client.get("/api/pictures/jobs/other")
+    assert response.status_code == 404, response.text
+
+
+def test_spooled_file_is_removed_if_enqueue_fails(client, auth_user, upload_queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_queue, "enqueue", AsyncMock(side_effect=ConnectionError))
+    with pytest.raises(ConnectionError):
+        client.post("/api/pictures/async", params={"description": "lost"},
+                    files={"image_file": ("q.png", b"queued image", "image/png")})
+    assert list(tmp_path.iterdir()) == []
+
+
+def processing_job(user_id: int, age: int) -> dict:
+    updated_at = (datetime.utcnow() - timedelta(seconds=age)).isoformat()
+    return {"id": "running", "status": PROCESSING, "progress": 10, "user_id": user_id, "filename": "r.png",
+            "description": None, "tags": None, "updated_at": updated_at}
+
+
+def test_job_processed_by_another_worker_is_skipped(session, auth_user, upload_queue, tmp_path):
+    asyncio.run(upload_queue.enqueue(processing_job(auth_user.id, age=1)))
+    (tmp_path / "running").write_bytes(b"running image")
+    asyncio.run(process_job("running", upload_queue, session))
+    assert asyncio.run(upload_queue.get("running"))["status"] == PROCESSING
+    assert (tmp_path / "running").exists()
+
+
+def test_done_job_is_not_failed(session, auth_user, upload_queue, monkeypatch):
+    asyncio.run(upload_queue.enqueue(processing_job(auth_user.id, age=3600)))
+    update = upload_queue.update
+
+    async def finished_elsewhere(job_id, **fields):
+        await update(job_id, **fields)
+        if fields.get("status") == PROCESSING:
+            # the first worker finishes and removes the spooled file
+            await update(job_id, status=DONE)
+
+    monkeypatch.setattr(upload_queue, "update", finished_elsewhere)
+    asyncio.run(process_job("running", upload_queue, session))
+    assert asyncio.run(upload_queue.get("running"))["status"] == DONE
+
+
+def test_spooled_file_is_kept_until_the_job_fails(session, auth_user, upload_queue, tmp_path, monkeypatch):
+    job = processing_job(auth_user.id, age=3600)
+    job["user_id"] = auth_user.id + 1
+    asyncio.run(upload_queue.enqueue(job))
+    (tmp_path / "running").write_bytes(b"running image")
+    update = upload_queue.update
+
+    async def failing_update(job_id, **fields):
+        if fields.get("status") == FAILED:
+            raise ConnectionError
+        await update(job_id, **fields)
+
+    monkeypatch.setattr(upload_queue, "update", failing_update)
+    with pytest.raises(ConnectionError):
+        asyncio.run(process_job("running", upload_queue, session))
+    assert (tmp_path / "running").exists()
+
+    monkeypatch.setattr(upload_queue, "update", update)
+    asyncio.run(update("running", updated_at=job["updated_at"]))
+    asyncio.run(process_job("running", upload_queue, session))
+    assert asyncio.run(upload_queue.get("running"))["status"] == FAILED
+    assert not (tmp_path / "running").exists()
+
+
+def test_worker_survives_a_failing_job(monkeypatch):
+    queue = InMemoryUploadJobQueue()
+    monkeypatch.setattr(queue, "dequeue", AsyncMock(side_effect=["broken", asyncio.CancelledError]))
+    monkeypatch.setattr("src.services.upload_jobs.process_job", AsyncMock(side_effect=ConnectionError))
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run_worker(queue))
+
+
+def test_redis_queue_requeues_stale_jobs():
+    client = AsyncMock()
+    client.lrange.return_value = [b"fresh", b"stale", b"untimed"]
+    client.hget.side_effect = lambda key, job_id: {b"fresh": str(int(time.time())),
+                                                   b"stale": str(int(time.time()) - 1000)}.get(job_id)
+    client.lrem.return_value = 1
+    queue = RedisUploadJobQueue(client, ttl=60)
+    assert asyncio.run(queue.requeue_stale(600)) == 1
+    client.rpush.assert_awaited_once_with(queue.queue_key, b"stale")
+    client.hsetnx.assert_awaited_once()
+    assert client.hsetnx.call_args.args[1] == b"untimed"
+
+
+def test_redis_queue_keeps_taken_jobs_until_ack():
+    client = AsyncMock()
+    client.brpoplpush.return_value = b"job"
+    queue = RedisUploadJobQueue(client, ttl=60)
+    assert asyncio.run(queue.dequeue()) == "job"
+    client.brpoplpush.assert_awaited_once_with(queue.queue_key, queue.processing_key, timeout=1)
+    asyncio.run(queue.ack("job"))
+    client.lrem.assert_awaited_once_with(queue.processing_key, 1, "job")
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from src.database.models import Tag, User
+from src.repository import pictures as repository_pictures
+from src.services.loaders import get_loader
+
+
+@pytest.fixture()
+def users(session):
+    """
+    Creates three users to load.
+
+    :param session: Access the database
+    :return: The ids of the users
+    """
+    stamp = time.time_ns()
+    users = [User(email=f"loader_{stamp}_{number}@example.com", username=f"loader_{number}", password="12345678")
+             for number in range(3)]
+    session.add_all(users)
+    session.commit()
+    return [user.id for user in users]
+
+
+@pytest.mark.asyncio
+async def test_loads_in_the_same_tick_share_one_query(session, users, selects):
+    loaded = await asyncio.gather(*[get_loader(session, User.id).load(user_id) for user_id in users + [0]])
+
+    assert [user.id if user else None for user in loaded] == users + [None]
+    assert len(selects) == 1
+
+
+@pytest.mark.asyncio
+async def test_loaded_rows_are_remembered_until_the_transaction_ends(session, users, selects):
+    first = await get_loader(session, User.id).load_many(users)
+    again = await get_loader(session, User.id).load(users[0])
+
+    assert again is first[0]
+    assert len(selects) == 1
+
+    session.commit()
+    await get_loader(session, User.id).load(users[0])
+    assert len(selects) == 2
+
+
+@pytest.mark.asyncio
+async def test_loaders_are_per_session(session, users):
+    other = type(session)(bind=session.get_bind())
+    try:
+        assert get_loader(session, User.id) is get_loader(session, User.id)
+        assert get_loader(other, User.id) is not get_loader(session, User.id)
+        assert (await get_loader(other, User.id).load(users[0])) is not \
+            (await get_loader(session, User.id).load(users[0]))
+    finally:
+        other.close()
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_tags_loads_existing_tags_once(session, selects):
+    stamp = time.time_ns()
+    session.add(Tag(tag=f"old_{stamp}"))
+    session.commit()
+    selects.clear()
+
+    tags = await repository_pictures.get_or_create_tags([f"old_{stamp}", f"new_{stamp}", f"old_{stamp}"], session)
+    again = await repository_pictures.get_or_create_tags([f"new_{stamp}"], session)
+    session.commit()
+
+    assert set(tags) == {f"old_{stamp}", f"new_{stamp}"}
+    assert again[f"new_{stamp}"] is tags[f"new_{stamp}"]
+    assert len([statement for statement in selects if "FROM tags" in statement]) == 1
+    assert session.query(Tag).filter(Tag.tag == f"new_{stamp}").count() == 1
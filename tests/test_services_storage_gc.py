@@ -0,0 +1,121 @@
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.database.models import User, Image, StorageDeletion, Role
+from src.repository import pictures as repository_pictures
+from src.repository import users as repository_users
+from src.services import storage_gc
+from src.services.storage_gc import claim_run, drain_deletions, enqueue_deletions, reconcile
+from src.services.user_purge import run_purge_step
+
+
+@pytest.fixture()
+def owner(session):
+    """
+    Creates the user the collected images belong to.
+
+    :param session: Access the database
+    :return: A user object
+    """
+    user = User(email=f"gc_{time.time_ns()}@example.com", username="gc", password="12345678", roles=Role.user)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+@pytest.fixture()
+def storage(local_storage, session):
+    for entry in session.query(StorageDeletion):
+        session.delete(entry)
+    session.commit()
+    return local_storage
+
+
+def add_image(session, storage, owner, public_id):
+    storage.put(b'image', public_id)
+    image = Image(image_url=storage.url(public_id), public_id=public_id, user_id=owner.id)
+    session.add(image)
+    session.commit()
+    return image
+
+
+@pytest.mark.asyncio
+async def test_remove_queues_and_drain_deletes(session, storage, owner):
+    image = add_image(session, storage, owner, 'photo_share/gc1')
+    storage.put(b'thumb', storage.variant_id('photo_share/gc1', 'thumb'))
+    await repository_pictures.remove(image.id, owner, session)
+    assert session.query(StorageDeletion).filter(StorageDeletion.asset == 'photo_share/gc1').count() == 1
+    assert storage.exists('photo_share/gc1')
+
+    assert drain_deletions(session, storage) == 1
+    assert not storage.exists('photo_share/gc1')
+    assert not storage.exists(storage.variant_id('photo_share/gc1', 'thumb'))
+    assert session.query(StorageDeletion).count() == 0
+
+
+def test_shared_asset_is_kept(session, storage, owner):
+    add_image(session, storage, owner, 'photo_share/gc2')
+    enqueue_deletions(session, public_ids=['photo_share/gc2'])
+    session.commit()
+    drain_deletions(session, storage)
+    assert storage.exists('photo_share/gc2')
+    assert session.query(StorageDeletion).count() == 0
+
+
+def test_failed_deletion_is_retried_later(session, storage):
+    failing = MagicMock()
+    failing.delete_many.side_effect = RuntimeError("rate limited")
+    enqueue_deletions(session, public_ids=['photo_share/gc3', 'photo_share/gc4'])
+    session.commit()
+    assert drain_deletions(session, failing, batch_size=1) == 1
+    failing.delete_many.assert_called_once_with(['photo_share/gc3'])
+    entry = session.query(StorageDeletion).filter(StorageDeletion.asset == 'photo_share/gc3').one()
+    assert entry.attempts == 1
+    assert entry.last_error == "rate limited"
+    assert drain_deletions(session, failing) == 1
+    assert failing.delete_many.call_args.args == (['photo_share/gc4'],)
+
+
+@pytest.mark.asyncio
+async def test_remove_from_users_queues_assets(session, storage, owner):
+    add_image(session, storage, owner, 'photo_share/gc5')
+    add_image(session, storage, owner, 'photo_share/gc6')
+    await repository_users.remove_from_users(owner.id, session)
+    while run_purge_step(session):
+        pass
+    assert session.query(Image).filter(Image.public_id.in_(['photo_share/gc5', 'photo_share/gc6'])).count() == 0
+    assert drain_deletions(session, storage) == 2
+    assert not storage.exists('photo_share/gc5')
+    assert not storage.exists('photo_share/gc6')
+
+
+def test_reconcile_queues_orphans(session, storage, owner, tmp_path):
+    add_image(session, storage, owner, 'photo_share/gc7')
+    storage.put(b'orphan', 'photo_share/gc8')
+    storage.put(b'thumb', storage.variant_id('photo_share/gc8', 'thumb'))
+    storage.put(b'recent', 'photo_share/gc9')
+    old = time.time() - 3600
+    for public_id in ('photo_share/gc7', 'photo_share/gc8'):
+        os.utime(storage.path(public_id), (old, old))
+    (tmp_path / '1.png').write_bytes(b'qr')
+    with patch.object(storage_gc, 'QR_CODES_DIR', str(tmp_path)):
+        os.utime(tmp_path / '1.png', (old, old))
+        assert reconcile(session, storage, grace_seconds=60) == 2
+        queued = {row.asset for row in session.query(StorageDeletion)}
+        assert queued == {'photo_share/gc8', f"{tmp_path}/1.png"}
+        drain_deletions(session, storage)
+    assert not storage.exists('photo_share/gc8')
+    assert not (tmp_path / '1.png').exists()
+    assert storage.exists('photo_share/gc7')
+    assert storage.exists('photo_share/gc9')
+
+
+def test_reconcile_runs_once_per_interval(session):
+    name = f"test_{time.time_ns()}"
+    assert claim_run(session, name, interval=3600)
+    assert not claim_run(session, name, interval=3600)
+    assert claim_run(session, name, interval=0)
@@ -0,0 +1,123 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.database.models import Comment, Image, Role, StorageDeletion, Tag, TagsImages, User, UserPurgeJob
+from src.repository import users as repository_users
+from src.services import user_purge
+from src.services.auth import auth_service
+from src.services.user_purge import DONE, FAILED, PENDING, run_purge_step
+
+
+@pytest.fixture()
+def heavy_user(session):
+    """
+    Creates a user with five tagged images commented by someone else, and three comments of the user
+    on another image.
+
+    :return: The ids of the user, of the other user and of the other image
+    """
+    for job in session.query(UserPurgeJob):
+        session.delete(job)
+    stamp = time.time_ns()
+    heavy = User(email=f"heavy_{stamp}@example.com", username="heavy", password="12345678")
+    other = User(email=f"other_{stamp}@example.com", username="other", password="12345678")
+    tag = Tag(tag=f"purged_{stamp}")
+    session.add_all([heavy, other, tag])
+    session.flush()
+    images = [Image(image_url=f"http://storage/heavy_{stamp}_{number}", public_id=f"photo_share/heavy_{stamp}_{number}",
+                    user_id=heavy.id) for number in range(5)]
+    other_image = Image(image_url=f"http://storage/other_{stamp}", public_id=f"photo_share/other_{stamp}",
+                        user_id=other.id)
+    session.add_all(images + [other_image])
+    session.flush()
+    session.add_all([TagsImages(image_id=image.id, tag_id=tag.id) for image in images])
+    session.add_all([Comment(comment="nice", user_id=other.id, image_id=image.id) for image in images])
+    session.add_all([Comment(comment="mine", user_id=heavy.id, image_id=other_image.id) for _ in range(3)])
+    session.commit()
+    return heavy.id, other.id, other_image.id
+
+
+@pytest.mark.asyncio
+async def test_remove_only_marks_the_user(session, heavy_user):
+    user_id, _, _ = heavy_user
+
+    await repository_users.remove_from_users(user_id, session)
+    await repository_users.remove_from_users(user_id, session)
+
+    user = session.get(User, user_id)
+    assert user.deleted_at is not None
+    assert user.is_active is False
+    assert session.query(Image).filter(Image.user_id == user_id).count() == 5
+    job = session.query(UserPurgeJob).filter(UserPurgeJob.user_id == user_id).one()
+    assert (job.status, job.images_total, job.comments_total) == (PENDING, 5, 8)
+
+
+@pytest.mark.asyncio
+async def test_purge_removes_the_content_in_chunks(session, heavy_user):
+    user_id, other_id, other_image_id = heavy_user
+    await repository_users.remove_from_users(user_id, session)
+
+    assert run_purge_step(session, chunk_size=2) == 1
+    job = session.query(UserPurgeJob).filter(UserPurgeJob.user_id == user_id).one()
+    assert (job.images_deleted, job.comments_deleted) == (2, 2)
+    assert session.query(Image).filter(Image.user_id == user_id).count() == 3
+
+    steps = 1
+    while run_purge_step(session, chunk_size=2):
+        steps += 1
+
+    # three chunks of images, two of comments and the user
+    assert steps == 6
+    session.refresh(job)
+    assert (job.status, job.images_deleted, job.comments_deleted) == (DONE, 5, 8)
+    assert job.finished_at is not None
+    assert session.get(User, user_id) is None
+    assert session.query(Comment).filter(Comment.user_id == user_id).count() == 0
+    assert session.query(TagsImages).join(Image).filter(Image.user_id == user_id).count() == 0
+    assert session.get(User, other_id) is not None
+    assert session.get(Image, other_image_id) is not None
+    assert session.query(StorageDeletion).filter(StorageDeletion.asset.like("photo_share/heavy_%")).count() >= 5
+
+
+@pytest.mark.asyncio
+async def test_failing_purge_is_retried_then_failed(session, heavy_user):
+    user_id, _, _ = heavy_user
+    await repository_users.remove_from_users(user_id, session)
+
+    with patch.object(user_purge, 'purge_chunk', side_effect=RuntimeError("locked")), \
+            patch.object(user_purge.settings, 'user_purge_max_attempts', 2):
+        assert run_purge_step(session) == 1
+        job = session.query(UserPurgeJob).filter(UserPurgeJob.user_id == user_id).one()
+        assert (job.status, job.attempts, job.last_error) == (PENDING, 1, "locked")
+        assert run_purge_step(session) == 1
+        session.refresh(job)
+        assert job.status == FAILED
+        assert run_purge_step(session) == 0
+    assert session.query(Image).filter(Image.user_id == user_id).count() == 5
+
+
+def test_remove_route_reports_progress(client, session, auth_user, heavy_user, monkeypatch):
+    user_id, _, _ = heavy_user
+    cache = MagicMock()
+    monkeypatch.setattr(auth_service, 'r', cache)
+    auth_user.roles = Role.admin
+
+    response = client.delete(f"/api/user/{user_id}")
+    assert response.status_code == 200, response.text
+    cache.delete.assert_called_once()
+
+    response = client.get("/api/user/purge_jobs/", params={"user_id": user_id})
+    assert response.status_code == 200, response.text
+    assert [(job["status"], job["images_total"], job["images_deleted"]) for job in response.json()] == \
+        [(PENDING, 5, 0)]
+
+    response = client.get("/api/user/all/", params={"limit": 1000})
+    assert response.status_code == 200, response.text
+    assert user_id not in [user["id"] for user in response.json()]
+
+
+def test_purge_jobs_need_admin(client, auth_user):
+    response = client.get("/api/user/purge_jobs/")
+    assert response.status_code == 403, response.text
@@ -0,0 +1,70 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import main
+from src.config.config import settings
+from src.config.logging_config import REQUEST_ID_HEADER, parse_levels, request_id, setup_logging, stop_logging
+
+
+class TestLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.level = logging.getLogger().level
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger('tests.logging')
+
+    def tearDown(self):
+        stop_logging()
+        logging.getLogger().setLevel(self.level)
+
+    def test_json_records_carry_the_request_id(self):
+        with patch.object(settings, 'log_format', 'json'):
+            setup_logging(self.stream)
+        token = request_id.set('abc')
+        try:
+            self.logger.info("hello %s", 'world')
+        finally:
+            request_id.reset(token)
+        stop_logging()
+        record = json.loads(self.stream.getvalue())
+        self.assertEqual(record['message'], 'hello world')
+        self.assertEqual(record['request_id'], 'abc')
+        self.assertEqual(record['level'], 'INFO')
+
+    def test_debug_records_are_sampled(self):
+        with patch.object(settings, 'log_level', 'DEBUG'), patch.object(settings, 'log_debug_sample_rate', 0):
+            setup_logging(self.stream)
+        self.logger.debug("dropped")
+        self.logger.info("kept")
+        stop_logging()
+        self.assertNotIn("dropped", self.stream.getvalue())
+        self.assertIn("kept", self.stream.getvalue())
+
+    def test_parse_levels(self):
+        self.assertEqual(parse_levels("sqlalchemy.engine=info, src.services = DEBUG"),
+                         {'sqlalchemy.engine': 'INFO', 'src.services': 'DEBUG'})
+        self.assertEqual(parse_levels(""), {})
+
+
+class TestRequestIdMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def test_request_id_is_kept(self):
+        response = self.client.get("/", headers={REQUEST_ID_HEADER: 'req-1'})
+        self.assertEqual(response.headers[REQUEST_ID_HEADER], 'req-1')
+
+    def test_request_id_is_generated(self):
+        response = self.client.get("/", headers={REQUEST_ID_HEADER: 'not valid' * 20})
+        self.assertRegex(response.headers[REQUEST_ID_HEADER], r'^[0-9a-f]{32}$')
+        self.assertRegex(self.client.get("/").headers[REQUEST_ID_HEADER], r'^[0-9a-f]{32}$')
+
+
+if __name__ == '__main__':
+    unittest.main()
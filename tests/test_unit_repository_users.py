@@ -88,7 +88,7 @@ class TestUsersRepos(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_users(self):
         users = [User(), User(), User()]
-        self.session.query().offset().limit().all.return_value = users
+        self.session.query().filter().offset().limit().all.return_value = users
         result = await get_users(0, 10, self.session)
         self.assertEqual(result, users)
 
@@ -0,0 +1,49 @@
+import asyncio
+import json
+import unittest
+
+from src.services.comment_events import CommentBroker, event_stream, COMMENT_ADDED
+
+
+class TestCommentEvents(unittest.IsolatedAsyncioTestCase):
+
+    async def test_events_reach_subscribers_of_the_image(self):
+        broker = CommentBroker()
+        async with broker.subscribe(1) as first, broker.subscribe(2) as second:
+            await broker.publish(1, COMMENT_ADDED, {"id": 7, "comment": "hello"})
+            message = json.loads(first.get_nowait())
+            self.assertEqual(message, {"event": COMMENT_ADDED, "image_id": 1, "data": {"id": 7, "comment": "hello"}})
+            self.assertTrue(second.empty())
+        self.assertEqual(dict(broker.subscribers), {})
+
+    async def test_slow_subscriber_is_closed(self):
+        broker = CommentBroker(queue_size=2)
+        async with broker.subscribe(1) as queue:
+            for index in range(3):
+                await broker.publish(1, COMMENT_ADDED, {"id": index})
+            self.assertEqual(json.loads(queue.get_nowait())["data"], {"id": 1})
+            self.assertIsNone(queue.get_nowait())
+            self.assertNotIn(queue, broker.subscribers.get(1, set()))
+
+    async def test_event_stream(self):
+        broker = CommentBroker()
+        disconnected = asyncio.Event()
+
+        async def is_disconnected():
+            return disconnected.is_set()
+
+        stream = event_stream(1, broker, is_disconnected, heartbeat=0.01)
+        self.assertEqual(await stream.__anext__(), "retry: 3000\n\n")
+        self.assertEqual(await stream.__anext__(), ": ping\n\n")
+        await broker.publish(1, COMMENT_ADDED, {"id": 3})
+        chunk = await stream.__anext__()
+        self.assertTrue(chunk.startswith(f"event: {COMMENT_ADDED}\ndata: "))
+        self.assertEqual(json.loads(chunk.split("data: ", 1)[1])["data"], {"id": 3})
+        disconnected.set()
+        with self.assertRaises(StopAsyncIteration):
+            await stream.__anext__()
+        self.assertEqual(dict(broker.subscribers), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
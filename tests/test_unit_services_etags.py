@@ -0,0 +1,22 @@
+import unittest
+from datetime import datetime
+
+from src.services.etags import etag_matches, version_etag
+
+
+class TestETags(unittest.TestCase):
+
+    def test_etag_depends_on_the_versions(self):
+        etag = version_etag('image', 1, datetime(2025, 1, 1))
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(etag, version_etag('image', 1, datetime(2025, 1, 1)))
+        self.assertNotEqual(etag, version_etag('image', 1, datetime(2025, 1, 2)))
+        self.assertNotEqual(etag, version_etag('image', 2, datetime(2025, 1, 1)))
+
+    def test_matching(self):
+        etag = version_etag('user', 1, None)
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'"other", {etag.removeprefix("W/")}', etag))
+        self.assertTrue(etag_matches("*", etag))
+        self.assertFalse(etag_matches('"other"', etag))
+        self.assertFalse(etag_matches(None, etag))
@@ -0,0 +1,61 @@
+import io
+import unittest
+from datetime import datetime
+
+from PIL import Image as PILImage
+
+from src.services.image_metadata import read_metadata
+
+
+def make_jpeg(size=(640, 480), orientation=None, taken_at=None, make=None, model=None) -> bytes:
+    exif = PILImage.Exif()
+    if orientation:
+        exif[274] = orientation
+    if make:
+        exif[271] = make
+    if model:
+        exif[272] = model
+    if taken_at:
+        exif.get_ifd(0x8769)[36867] = taken_at
+    output = io.BytesIO()
+    PILImage.new('RGB', size, (120, 80, 40)).save(output, format='JPEG', exif=exif)
+    return output.getvalue()
+
+
+class TestImageMetadata(unittest.TestCase):
+
+    def test_reads_exif(self):
+        data = make_jpeg(taken_at='2025:06:01 10:30:00', make='Canon', model='Canon EOS R5')
+        metadata = read_metadata(io.BytesIO(data), len(data))
+        self.assertEqual((metadata.width, metadata.height), (640, 480))
+        self.assertEqual(metadata.orientation, 'landscape')
+        self.assertEqual(metadata.format, 'jpeg')
+        self.assertEqual(metadata.taken_at, datetime(2025, 6, 1, 10, 30))
+        self.assertEqual(metadata.camera, 'Canon EOS R5')
+        self.assertEqual(metadata.byte_size, len(data))
+
+    def test_applies_exif_orientation(self):
+        data = make_jpeg(orientation=6)
+        metadata = read_metadata(io.BytesIO(data), len(data))
+        self.assertEqual((metadata.width, metadata.height), (480, 640))
+        self.assertEqual(metadata.orientation, 'portrait')
+        self.assertIsNone(metadata.taken_at)
+        self.assertIsNone(metadata.camera)
+
+    def test_reads_only_the_header(self):
+        data = make_jpeg(size=(4000, 3000), make='Nikon', model='Z6')
+        header = io.BytesIO(data[:2048])
+        metadata = read_metadata(header, len(data))
+        self.assertEqual((metadata.width, metadata.height), (4000, 3000))
+        self.assertEqual(metadata.camera, 'Nikon Z6')
+        self.assertEqual(header.tell(), 0)
+
+    def test_not_an_image(self):
+        metadata = read_metadata(io.BytesIO(b'not an image'), 12)
+        self.assertEqual(metadata.columns()['byte_size'], 12)
+        self.assertIsNone(metadata.width)
+        self.assertIsNone(metadata.format)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from io import BytesIO
+
+from PIL import Image as PILImage
+
+from src.services.image_processing import normalize_image, parse_variants, make_variants
+
+
+def make_jpeg(size=(400, 200), orientation=None) -> bytes:
+    image = PILImage.new('RGB', size, color=(200, 30, 30))
+    exif = PILImage.Exif()
+    exif[0x010F] = 'TestCamera'
+    if orientation:
+        exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=95, exif=exif)
+    return output.getvalue()
+
+
+class TestNormalizeImage(unittest.TestCase):
+
+    def test_caps_longest_edge(self):
+        result = normalize_image(make_jpeg((4000, 1000)), max_edge=1000, image_format='WEBP', quality=80)
+        self.assertEqual((result.width, result.height), (1000, 250))
+        self.assertEqual(result.format, 'webp')
+        with PILImage.open(BytesIO(result.data)) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+    def test_applies_orientation(self):
+        result = normalize_image(make_jpeg((400, 200), orientation=6), max_edge=1000, image_format='WEBP',
+                                 quality=80)
+        self.assertEqual((result.width, result.height), (200, 400))
+
+    def test_strips_metadata(self):
+        result = normalize_image(make_jpeg(), max_edge=1000, image_format='JPEG', quality=80)
+        with PILImage.open(BytesIO(result.data)) as image:
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_reports_statistics(self):
+        data = make_jpeg((2000, 2000))
+        result = normalize_image(data, max_edge=500, image_format='WEBP', quality=60)
+        self.assertEqual(result.original_bytes, len(data))
+        self.assertEqual(result.bytes_saved, len(data) - len(result.data))
+        self.assertGreater(result.bytes_saved, 0)
+        self.assertGreaterEqual(result.cpu_ms, 0)
+
+    def test_invalid_image(self):
+        with self.assertRaises(OSError):
+            normalize_image(b'not an image', max_edge=500, image_format='WEBP', quality=60)
+
+
+class TestVariants(unittest.TestCase):
+
+    def test_parse_variants(self):
+        self.assertEqual(parse_variants('thumb:200, medium:800,'), {'thumb': 200, 'medium': 800})
+        self.assertEqual(parse_variants(''), {})
+
+    def test_make_variants(self):
+        result = make_variants(BytesIO(make_jpeg((1000, 500))), {'thumb': 100, 'large': 2000, 'medium': 400})
+        sizes = {}
+        for name, data in result.items():
+            with PILImage.open(BytesIO(data)) as image:
+                self.assertEqual(image.format, 'WEBP')
+                sizes[name] = image.size
+        self.assertEqual(sizes, {'large': (1000, 500), 'medium': (400, 200), 'thumb': (100, 50)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image as PILImage
+
+from src.repository.pictures import build_transformation
+from src.schemas.pictures import EditImageModel
+from src.services.image_transforms import (
+    RenderCache,
+    TransformEngine,
+    decode_transformation,
+    encode_transformation,
+    render_transformation
+)
+
+
+async def run_directly(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+class TestRenderTransformation(unittest.TestCase):
+
+    def setUp(self):
+        self.source = BytesIO()
+        PILImage.new('RGB', (600, 400), color=(10, 120, 200)).save(self.source, format='PNG')
+
+    def render(self, **filters):
+        body = {'circle': {}, 'effect': {}, 'resize': {}, 'rotate': {}}
+        body.update(filters)
+        self.source.seek(0)
+        data, timings = render_transformation(self.source, build_transformation(EditImageModel(**body)))
+        return PILImage.open(BytesIO(data)), timings
+
+    def test_circle(self):
+        image, timings = self.render(circle={'use_filter': True, 'width': 200, 'height': 200})
+        self.assertEqual(image.size, (200, 200))
+        self.assertEqual(image.getpixel((0, 0))[3], 0)
+        self.assertEqual(image.getpixel((100, 100))[3], 255)
+        self.assertIn('circle', timings)
+
+    def test_effects(self):
+        for effect in ('art_audrey', 'art_zorro', 'blur', 'cartoonify'):
+            image, timings = self.render(effect={'use_filter': True, effect: True})
+            self.assertEqual(image.size, (600, 400))
+            self.assertIn('effect', timings)
+
+    def test_resize(self):
+        image, timings = self.render(resize={'use_filter': True, 'fill': True, 'width': 100, 'height': 300})
+        self.assertEqual(image.size, (100, 300))
+        image, _ = self.render(resize={'use_filter': True, 'crop': True, 'width': 100, 'height': 300})
+        self.assertEqual(image.size, (100, 300))
+        self.assertIn('resize', timings)
+
+    def test_rotate(self):
+        image, timings = self.render(rotate={'use_filter': True, 'width': 300, 'degree': 90})
+        self.assertEqual(image.size, (200, 300))
+        self.assertIn('rotate', timings)
+
+    def test_encoded_transformation(self):
+        transformation = [{'width': '300', 'crop': 'scale'}, {'angle': '45'}]
+        self.assertEqual(decode_transformation(encode_transformation(transformation)), transformation)
+        with self.assertRaises(ValueError):
+            decode_transformation(encode_transformation([{'overlay': 'text'}]))
+        with self.assertRaises(ValueError):
+            decode_transformation('%%%')
+        with self.assertRaises(ValueError):
+            decode_transformation(encode_transformation([{'width': '5000', 'height': '10', 'crop': 'fill'}]),
+                                  max_size=4096)
+        with self.assertRaises(ValueError):
+            decode_transformation(encode_transformation([{'angle': 'sideways'}]))
+
+
+class TestRenderCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_evicts_least_recently_used(self):
+        cache = RenderCache(self.tmp.name, max_bytes=250)
+        for index, key in enumerate(('aa1', 'bb2', 'cc3')):
+            path = cache.put(key, b'x' * 100)
+            os.utime(path, (index, index))
+        self.assertIsNone(cache.get('aa1'))
+        self.assertIsNotNone(cache.get('bb2'))
+        self.assertIsNotNone(cache.get('cc3'))
+        self.assertLessEqual(cache.size, 250)
+
+    def test_engine_uses_cache(self):
+        source = Path(self.tmp.name) / 'source'
+        PILImage.new('RGB', (60, 40)).save(source, format='PNG')
+        engine = TransformEngine(RenderCache(Path(self.tmp.name) / 'cache', max_bytes=10 ** 6))
+        transformation = [{'width': '30', 'crop': 'scale'}]
+        with patch('src.services.image_transforms.run_in_process_pool', run_directly):
+            first = asyncio.run(engine.render(source, transformation))
+            second = asyncio.run(engine.render(source, transformation))
+        self.assertFalse(first.cached)
+        self.assertIn('rotate', first.timings)
+        self.assertTrue(second.cached)
+        self.assertEqual(first.path, second.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+import main
+from src.services.metrics import instrument_engine, timed
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(main.app)
+
+    def test_requests_are_labelled_with_the_route_template(self):
+        labels = {'method': 'GET', 'route': '/api/pictures/{image_id}', 'status': '401'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        self.client.get("/api/pictures/1")
+        self.client.get("/api/pictures/2")
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), before + 2)
+
+    def test_unmatched_requests(self):
+        labels = {'method': 'GET', 'route': 'unmatched', 'status': '404'}
+        before = sample('http_request_duration_seconds_count', **labels)
+        self.client.get("/no/such/path/1")
+        self.assertEqual(sample('http_request_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(sample('http_requests_in_progress', method='GET'), 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get("/")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain'))
+        self.assertIn('http_request_duration_seconds_bucket{le="0.005",method="GET",route="/",status="200"}',
+                      response.text)
+
+    def test_timed_records_the_outcome(self):
+        before = sample('dependency_duration_seconds_count', service='smtp', operation='test', outcome='error')
+        with self.assertRaises(ConnectionError):
+            with timed('smtp', 'test'):
+                raise ConnectionError
+        with timed('smtp', 'test'):
+            pass
+        self.assertEqual(sample('dependency_duration_seconds_count', service='smtp', operation='test',
+                                outcome='error'), before + 1)
+        self.assertGreaterEqual(sample('dependency_duration_seconds_count', service='smtp', operation='test',
+                                       outcome='ok'), 1)
+
+    def test_queries_are_timed(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        before = sample('db_query_duration_seconds_count', kind='SELECT')
+        with engine.connect() as conn:
+            conn.execute(text("select 1"))
+            conn.execute(text("  SELECT 2"))
+        self.assertEqual(sample('db_query_duration_seconds_count', kind='SELECT'), before + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
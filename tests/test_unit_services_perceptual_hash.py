@@ -0,0 +1,50 @@
+import random
+import unittest
+from io import BytesIO
+
+from PIL import Image as PILImage, ImageDraw, ImageFilter
+
+from src.services.perceptual_hash import MAX_SEARCH_DISTANCE, chunk_neighbours, dhash, hamming, split_hash
+
+
+def make_photo(seed: int, size=(640, 480), image_format='PNG', quality=95) -> bytes:
+    rnd = random.Random(seed)
+    image = PILImage.linear_gradient('L').resize((640, 480)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rnd.randrange(640), rnd.randrange(480)
+        draw.ellipse((x, y, x + rnd.randrange(50, 300), y + rnd.randrange(50, 300)),
+                     fill=(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    image = image.filter(ImageFilter.GaussianBlur(8)).resize(size)
+    output = BytesIO()
+    image.save(output, format=image_format, quality=quality)
+    return output.getvalue()
+
+
+class TestPerceptualHash(unittest.TestCase):
+
+    def test_resized_copy_is_near(self):
+        original = dhash(make_photo(1))
+        copy = dhash(make_photo(1, size=(320, 240), image_format='JPEG', quality=60))
+        self.assertLessEqual(hamming(original, copy), 6)
+
+    def test_different_photo_is_far(self):
+        self.assertGreater(hamming(dhash(make_photo(1)), dhash(make_photo(2))), 12)
+
+    def test_split_hash(self):
+        self.assertEqual(split_hash(0x0123456789abcdef), [0x0123, 0x4567, 0x89ab, 0xcdef])
+
+    def test_chunk_neighbours_cover_the_distance(self):
+        value = 0x0123456789abcdef
+        near = value ^ (1 << 3) ^ (1 << 20) ^ (1 << 40) ^ (1 << 50) ^ (1 << 55)
+        self.assertEqual(hamming(value, near), 5)
+        matches = [chunk in chunk_neighbours(searched, 5)
+                   for chunk, searched in zip(split_hash(near), split_hash(value))]
+        self.assertTrue(any(matches))
+        self.assertEqual(len(chunk_neighbours(0, 5)), 17)
+        self.assertEqual(chunk_neighbours(0, 3), [0])
+        self.assertEqual(len(chunk_neighbours(0, MAX_SEARCH_DISTANCE)), 137)
+
+
+if __name__ == '__main__':
+    unittest.main()
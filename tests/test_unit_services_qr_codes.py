@@ -0,0 +1,62 @@
+import asyncio
+import tempfile
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+from PIL import Image as PILImage
+
+from src.services.qr_codes import MemoryCache, QRCodeService, qr_key, render_qr
+
+
+class TestQRCodes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.renders = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def run_directly(self, func, *args, **kwargs):
+        self.renders.append(args)
+        return func(*args, **kwargs)
+
+    def get(self, service, data, image_format='png'):
+        with patch('src.services.qr_codes.run_in_process_pool', self.run_directly):
+            return asyncio.run(service.get(data, image_format))
+
+    def test_render_formats(self):
+        with PILImage.open(BytesIO(render_qr('http://url/image', 'png'))) as image:
+            self.assertEqual(image.format, 'PNG')
+        self.assertIn(b'<svg', render_qr('http://url/image', 'svg'))
+
+    def test_cached_in_memory_and_on_disk(self):
+        service = QRCodeService(self.tmp.name, 10 ** 6, 10)
+        first = self.get(service, 'http://url/image')
+        second = self.get(service, 'http://url/image')
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.etag, f'"{qr_key("http://url/image", "png")}"')
+
+        other_worker = QRCodeService(self.tmp.name, 10 ** 6, 10)
+        self.assertEqual(self.get(other_worker, 'http://url/image').content, first.content)
+        self.assertEqual(len(self.renders), 1)
+
+        svg = self.get(service, 'http://url/image', 'svg')
+        self.assertEqual(svg.media_type, 'image/svg+xml')
+        self.assertNotEqual(svg.key, first.key)
+        self.assertEqual(len(self.renders), 2)
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        cache = MemoryCache(2)
+        cache.put('a', b'1')
+        cache.put('b', b'2')
+        cache.get('a')
+        cache.put('c', b'3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import json
+import unittest
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from src.database.models import Comment, Image, Role, User
+from src.schemas.comments import CommentModel
+from src.schemas.pictures import ImageModel
+from src.schemas.users import UserDb
+from src.services.serialization import ORMListResponse, dump_rows, select_fields
+
+
+def fastapi_json(rows, model) -> list:
+    return json.loads(json.dumps(jsonable_encoder([model.from_orm(row) for row in rows])))
+
+
+class TestDumpRows(unittest.TestCase):
+
+    def assertSameJSON(self, rows, model):
+        self.assertEqual(json.loads(dump_rows(rows, model)), fastapi_json(rows, model))
+
+    def test_images(self):
+        images = [Image(id=1, image_url="http://storage/1", description="first", user_id=2,
+                        created_at=datetime(2025, 1, 1, 10, 30, 5, 120000), updated_at=None,
+                        variants={"thumb": "http://storage/1_thumb"}, width=640, height=480,
+                        orientation="landscape", format="jpeg", taken_at=datetime(2024, 12, 31), camera="X100V",
+                        byte_size=1234, public_id="photo_share/1", qr_code_url="./qr.png"),
+                  Image(id=2, image_url="http://storage/2", user_id=2, created_at=datetime(2025, 1, 2))]
+        self.assertSameJSON(images, ImageModel)
+        self.assertNotIn("public_id", json.loads(dump_rows(images, ImageModel))[0])
+
+    def test_users_with_date_fields(self):
+        users = [User(id=1, username="boroda", email="boroda@example.com", avatar="http://avatar",
+                      created_at=datetime(2025, 3, 4, 5, 6, 7), roles=Role.admin, password="secret")]
+        self.assertSameJSON(users, UserDb)
+        self.assertEqual(json.loads(dump_rows(users, UserDb))[0]["created_at"], "2025-03-04")
+
+    def test_comments_with_nested_authors(self):
+        author = User(id=3, username="author", avatar=None, email="author@example.com")
+        comments = [Comment(id=1, comment="nice", created_at=datetime(2025, 1, 1), user_id=3, image_id=1, user=author),
+                    Comment(id=2, comment="orphan", created_at=datetime(2025, 1, 1), user_id=4, image_id=1)]
+        self.assertSameJSON(comments, CommentModel)
+
+    def test_response(self):
+        response = ORMListResponse([], ImageModel, headers={"ETag": 'W/"1"'})
+        self.assertEqual(response.body, b"[]")
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(response.headers["ETag"], 'W/"1"')
+
+
+class TestFields(unittest.TestCase):
+
+    def test_select_fields(self):
+        self.assertIsNone(select_fields(None, ImageModel))
+        self.assertEqual(select_fields(" image_url, id,id ", ImageModel), ("image_url", "id"))
+        with self.assertRaises(ValueError):
+            select_fields("id,password", UserDb)
+        with self.assertRaises(ValueError):
+            select_fields("", UserDb)
+
+    def test_dump_rows_with_fields(self):
+        users = [User(id=1, username="boroda", email="boroda@example.com", created_at=datetime(2025, 3, 4))]
+        self.assertEqual(json.loads(dump_rows(users, UserDb, ("id", "created_at"))),
+                         [{"id": 1, "created_at": "2025-03-04"}])
@@ -0,0 +1,164 @@
+import asyncio
+import io
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from PIL import Image as PILImage
+
+from main import app
+from src.services.image_transforms import RenderCache, TransformEngine
+from src.services.storage import (
+    CloudinaryStorage,
+    LocalStorage,
+    SendfileResponse,
+    create_storage,
+    sniff_media_type
+)
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+class TestLocalStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.tmp.name, '/api/storage/')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_file_object(self):
+        result = self.storage.put(io.BytesIO(PNG), 'photo_share/abc')
+        self.assertEqual(result['url'], '/api/storage/photo_share/abc')
+        self.assertEqual(self.storage.path('photo_share/abc').read_bytes(), PNG)
+
+    def test_put_without_overwrite_keeps_file(self):
+        self.storage.put(PNG, 'photo_share/abc')
+        self.storage.put(b'other', 'photo_share/abc', overwrite=False)
+        self.assertEqual(self.storage.path('photo_share/abc').read_bytes(), PNG)
+
+    def test_delete(self):
+        self.storage.put(PNG, 'photo_share/abc')
+        self.storage.delete('photo_share/abc')
+        self.storage.delete('photo_share/abc')
+        self.assertFalse(self.storage.path('photo_share/abc').exists())
+
+    def test_create_variants(self):
+        output = io.BytesIO()
+        PILImage.new('RGB', (800, 400)).save(output, format='PNG')
+        self.storage.put(output.getvalue(), 'photo_share/abc')
+        urls = self.storage.create_variants('photo_share/abc', {'thumb': 200})
+        self.assertEqual(urls, {'thumb': '/api/storage/.variants/photo_share/abc/thumb'})
+        with PILImage.open(self.storage.path('.variants/photo_share/abc/thumb')) as image:
+            self.assertEqual(image.size, (200, 100))
+
+    def test_ids_with_underscores(self):
+        self.storage.put(PNG, 'photo_share/abc')
+        self.storage.put(PNG, 'photo_share/abc_def')
+        self.storage.put(PNG, self.storage.variant_id('photo_share/abc', 'thumb'))
+        self.assertEqual(sorted(public_id for public_id, _ in self.storage.list_ids('photo_share/')),
+                         ['photo_share/abc', 'photo_share/abc_def'])
+        self.storage.delete('photo_share/abc')
+        self.assertTrue(self.storage.exists('photo_share/abc_def'))
+        self.assertFalse(self.storage.exists(self.storage.variant_id('photo_share/abc', 'thumb')))
+
+    def test_path_outside_root(self):
+        with self.assertRaises(ValueError):
+            self.storage.path('../secret')
+
+    def test_sniff_media_type(self):
+        self.assertEqual(sniff_media_type(PNG), 'image/png')
+        self.assertEqual(sniff_media_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(sniff_media_type(b'text'), 'application/octet-stream')
+
+    def test_create_storage(self):
+        config = SimpleNamespace(storage_backend='local', storage_local_root=self.tmp.name,
+                                 storage_local_base_url='/api/storage', secret_key='secret', cloudinary_name='name',
+                                 cloudinary_api_key=1, cloudinary_api_secret='secret')
+        self.assertIsInstance(create_storage(config), LocalStorage)
+        config.storage_backend = 'cloudinary'
+        self.assertIsInstance(create_storage(config), CloudinaryStorage)
+        config.storage_backend = 'ftp'
+        with self.assertRaises(ValueError):
+            create_storage(config)
+
+    def test_verify_signed_upload(self):
+        storage = LocalStorage(self.tmp.name, '/api/storage', 'secret')
+        fields = storage.sign_upload('photo_share/abc', int(time.time()) + 60)['fields']
+        self.assertTrue(storage.verify_upload('photo_share/abc', fields['expires_at'], fields['signature']))
+        self.assertFalse(storage.verify_upload('photo_share/other', fields['expires_at'], fields['signature']))
+        expired = storage.sign_upload('photo_share/abc', int(time.time()) - 1)['fields']
+        self.assertFalse(storage.verify_upload('photo_share/abc', expired['expires_at'], expired['signature']))
+
+    def test_cloudinary_signature_expires_with_the_token(self):
+        storage = CloudinaryStorage('name', 1, 'secret')
+        expires_at = int(time.time()) + 600
+        fields = storage.sign_upload('photo_share/abc', expires_at)['fields']
+        self.assertEqual(fields['timestamp'], expires_at - storage.signature_ttl)
+        fields = storage.sign_upload('photo_share/abc', int(time.time()) + 2 * storage.signature_ttl)['fields']
+        self.assertLessEqual(fields['timestamp'], int(time.time()))
+
+    def test_sendfile_uses_zerocopy_extension(self):
+        self.storage.put(PNG, 'photo_share/abc')
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'extensions': {'http.response.zerocopysend': {}}}
+        response = SendfileResponse(self.storage.path('photo_share/abc'), media_type='image/png')
+        asyncio.run(response(scope, None, send))
+        self.assertEqual(messages[1]['type'], 'http.response.zerocopysend')
+        self.assertEqual(messages[1]['count'], len(PNG))
+
+    def test_route_serves_local_file(self):
+        self.storage.put(PNG, 'photo_share/abc')
+        with patch('src.routes.storage.get_storage', return_value=self.storage):
+            client = TestClient(app)
+            response = client.get('/api/storage/photo_share/abc')
+            self.assertEqual(response.status_code, 200, response.text)
+            self.assertEqual(response.headers['content-type'], 'image/png')
+            self.assertEqual(response.content, PNG)
+            self.assertEqual(client.get('/api/storage/photo_share/missing').status_code, 404)
+
+    def test_route_accel_redirect_is_quoted(self):
+        self.storage.put(PNG, 'photo_share/a b')
+        with patch('src.routes.storage.get_storage', return_value=self.storage), \
+                patch('src.routes.storage.settings.storage_local_accel_redirect', '/protected/'):
+            response = TestClient(app).get('/api/storage/photo_share/a%20b')
+            self.assertEqual(response.headers['x-accel-redirect'], '/protected/photo_share/a%20b')
+
+    def test_route_renders_transformation(self):
+        output = io.BytesIO()
+        PILImage.new('RGB', (800, 400)).save(output, format='PNG')
+        self.storage.put(output.getvalue(), 'photo_share/abc')
+        url = self.storage.transform('photo_share/abc', [{'width': '200', 'crop': 'scale'}])
+        engine = TransformEngine(RenderCache(f"{self.tmp.name}/cache", max_bytes=10 ** 6))
+        with patch('src.routes.storage.get_storage', return_value=self.storage), \
+                patch('src.routes.storage.get_transform_engine', return_value=engine), \
+                patch('src.services.image_transforms.run_in_process_pool', run_directly):
+            client = TestClient(app)
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.text)
+            self.assertIn('rotate;dur=', response.headers['server-timing'])
+            with PILImage.open(io.BytesIO(response.content)) as image:
+                self.assertEqual(image.size, (200, 100))
+            response = client.get(url)
+            self.assertEqual(response.headers['server-timing'], 'cache;desc=hit')
+            self.assertEqual(client.get('/api/storage/photo_share/abc?tr=bad').status_code, 403)
+            self.assertEqual(client.get(url.replace('&sig=', '&sig=0')).status_code, 403)
+            huge = self.storage.transform('photo_share/abc', [{'width': '100000', 'height': '100000',
+                                                               'crop': 'fill'}])
+            self.assertEqual(client.get(huge).status_code, 400)
+
+
+async def run_directly(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
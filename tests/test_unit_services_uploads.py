@@ -0,0 +1,52 @@
+import hashlib
+import io
+import unittest
+from unittest.mock import MagicMock, patch, AsyncMock
+
+from sqlalchemy.orm import Session
+
+from src.database.models import Image
+from src.services.uploads import spool_upload, store_upload
+
+DATA = b'image-bytes' * 10000
+
+
+class TestUploads(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = MagicMock(spec=Session)
+
+    def test_spool_upload_hashes_content(self):
+        upload = spool_upload(io.BytesIO(DATA), 'photo.jpg')
+        self.assertEqual(upload.content_hash, hashlib.sha256(DATA).hexdigest())
+        self.assertEqual(upload.size, len(DATA))
+        self.assertEqual(upload.read(), DATA)
+        upload.close()
+
+    async def test_store_upload_reuses_existing_asset(self):
+        existing = Image(public_id='photo_share/abc', image_url='http://url/abc')
+        upload = spool_upload(DATA)
+        with patch('src.services.uploads.repository_pictures.get_image_by_hash',
+                   AsyncMock(return_value=existing)), \
+                patch('src.services.uploads.CloudImage') as cloud_mock:
+            stored = await store_upload(upload, self.session)
+        cloud_mock.upload.assert_not_called()
+        self.assertTrue(stored.deduplicated)
+        self.assertEqual(stored.public_id, 'photo_share/abc')
+        self.assertEqual(stored.content_hash, upload.content_hash)
+
+    async def test_store_upload_new_file(self):
+        upload = spool_upload(DATA)
+        with patch('src.services.uploads.repository_pictures.get_image_by_hash',
+                   AsyncMock(return_value=None)), \
+                patch('src.services.uploads.CloudImage') as cloud_mock:
+            cloud_mock.generate_name_image.return_value = 'photo_share/new'
+            cloud_mock.get_url_for_image.return_value = 'http://url/new'
+            stored = await store_upload(upload, self.session)
+        cloud_mock.upload.assert_called_once()
+        self.assertFalse(stored.deduplicated)
+        self.assertEqual(stored.image_url, 'http://url/new')
+
+
+if __name__ == '__main__':
+    unittest.main()